@@ -1,46 +1,149 @@
-from flask import Flask, request, abort
-from linebot import LineBotApi, WebhookHandler
+from flask import Flask, Response, request, abort, jsonify
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
     MessageEvent, TextMessage, TextSendMessage,
     FollowEvent, UnfollowEvent
 )
-import re
+from werkzeug.local import LocalProxy
+import functools
+import hmac
 from config import Config
-from database import Database
-from scheduler import Scheduler
-from openai_service import OpenAIService
-from expense_service import ExpenseService
+from reminders import REMINDER_TYPES, default_reminder_times, parse_time, is_valid_timezone
+import logging
+import time
+import services
+import metrics
+import query_profiler
+import sampling_profiler
+from logging_setup import correlation, new_correlation_id, setup_logging
+
+# 服務在第一次使用時才建立，匯入本模組不會連線資料庫或 LINE
+line_bot_api = LocalProxy(services.get_line_bot_api)
+db = LocalProxy(services.get_db)
+scheduler = LocalProxy(services.get_scheduler)
+openai_service = LocalProxy(services.get_openai_service)
+expense_service = LocalProxy(services.get_expense_service)
+vocabulary_service = LocalProxy(services.get_vocabulary_service)
+
+logger = logging.getLogger(__name__)
+
+COMMAND_SECONDS = metrics.histogram('line_command_seconds', 'LINE 指令處理時間', ['command'])
+COMMAND_ERRORS = metrics.counter('line_command_errors_total', 'LINE 指令處理失敗次數', ['command'])
+
+# 用戶狀態管理（存於資料庫，多個網頁程序共用）
+user_states = LocalProxy(services.get_user_states)
+
+def create_app():
+    """建立 Flask 應用（不會建立任何服務，服務於處理請求時才初始化）
+
+    日誌由進入點（wsgi.py、python app.py）設定，匯入或建立應用都不會更動日誌設定。
+    """
+    app = Flask(__name__)
+
+    @app.route("/callback", methods=['POST'])
+    @metrics.timed('webhook_request_seconds', 'Webhook 請求處理時間')
+    def callback():
+        """Line Webhook 回調處理"""
+        signature = request.headers['X-Line-Signature']
+        body = request.get_data(as_text=True)
+        
+        with correlation():
+            started = time.perf_counter()
+            try:
+                get_handler().handle(body, signature)
+            except InvalidSignatureError:
+                logger.warning("Webhook 簽章驗證失敗")
+                abort(400)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if elapsed_ms >= Config.LOG_SLOW_MS:
+                    logger.warning("Webhook 處理緩慢：%.0f ms", elapsed_ms, extra={"elapsed_ms": round(elapsed_ms, 1)})
+                else:
+                    logger.debug("Webhook 處理完成：%.0f ms", elapsed_ms, extra={"elapsed_ms": round(elapsed_ms, 1)})
+        
+        return 'OK'
+
+    metrics_token = Config.METRICS_TOKEN or Config.ADMIN_TOKEN
+    if metrics.enabled and not metrics_token:
+        logger.warning("未設定 METRICS_TOKEN 或 ADMIN_TOKEN，不提供 /metrics")
+    elif metrics.enabled:
+        @app.route("/metrics")
+        def metrics_endpoint():
+            """效能指標（Prometheus 文字格式，METRICS_DIR 設定時為所有程序的合計）"""
+            _require_token(metrics_token)
+            return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    if query_profiler.enabled and Config.ADMIN_TOKEN:
+        @app.route("/admin/queries", methods=['GET', 'DELETE'])
+        def admin_queries():
+            """查詢統計（依總耗時排序的前 N 個語句），DELETE 清除統計"""
+            _require_admin()
+            if request.method == 'DELETE':
+                query_profiler.profiler.reset()
+                return '', 204
+            limit = request.args.get('limit', Config.DB_PROFILE_TOP, type=int)
+            if request.args.get('format') == 'text':
+                return Response(query_profiler.profiler.format_report(limit) + '\n', mimetype='text/plain; charset=utf-8')
+            return jsonify(
+                slow_query_ms=Config.DB_SLOW_QUERY_MS,
+                statements=query_profiler.profiler.report(limit)
+            )
 
-app = Flask(__name__)
+    if Config.ADMIN_TOKEN:
+        @app.route("/admin/profile", methods=['GET', 'POST', 'DELETE'])
+        def admin_profile():
+            """取樣分析：POST 開始（?seconds=30&interval_ms=10），DELETE 停止並寫出，GET 查看狀態"""
+            _require_admin()
+            profiler = sampling_profiler.profiler
+            if request.method == 'POST':
+                started = profiler.start(
+                    seconds=request.args.get('seconds', type=int),
+                    interval_ms=request.args.get('interval_ms', type=float)
+                )
+                return jsonify(profiler.status()), 202 if started else 409
+            if request.method == 'DELETE':
+                profiler.stop()
+            return jsonify(profiler.status())
 
-# Line Bot 設定
-line_bot_api = LineBotApi(Config.LINE_CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(Config.LINE_CHANNEL_SECRET)
+    return app
 
-# 初始化服務
-db = Database()
-scheduler = Scheduler(line_bot_api)
-openai_service = OpenAIService()
-expense_service = ExpenseService()
 
-# 用戶狀態管理
-user_states = {}
+def _require_admin():
+    """管理端點以 Authorization: Bearer <ADMIN_TOKEN> 驗證"""
+    _require_token(Config.ADMIN_TOKEN)
 
-@app.route("/callback", methods=['POST'])
-def callback():
-    """Line Webhook 回調處理"""
-    signature = request.headers['X-Line-Signature']
-    body = request.get_data(as_text=True)
-    
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        abort(400)
-    
-    return 'OK'
 
-@handler.add(FollowEvent)
+def _require_token(token):
+    expected = f"Bearer {token}"
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+        abort(403)
+
+
+def register_handlers(handler):
+    """註冊 LINE 事件處理函式"""
+    handler.add(FollowEvent)(_wrap_event('follow', handle_follow))
+    handler.add(UnfollowEvent)(_wrap_event('unfollow', handle_unfollow))
+    handler.add(MessageEvent, message=TextMessage)(_wrap_event('message', handle_message))
+
+
+def _wrap_event(event_type, func):
+    """以事件 ID 作為關聯 ID 並記錄處理時間
+
+    LINE SDK 依參數個數決定是否傳入 destination，包裝後仍只接受 event。
+    """
+    func = metrics.timed('line_event_seconds', 'LINE 事件處理時間', event=event_type)(func)
+
+    def handle(event):
+        with correlation(getattr(event, 'webhook_event_id', None) or new_correlation_id()):
+            return func(event)
+
+    return handle
+
+
+def get_handler():
+    """取得已註冊事件處理函式的 Webhook 處理器"""
+    return services.get_webhook_handler(register_handlers)
+
 def handle_follow(event):
     """處理用戶加好友事件"""
     user_id = event.source.user_id
@@ -80,18 +183,16 @@ def handle_follow(event):
             TextSendMessage(text=welcome_message)
         )
         
-        print(f"新用戶加入: {user_name} ({user_id})")
+        logger.info("新用戶加入: %s", user_name, extra={"user_id": user_id})
         
-    except Exception as e:
-        print(f"處理加好友事件失敗: {str(e)}")
+    except Exception:
+        logger.exception("處理加好友事件失敗", extra={"user_id": user_id})
 
-@handler.add(UnfollowEvent)
 def handle_unfollow(event):
     """處理用戶取消好友事件"""
     user_id = event.source.user_id
-    print(f"用戶取消好友: {user_id}")
+    logger.info("用戶取消好友", extra={"user_id": user_id})
 
-@handler.add(MessageEvent, message=TextMessage)
 def handle_message(event):
     """處理文字訊息"""
     user_id = event.source.user_id
@@ -106,44 +207,87 @@ def handle_message(event):
             db.add_user(user_id, profile.display_name)
             user = db.get_user(user_id)
         
-        user_name = user[1]
+        user_name = user.name
         
-        # 處理指令
-        if text.lower() in ['幫助', 'help', '指令', '功能']:
-            handle_help(event)
-        elif text.lower() in ['目標', 'goals', '設定目標']:
-            handle_goals(event, user_id, user_name)
-        elif text.lower() in ['日記', 'diary', '記錄日記']:
-            handle_diary(event, user_id, user_name)
-        elif text.lower() in ['單字', 'vocabulary', '背單字']:
-            handle_vocabulary(event, user_id, user_name)
-        elif text.lower() in ['總結', 'summary', '今日總結']:
-            handle_summary(event, user_id, user_name)
-        elif text.lower() in ['記帳', 'expense', '支出']:
-            handle_expense(event, user_id, user_name)
-        elif text.lower() in ['記帳統計', 'expense_summary', '支出統計']:
-            handle_expense_summary(event, user_id, user_name)
-        elif text.lower() in ['匯出記帳', 'export_expense', '匯出支出']:
-            handle_export_expense(event, user_id, user_name)
-        elif text.lower() in ['測試', 'test']:
-            handle_test(event, user_id, user_name)
+        # 處理指令：先決定指令名稱與處理函式，再統一計時
+        lowered = text.lower()
+        if lowered in ['幫助', 'help', '指令', '功能']:
+            command, handler = 'help', functools.partial(handle_help, event, user_id)
+        elif lowered in ['目標', 'goals', '設定目標']:
+            command, handler = 'goals', functools.partial(handle_goals, event, user_id, user_name)
+        elif lowered in ['日記', 'diary', '記錄日記']:
+            command, handler = 'diary', functools.partial(handle_diary, event, user_id, user_name)
+        elif lowered in ['單字', 'vocabulary', '背單字']:
+            command, handler = 'vocabulary', functools.partial(handle_vocabulary, event, user_id, user_name)
+        elif lowered in ['複習', 'review', '複習單字']:
+            command, handler = 'review', functools.partial(handle_review, event, user_id, user_name)
+        elif lowered in ['總結', 'summary', '今日總結']:
+            command, handler = 'summary', functools.partial(handle_summary, event, user_id, user_name)
+        elif lowered in ['記帳', 'expense', '支出']:
+            command, handler = 'expense', functools.partial(handle_expense, event, user_id, user_name)
+        elif lowered in ['記帳統計', 'expense_summary', '支出統計']:
+            command, handler = 'expense_summary', functools.partial(handle_expense_summary, event, user_id, user_name)
+        elif lowered in ['匯出記帳', 'export_expense', '匯出支出']:
+            command, handler = 'export_expense', functools.partial(handle_export_expense, event, user_id, user_name)
+        elif lowered in ['預算', 'budget', '查看預算']:
+            command, handler = 'budget', functools.partial(handle_budget, event, user_id, user_name)
+        elif lowered in ['提醒設定', 'reminders', '查看提醒']:
+            command, handler = 'reminder_settings', functools.partial(handle_reminder_settings, event, user_id, user_name)
+        elif lowered in ['測試', 'test']:
+            command, handler = 'test', functools.partial(handle_test, event, user_id, user_name)
         elif user_id in user_states:
-            # 處理狀態相關的回應
-            handle_state_response(event, user_id, user_name, text)
+            # 處理狀態相關的回應（日記或目標內容可能以「搜尋」「設定」開頭，需先於前綴指令處理）
+            command, handler = 'state_response', functools.partial(handle_state_response, event, user_id, user_name, text)
+        elif text.startswith('設定時區'):
+            command, handler = 'set_timezone', functools.partial(handle_set_timezone, event, user_id, user_name, text)
+        elif text.startswith('設定提醒'):
+            command, handler = 'set_reminder', functools.partial(handle_set_reminder, event, user_id, user_name, text)
+        elif text.startswith('搜尋'):
+            command, handler = 'search', functools.partial(handle_search, event, user_id, user_name, text)
+        elif text.startswith('設定預算'):
+            command, handler = 'set_budget', functools.partial(handle_set_budget, event, user_id, user_name, text)
         else:
             # 預設回應
-            handle_default_response(event, user_name, text)
+            command, handler = 'default', functools.partial(handle_default_response, event, user_name, text)
+        
+        _run_command(command, handler)
             
-    except Exception as e:
-        print(f"處理訊息失敗: {str(e)}")
+    except Exception:
+        logger.exception("處理訊息失敗", extra={"user_id": user_id})
         line_bot_api.reply_message(
             event.reply_token,
             TextSendMessage(text="抱歉，處理您的訊息時發生錯誤，請稍後再試。")
         )
 
-def handle_help(event):
-    """處理幫助指令"""
-    help_text = """
+def _run_command(command, handler):
+    """執行指令並記錄處理時間與失敗次數（所有指令只在這裡計時）"""
+    started = time.perf_counter()
+    try:
+        handler()
+    except Exception:
+        COMMAND_ERRORS.labels(command=command).inc()
+        raise
+    finally:
+        COMMAND_SECONDS.labels(command=command).observe(time.perf_counter() - started)
+
+# 各提醒在說明中的用途
+REMINDER_PURPOSES = {
+    'morning': '目標提醒',
+    'evening': '日記提醒',
+    'summary': '總結郵件',
+    'vocabulary': '單字複習提醒',
+}
+
+def handle_help(event, user_id):
+    """處理幫助指令（提醒時間依用戶的時區與設定顯示）"""
+    preferences = db.get_user_preferences(user_id) or {
+        'timezone': Config.DEFAULT_TIMEZONE, **default_reminder_times()
+    }
+    reminders_text = '\n'.join(
+        f"• {label} {preferences[reminder]} - {REMINDER_PURPOSES[reminder]}"
+        for reminder, label in REMINDER_TYPES.items()
+    )
+    help_text = f"""
 📋 Never Give Up 機器人指令說明
 
 🎯 目標相關：
@@ -157,20 +301,27 @@ def handle_help(event):
 📚 學習相關：
 • 輸入「單字」- 記錄學習的單字
 • 輸入「查看單字」- 查看今日學習的單字
+• 輸入「複習」- 複習今天到期的單字
 
 💰 記帳相關：
 • 輸入「記帳」- 記錄支出
 • 輸入「記帳統計」- 查看支出統計
 • 輸入「匯出記帳」- 匯出記帳記錄
+• 輸入「預算」- 查看本月預算使用狀況
+• 輸入「設定預算 分類 金額」- 設定每月預算
+
+🔍 搜尋相關：
+• 輸入「搜尋 關鍵字」- 搜尋過去的日記與單字
 
 📊 總結相關：
 • 輸入「總結」- 查看今日總結
 • 輸入「測試」- 測試定時任務
 
-⏰ 自動提醒：
-• 早上8:00 - 目標提醒
-• 晚上8:00 - 日記提醒  
-• 晚上8:30 - 總結郵件
+⏰ 自動提醒（{preferences['timezone']} 當地時間）：
+{reminders_text}
+• 輸入「提醒設定」- 查看提醒設定
+• 輸入「設定時區 Asia/Tokyo」- 調整時區
+• 輸入「設定提醒 早上 07:30」- 調整提醒時間
 
 💡 小提示：直接輸入文字，我會智能判斷您的意圖！
     """
@@ -185,14 +336,14 @@ def handle_goals(event, user_id, user_name):
     # 檢查是否已有今日目標
     today_goals = db.get_daily_goals(user_id)
     
-    if today_goals and any([today_goals[2], today_goals[3], today_goals[4]]):
+    if today_goals and any(today_goals.goals):
         # 已有目標，顯示現有目標
         goals_text = f"""
 📋 {user_name} 的今日目標：
 
-1. {today_goals[2] or '未設定'}
-2. {today_goals[3] or '未設定'}  
-3. {today_goals[4] or '未設定'}
+1. {today_goals.goal1 or '未設定'}
+2. {today_goals.goal2 or '未設定'}  
+3. {today_goals.goal3 or '未設定'}
 
 要重新設定目標嗎？請輸入「重新設定目標」
         """
@@ -218,12 +369,12 @@ def handle_diary(event, user_id, user_name):
     # 檢查是否已有今日日記
     today_diary = db.get_diary(user_id)
     
-    if today_diary and today_diary[2]:
+    if today_diary and today_diary.content:
         # 已有日記，顯示現有日記
         diary_text = f"""
 📝 {user_name} 的今日日記：
 
-{today_diary[2]}
+{today_diary.content}
 
 要重新記錄日記嗎？請輸入「重新記錄日記」
         """
@@ -258,14 +409,15 @@ def handle_vocabulary(event, user_id, user_name):
 def handle_summary(event, user_id, user_name):
     """處理總結查看"""
     summary_data = db.get_today_summary(user_id)
+    goals = summary_data['goals']
     
     summary_text = f"""
 📊 {user_name} 的今日總結
 
 🎯 今日目標：
-1. {summary_data['goals'][0] if summary_data['goals'] and summary_data['goals'][0] else '未設定'}
-2. {summary_data['goals'][1] if summary_data['goals'] and summary_data['goals'][1] else '未設定'}
-3. {summary_data['goals'][2] if summary_data['goals'] and summary_data['goals'][2] else '未設定'}
+1. {goals.goal1 if goals and goals.goal1 else '未設定'}
+2. {goals.goal2 if goals and goals.goal2 else '未設定'}
+3. {goals.goal3 if goals and goals.goal3 else '未設定'}
 
 📝 今日日記：
 {summary_data['diary'] if summary_data['diary'] else '未記錄'}
@@ -274,7 +426,7 @@ def handle_summary(event, user_id, user_name):
 {', '.join(summary_data['vocabulary']) if summary_data['vocabulary'] else '未記錄'}
 
 💰 今日記帳：
-{', '.join([f"{exp['category']}:${exp['amount']:,.0f}" for exp in summary_data.get('expenses', [])]) if summary_data.get('expenses') else '未記錄'}
+{', '.join([f"{exp.category}:${exp.amount:,.0f}" for exp in summary_data.get('expenses', [])]) if summary_data.get('expenses') else '未記錄'}
 
 💪 繼續加油！
     """
@@ -284,6 +436,83 @@ def handle_summary(event, user_id, user_name):
         TextSendMessage(text=summary_text)
     )
 
+def handle_reminder_settings(event, user_id, user_name):
+    """處理提醒設定查看"""
+    preferences = db.get_user_preferences(user_id)
+    reminders_text = '\n'.join(
+        f"• {label}：{preferences[reminder]}" for reminder, label in REMINDER_TYPES.items()
+    )
+    message = f"""
+⏰ {user_name} 的提醒設定
+
+🌏 時區：{preferences['timezone']}
+{reminders_text}
+
+💡 修改方式：
+• 設定時區 Asia/Tokyo
+• 設定提醒 早上 07:30
+    """
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=message)
+    )
+
+def handle_set_timezone(event, user_id, user_name, text):
+    """處理時區設定，格式：設定時區 Asia/Taipei"""
+    timezone = text.replace('設定時區', '', 1).strip()
+    
+    if not timezone or not is_valid_timezone(timezone):
+        message = "時區格式錯誤！請輸入 IANA 時區名稱，例如：設定時區 Asia/Taipei"
+    else:
+        db.set_user_timezone(user_id, timezone)
+        message = f"✅ 已將時區設定為 {timezone}，提醒將依當地時間發送。"
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=message)
+    )
+
+def handle_set_reminder(event, user_id, user_name, text):
+    """處理提醒時間設定，格式：設定提醒 早上 07:30"""
+    parts = text.replace('設定提醒', '', 1).split()
+    labels = {label: reminder for reminder, label in REMINDER_TYPES.items()}
+    
+    local_time = parse_time(parts[1]) if len(parts) == 2 else None
+    if len(parts) != 2 or parts[0] not in labels or not local_time:
+        options = '、'.join(REMINDER_TYPES.values())
+        message = f"格式錯誤！請輸入「設定提醒 類型 時間」，類型可為 {options}，例如：設定提醒 早上 07:30"
+    else:
+        db.set_reminder_time(user_id, labels[parts[0]], local_time)
+        message = f"✅ 已將{parts[0]}提醒設定為 {local_time}。"
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=message)
+    )
+
+def handle_search(event, user_id, user_name, text):
+    """處理搜尋日記與單字，格式：搜尋 關鍵字"""
+    query = text.replace('搜尋', '', 1).strip()
+    
+    if not query:
+        message = "請輸入要搜尋的關鍵字，例如：搜尋 咖啡"
+    else:
+        results = db.search(user_id, query, limit=10)
+        if not results:
+            message = f"找不到包含「{query}」的日記或單字記錄。"
+        else:
+            message = f"🔍 「{query}」的搜尋結果：\n\n"
+            for result in results:
+                icon = "📝" if result['source'] == 'diary' else "📚"
+                message += f"{icon} {result['date']}\n{result['snippet']}\n\n"
+            message = message.rstrip()
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=message)
+    )
+
 def handle_test(event, user_id, user_name):
     """處理測試指令"""
     test_text = f"""
@@ -312,6 +541,8 @@ def handle_state_response(event, user_id, user_name, text):
         handle_diary_response(event, user_id, user_name, text, state)
     elif state['state'] == 'recording_vocabulary':
         handle_vocabulary_response(event, user_id, user_name, text, state)
+    elif state['state'] == 'reviewing_vocabulary':
+        handle_review_response(event, user_id, user_name, text, state)
     elif state['state'] == 'recording_expense':
         handle_expense_response(event, user_id, user_name, text, state)
     elif state['state'] == 'testing':
@@ -331,6 +562,7 @@ def handle_goals_response(event, user_id, user_name, text, state):
     state['step'] += 1
     
     if state['step'] < 3:
+        user_states[user_id] = state
         line_bot_api.reply_message(
             event.reply_token,
             TextSendMessage(text=f"很好！請輸入第{state['step'] + 1}個目標：")
@@ -394,17 +626,18 @@ def handle_vocabulary_response(event, user_id, user_name, text, state):
         )
         return
     
-    # 儲存單字
-    db.save_vocabulary_record(user_id, text)
+    # 儲存單字（拆成單字加入複習排程）
+    words, new_count = vocabulary_service.record_words(user_id, text)
     del user_states[user_id]
     
     vocab_text = f"""
 ✅ 單字記錄完成！
 
 {user_name} 今天學習的單字：
-{text}
+{', '.join(words) if words else text}
 
-繼續保持學習的熱情！📚
+🆕 新加入複習排程：{new_count} 個
+明天開始會提醒你複習，繼續保持學習的熱情！📚
     """
     
     line_bot_api.reply_message(
@@ -412,6 +645,66 @@ def handle_vocabulary_response(event, user_id, user_name, text, state):
         TextSendMessage(text=vocab_text)
     )
 
+def handle_review(event, user_id, user_name):
+    """處理單字複習"""
+    due_words = vocabulary_service.get_due_words(user_id)
+    
+    if not due_words:
+        progress = vocabulary_service.get_progress(user_id)
+        message = f"""
+🎉 {user_name}，今天沒有需要複習的單字！
+
+📚 單字總數：{progress['total']}
+✅ 已熟記：{progress['learned']}
+        """
+    else:
+        user_states[user_id] = {
+            'state': 'reviewing_vocabulary',
+            'step': 0,
+            'words': due_words
+        }
+        words_text = '\n'.join(f"• {word['word']}" for word in due_words)
+        message = f"""
+📖 {user_name}，請複習以下 {len(due_words)} 個單字：
+
+{words_text}
+
+複習完後，請輸入忘記的單字（用逗號分隔），全部記得請輸入「全部記得」。
+        """
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=message)
+    )
+
+def handle_review_response(event, user_id, user_name, text, state):
+    """處理單字複習的回應"""
+    if text.lower() in ['取消', 'cancel', '退出']:
+        del user_states[user_id]
+        line_bot_api.reply_message(
+            event.reply_token,
+            TextSendMessage(text="已取消單字複習。")
+        )
+        return
+    
+    forgotten_text = '' if text in ['全部記得', '都記得'] else text
+    remembered, forgotten = vocabulary_service.review(user_id, state['words'], forgotten_text)
+    del user_states[user_id]
+    
+    review_text = f"""
+✅ 複習完成！
+
+👍 記得：{remembered} 個
+🔁 再加強：{forgotten} 個
+
+忘記的單字明天會再提醒你，記得的單字會逐漸拉長複習間隔。💪
+    """
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=review_text)
+    )
+
 def handle_expense_response(event, user_id, user_name, text, state):
     """處理記帳回應"""
     if text.lower() in ['取消', 'cancel', '退出']:
@@ -439,24 +732,22 @@ def handle_expense_response(event, user_id, user_name, text, state):
             )
             return
     
-    # 解析記帳輸入
-    amount, category, description = expense_service.parse_expense_input(text)
+    # 解析記帳輸入（可一次輸入多筆）
+    items = expense_service.parse_expense_items(text, user_id)
     
-    if amount is None or category is None:
+    if not items:
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="格式錯誤！請使用以下格式：\n• 100 飲食 午餐\n• 飲食 100 午餐\n• 50 交通")
+            TextSendMessage(text="格式錯誤！請使用以下格式：\n• 100 飲食 午餐\n• 飲食 100 午餐\n• 50 交通\n• 午餐 120元 飲料 50")
         )
         return
     
-    # 儲存記帳
-    success, message = expense_service.add_expense(user_id, amount, category, description)
+    # 儲存記帳（任何一筆有問題時都不儲存）
+    success, message = expense_service.add_expenses(user_id, items)
     
     if success:
         # 顯示今日記帳
-        today_expenses = expense_service.get_today_expenses(user_id)
-        summary = expense_service.get_expense_summary(user_id, 1)
-        expense_message = expense_service.format_expense_message(today_expenses, summary)
+        expense_message = expense_service.render_today_view(user_id)
         
         complete_message = f"""
 ✅ {message}
@@ -545,13 +836,11 @@ def handle_default_response(event, user_name, text):
 def handle_expense(event, user_id, user_name):
     """處理記帳功能"""
     # 檢查是否已有今日記帳
-    today_expenses = expense_service.get_today_expenses(user_id)
+    today_view = expense_service.render_today_view(user_id)
     
-    if today_expenses:
+    if today_view:
         # 顯示今日記帳
-        summary = expense_service.get_expense_summary(user_id, 1)
-        message = expense_service.format_expense_message(today_expenses, summary)
-        message += "\n\n要新增記帳嗎？請輸入記帳內容，格式：金額 分類 描述"
+        message = today_view + "\n\n要新增記帳嗎？請輸入記帳內容，格式：金額 分類 描述"
         line_bot_api.reply_message(
             event.reply_token,
             TextSendMessage(text=message)
@@ -589,8 +878,36 @@ def handle_expense(event, user_id, user_name):
 
 def handle_expense_summary(event, user_id, user_name):
     """處理記帳統計"""
-    summary = expense_service.get_expense_summary(user_id, 7)
-    message = expense_service.format_summary_message(summary, 7)
+    message = expense_service.render_summary_view(user_id, 7)
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=message)
+    )
+
+def handle_budget(event, user_id, user_name):
+    """處理預算查看"""
+    budgets = expense_service.get_budgets(user_id)
+    message = expense_service.format_budget_message(budgets)
+    
+    line_bot_api.reply_message(
+        event.reply_token,
+        TextSendMessage(text=message)
+    )
+
+def handle_set_budget(event, user_id, user_name, text):
+    """處理預算設定，格式：設定預算 分類 金額"""
+    parts = text.replace('設定預算', '', 1).split()
+    
+    if len(parts) != 2:
+        message = "格式錯誤！請輸入「設定預算 分類 金額」，例如：設定預算 飲食 6000"
+    else:
+        category, amount = parts
+        if category.replace(',', '').replace('.', '').isdigit():
+            category, amount = amount, category
+        success, message = expense_service.set_budget(user_id, category, amount.replace(',', ''))
+        if not success:
+            message = f"❌ {message}"
     
     line_bot_api.reply_message(
         event.reply_token,
@@ -606,6 +923,7 @@ def handle_export_expense(event, user_id, user_name):
         # 建立檔案名稱
         from datetime import datetime
         filename = f"記帳記錄_{datetime.now().strftime('%Y%m%d')}.csv"
+        record_count = len(csv_content.split('\n')) - 2
         
         # 發送檔案（這裡需要實作檔案發送功能）
         # 由於Line Bot的限制，我們先提供下載連結或直接顯示內容
@@ -615,7 +933,7 @@ def handle_export_expense(event, user_id, user_name):
 {user_name}，您的記帳記錄已準備好！
 
 📁 檔案名稱：{filename}
-📄 記錄筆數：{len(csv_content.split('\n')) - 2} 筆
+📄 記錄筆數：{record_count} 筆
 📅 時間範圍：過去30天
 
 💡 由於Line Bot限制，請複製以下CSV內容到您的電腦：
@@ -637,14 +955,22 @@ def handle_export_expense(event, user_id, user_name):
         )
 
 if __name__ == "__main__":
-    # 啟動排程器
-    scheduler.start()
+    setup_logging()
+    app = create_app()
+    
+    # 排程預設由獨立的工作程序執行（python -m worker），網頁程序只處理 Webhook
+    if Config.RUN_SCHEDULER_IN_WEB:
+        # 多個程序時由領導者選舉決定只有一個程序執行排程
+        leader = scheduler.leader_election()
+        leader.start()
     
-    print("Never Give Up Line Bot 已啟動！")
-    print("定時任務已設定：")
-    print(f"  早上 {Config.MORNING_TIME} - 發送目標提醒")
-    print(f"  晚上 {Config.EVENING_TIME} - 發送日記提醒")
-    print(f"  晚上 {Config.SUMMARY_TIME} - 發送總結郵件")
+    logger.info("Never Give Up Line Bot 已啟動！")
+    if not Config.RUN_SCHEDULER_IN_WEB:
+        logger.info("定時任務請以 python -m worker 啟動")
     
-    # 啟動Flask應用
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # 開發用伺服器；正式環境請使用 gunicorn -c gunicorn.conf.py wsgi:app
+    # 排程在網頁程序執行時關閉自動重新載入，避免重新載入程序再啟動一次排程
+    app.run(
+        host='0.0.0.0', port=Config.PORT, debug=Config.FLASK_DEBUG,
+        use_reloader=Config.FLASK_DEBUG and not Config.RUN_SCHEDULER_IN_WEB
+    )
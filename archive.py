@@ -0,0 +1,250 @@
+"""資料保留與封存
+
+將 expenses、daily_goals、diaries、vocabulary_records 中早於保留期限（RETENTION_DAYS）的記錄，
+依年份搬到 ARCHIVE_DIR 下的封存資料庫（例如 archive/never_give_up-2023.db），再以 incremental vacuum
+歸還主資料庫的空間，讓主資料庫、備份與頁面快取維持在近期資料的大小。
+
+- 分批搬移（每批一個短交易），不會長時間阻擋網頁程序寫入
+- 封存表格保留原本的 id；每批寫入封存的筆數必須等於自主資料庫刪除的筆數，否則整批回滾並停止，
+  不會刪除未寫入封存的記錄
+- 封存後的記錄不再出現在搜尋、匯出與統計中；查詢時 ATTACH 封存資料庫：
+      ATTACH 'archive/never_give_up-2023.db' AS y2023;
+      SELECT * FROM y2023.expenses WHERE user_id = ?;
+
+使用方式：
+    python -m archive [--days 730] [--dry-run] [--no-vacuum]
+或設定 ARCHIVE_TIME 由排程器每天執行。
+
+既有資料庫若是在啟用 auto_vacuum=INCREMENTAL 之前建立，需先在離峰時間執行一次轉換（完整 VACUUM，
+期間會阻擋寫入）；未轉換前封存照常進行，只是不歸還空間：
+    python -m archive --enable-incremental-vacuum
+"""
+import argparse
+import datetime
+import glob
+import logging
+import os
+import re
+
+import query_profiler
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLES = ('expenses', 'daily_goals', 'diaries', 'vocabulary_records')
+
+# incremental vacuum 每次歸還的頁數，分次執行讓其他寫入可以穿插
+VACUUM_PAGES = 1000
+
+# 保留期限至少要涵蓋統計區間與本月預算，封存不影響任何畫面
+MIN_RETENTION_DAYS = max(Config.EXPENSE_STATS_WINDOWS) + 31
+
+
+class Archiver:
+    def __init__(self, db_path=None, archive_dir=None, retention_days=None, batch_size=None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        self.archive_dir = archive_dir or Config.ARCHIVE_DIR
+        self.retention_days = max(retention_days or Config.RETENTION_DAYS, MIN_RETENTION_DAYS)
+        self.batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+
+    def archive_path(self, year):
+        name = os.path.splitext(os.path.basename(self.db_path))[0]
+        return os.path.join(self.archive_dir, f"{name}-{year}.db")
+
+    def archive_paths(self):
+        """回傳 {年份: 封存資料庫路徑}"""
+        # 年份以數字開頭，不會比對到分片（never_give_up-shard0-2023.db）的封存
+        pattern = self.archive_path('[0-9]*')
+        prefix, suffix = pattern.split('[0-9]*')
+        return {
+            path[len(prefix):-len(suffix)]: path
+            for path in sorted(glob.glob(pattern))
+        }
+
+    def cutoff(self, today=None):
+        """早於此日期的記錄會被封存"""
+        today = today or datetime.date.today()
+        return (today - datetime.timedelta(days=self.retention_days)).isoformat()
+
+    def _connect(self):
+        # 自行控制交易；ATTACH 不能在交易中執行
+        return query_profiler.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def pending(self, conn=None, cutoff=None):
+        """回傳 {年份: {表格: 筆數}}，列出待封存的記錄"""
+        cutoff = cutoff or self.cutoff()
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            years = {}
+            for table in ARCHIVE_TABLES:
+                for year, count in conn.execute(f'''
+                    SELECT substr(date, 1, 4), COUNT(*) FROM {table}
+                    WHERE date < ? GROUP BY 1
+                ''', (cutoff,)):
+                    years.setdefault(year, {})[table] = count
+            return dict(sorted(years.items()))
+        finally:
+            if own:
+                conn.close()
+
+    def run(self, dry_run=False, vacuum=True):
+        """封存保留期限以前的記錄，回傳 {年份: {表格: 筆數}}"""
+        cutoff = self.cutoff()
+        conn = self._connect()
+        try:
+            pending = self.pending(conn, cutoff)
+            if dry_run or not pending:
+                return pending
+
+            os.makedirs(self.archive_dir, exist_ok=True)
+            moved = {}
+            for year in pending:
+                start = f"{year}-01-01"
+                end = min(f"{int(year) + 1}-01-01", cutoff)
+                conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path(year),))
+                try:
+                    for table in pending[year]:
+                        self._ensure_table(conn, table)
+                        moved.setdefault(year, {})[table] = self._move(conn, table, start, end)
+                finally:
+                    conn.execute('DETACH DATABASE archive')
+                logger.info("已封存 %s 年的記錄：%s", year, moved[year], extra={'year': year})
+
+            if vacuum:
+                self.compact(conn)
+            return moved
+        finally:
+            conn.close()
+
+    def _ensure_table(self, conn, table):
+        """以主資料庫的表格定義在封存資料庫建立同名表格（保留 id 主鍵）"""
+        sql = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        sql = re.sub(r'^CREATE TABLE\s+(IF NOT EXISTS\s+)?\w+', f'CREATE TABLE IF NOT EXISTS archive.{table}', sql)
+        conn.execute(sql)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS archive.idx_{table}_user_date ON {table} (user_id, date)')
+
+    def _move(self, conn, table, start, end):
+        """以 id 順序分批搬移 [start, end) 的記錄，回傳筆數"""
+        total = 0
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                last_id = conn.execute(f'''
+                    SELECT MAX(id) FROM (
+                        SELECT id FROM main.{table}
+                        WHERE date >= ? AND date < ?
+                        ORDER BY id LIMIT ?
+                    )
+                ''', (start, end, self.batch_size)).fetchone()[0]
+                if last_id is None:
+                    conn.execute('COMMIT')
+                    return total
+                inserted = conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.{table}
+                    SELECT * FROM main.{table}
+                    WHERE id <= ? AND date >= ? AND date < ?
+                ''', (last_id, start, end)).rowcount
+                # 刪除會觸發全文檢索的同步觸發器，搜尋索引一併縮小
+                deleted = conn.execute(f'''
+                    DELETE FROM main.{table}
+                    WHERE id <= ? AND date >= ? AND date < ?
+                ''', (last_id, start, end)).rowcount
+                if inserted != deleted:
+                    # 封存資料庫已有相同 id 的記錄，被略過的記錄若一併刪除就會遺失
+                    raise RuntimeError(
+                        f"{table} 寫入封存 {inserted} 筆與刪除 {deleted} 筆不符"
+                        f"（id <= {last_id}），已回滾，請檢查 {self.archive_path(start[:4])}"
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            total += deleted
+
+    def incremental_vacuum_enabled(self, conn):
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+    def enable_incremental_vacuum(self):
+        """將既有資料庫轉換為 auto_vacuum=INCREMENTAL，回傳是否有轉換
+
+        需要執行一次完整的 VACUUM，期間會阻擋所有寫入，只應在離峰時間以 --enable-incremental-vacuum 手動執行。
+        """
+        conn = self._connect()
+        try:
+            if self.incremental_vacuum_enabled(conn):
+                return False
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            logger.info("主資料庫已轉換為 incremental vacuum")
+            return True
+        finally:
+            conn.close()
+
+    def compact(self, conn=None):
+        """歸還刪除後的空頁，回傳歸還的頁數
+
+        只執行 incremental vacuum；尚未轉換的資料庫不歸還空間（見 enable_incremental_vacuum）。
+        """
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            pages = conn.execute('PRAGMA page_count').fetchone()[0]
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_index'").fetchone():
+                # 刪除記錄在全文檢索索引中只留下刪除標記，合併索引後才會釋放空頁
+                conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+            if not self.incremental_vacuum_enabled(conn):
+                logger.warning(
+                    "%s 尚未啟用 incremental vacuum，不歸還空間；請在離峰時間執行 "
+                    "python -m archive --enable-incremental-vacuum", self.db_path
+                )
+            else:
+                while conn.execute('PRAGMA freelist_count').fetchone()[0]:
+                    # PRAGMA incremental_vacuum 需要執行到結束才會歸還全部頁數，execute 只會執行一步
+                    conn.executescript(f'PRAGMA incremental_vacuum({VACUUM_PAGES})')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            freed = pages - conn.execute('PRAGMA page_count').fetchone()[0]
+            logger.info("主資料庫已歸還 %s 頁", freed, extra={'pages': freed})
+            return freed
+        finally:
+            if own:
+                conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='封存保留期限以前的記錄')
+    parser.add_argument('--days', type=int, default=Config.RETENTION_DAYS,
+                        help=f'保留天數（至少 {MIN_RETENTION_DAYS}）')
+    parser.add_argument('--dry-run', action='store_true', help='只列出待封存的筆數')
+    parser.add_argument('--no-vacuum', action='store_true', help='封存後不歸還空間')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='只將既有資料庫轉換為 incremental vacuum（完整 VACUUM，會阻擋寫入）')
+    args = parser.parse_args()
+
+    from logging_setup import setup_logging, shutdown_logging
+    from sharded_database import database_paths
+    setup_logging()
+    if args.enable_incremental_vacuum:
+        for path in database_paths():
+            converted = Archiver(path).enable_incremental_vacuum()
+            print(f"{path}：{'已轉換' if converted else '已啟用，不需轉換'}")
+        shutdown_logging()
+        return
+
+    label = '待封存' if args.dry_run else '已封存'
+    # 分片時逐一處理全域資料庫與各分片
+    for path in database_paths():
+        archiver = Archiver(path, retention_days=args.days)
+        result = archiver.run(dry_run=args.dry_run, vacuum=not args.no_vacuum)
+        print(f"{path}：保留 {archiver.retention_days} 天（{archiver.cutoff()} 以前）")
+        for year, tables in result.items():
+            print(f"{year}：{label} " + '，'.join(f"{table} {count:,}" for table, count in tables.items()))
+        if not result:
+            print('沒有需要封存的記錄')
+    shutdown_logging()
+
+
+if __name__ == '__main__':
+    main()
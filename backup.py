@@ -0,0 +1,148 @@
+"""線上備份（SQLite backup API）
+
+以 sqlite3.Connection.backup 分段複製主資料庫，每段 BACKUP_PAGES 頁、段與段之間暫停 BACKUP_SLEEP_MS，
+備份期間網頁程序與排程器照常讀寫，得到的是某一時間點的一致快照（直接 cp 可能複製到寫入一半的檔案）。
+
+- 分段複製時若來源被其他連線寫入，SQLite 會從頭重新複製；重新開始超過 MAX_RESTARTS 次時改為
+  一次複製完成（WAL 模式下只持有讀取快照，不會阻擋寫入）
+- 複製完成後以 PRAGMA quick_check 檢查，可選擇以 gzip 壓縮，並只保留最新的 BACKUP_KEEP 份
+- 先寫入暫存檔再改名，中斷時不會留下不完整的備份
+
+使用方式：
+    python -m backup [--dest backups] [--keep 7] [--no-compress]
+或設定 BACKUP_TIME 由排程器每天執行。還原時先停止服務，再以 gunzip -c 備份檔 > never_give_up.db 覆蓋。
+"""
+import argparse
+import datetime
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+
+import query_profiler
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAX_RESTARTS = 3
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class Backup:
+    def __init__(self, db_path=None, dest_dir=None, keep=None, compress=None, pages=None, sleep_ms=None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        self.dest_dir = dest_dir or Config.BACKUP_DIR
+        self.keep = Config.BACKUP_KEEP if keep is None else keep
+        self.compress = Config.BACKUP_COMPRESS if compress is None else compress
+        self.pages = pages or Config.BACKUP_PAGES
+        self.sleep = (Config.BACKUP_SLEEP_MS if sleep_ms is None else sleep_ms) / 1000
+
+    @property
+    def prefix(self):
+        return os.path.splitext(os.path.basename(self.db_path))[0]
+
+    def backups(self):
+        """回傳既有備份檔路徑（由舊到新）"""
+        # 時間戳記以數字開頭，不會比對到分片（never_give_up-shard0-...）的備份
+        paths = glob.glob(os.path.join(self.dest_dir, f"{self.prefix}-[0-9]*.db")) + \
+            glob.glob(os.path.join(self.dest_dir, f"{self.prefix}-[0-9]*.db.gz"))
+        return sorted(paths, key=os.path.basename)
+
+    def run(self):
+        """建立一份備份並輪替舊備份，回傳備份檔路徑"""
+        os.makedirs(self.dest_dir, exist_ok=True)
+        name = f"{self.prefix}-{datetime.datetime.now():%Y%m%d-%H%M%S}.db"
+        path = os.path.join(self.dest_dir, name)
+        raw_path = path + '.tmp'
+
+        started = time.perf_counter()
+        try:
+            pages = self._copy(raw_path)
+            if self.compress:
+                path += '.gz'
+                with open(raw_path, 'rb') as src, gzip.open(path + '.tmp', 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(path + '.tmp', path)
+            else:
+                os.replace(raw_path, path)
+        finally:
+            for leftover in (raw_path, path + '.tmp'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        removed = self.rotate()
+        logger.info(
+            "備份完成：%s（%s 頁，%.1f 秒）", path, pages, time.perf_counter() - started,
+            extra={'path': path, 'pages': pages, 'bytes': os.path.getsize(path), 'removed': len(removed)}
+        )
+        return path
+
+    def _copy(self, temp_path):
+        """以 backup API 複製到 temp_path 並檢查完整性，回傳頁數"""
+        source = query_profiler.connect(self.db_path, timeout=30)
+        target = sqlite3.connect(temp_path)
+        try:
+            restarts = 0
+            last_remaining = None
+
+            def progress(status, remaining, total):
+                nonlocal restarts, last_remaining
+                if last_remaining is not None and remaining > last_remaining:
+                    restarts += 1
+                    if restarts > MAX_RESTARTS:
+                        raise _TooManyRestarts()
+                last_remaining = remaining
+                # 每段之間已釋放來源的讀取鎖，暫停讓寫入與磁碟 I/O 優先
+                if remaining and self.sleep:
+                    time.sleep(self.sleep)
+
+            try:
+                source.backup(target, pages=self.pages, progress=progress)
+            except _TooManyRestarts:
+                logger.warning("備份期間資料庫持續寫入，改為一次複製完成")
+                source.backup(target, pages=-1)
+
+            result = target.execute('PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f"備份檔檢查失敗：{result}")
+            return target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+    def rotate(self):
+        """只保留最新的 keep 份備份，回傳刪除的檔案"""
+        paths = self.backups()
+        removed = paths[:-self.keep] if self.keep > 0 else []
+        for path in removed:
+            os.remove(path)
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='線上備份資料庫')
+    parser.add_argument('--dest', default=Config.BACKUP_DIR, help='備份目錄')
+    parser.add_argument('--keep', type=int, default=Config.BACKUP_KEEP, help='保留的備份份數（0 表示全部保留）')
+    parser.add_argument('--no-compress', action='store_true', help='不以 gzip 壓縮')
+    args = parser.parse_args()
+
+    from logging_setup import setup_logging, shutdown_logging
+    from sharded_database import database_paths
+    setup_logging()
+    try:
+        # 分片時逐一備份全域資料庫與各分片（各自輪替）
+        for path in database_paths():
+            Backup(path, dest_dir=args.dest, keep=args.keep,
+                   compress=not args.no_compress and Config.BACKUP_COMPRESS).run()
+    finally:
+        shutdown_logging()
+
+
+if __name__ == '__main__':
+    main()
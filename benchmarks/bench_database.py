@@ -0,0 +1,330 @@
+"""資料庫操作效能測試
+
+依資料量規模產生合成的 SQLite 資料（用戶、多年的記帳、目標、日記、單字），
+對 Database / ExpenseService 的主要讀取路徑計時並記錄查詢計畫（EXPLAIN QUERY PLAN），
+可儲存為基準並與之後的結果比較，讓熱門讀取路徑的效能退化能被發現。
+
+產生的資料庫存放在 benchmarks/.data/，參數相同時重複使用（--rebuild 重新產生）。
+
+使用方式：
+    python -m benchmarks.bench_database [--size small --size medium] [--repeat 100]
+    python -m benchmarks.bench_database --save-baseline benchmarks/results/database.json
+    python -m benchmarks.bench_database --compare benchmarks/results/database.json [--threshold 1.5]
+    python -m benchmarks.bench_database --size large --profile   # 依總耗時列出最花時間的語句
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+import query_profiler
+from database import Database
+from expense_service import ExpenseService
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '.data')
+
+# 規模：用戶數、歷史天數、每天平均筆數
+SIZES = {
+    'small': {'users': 100, 'days': 90},
+    'medium': {'users': 1000, 'days': 365},
+    'large': {'users': 10000, 'days': 730},
+}
+RATES = {'expenses': 1.5, 'goals': 0.5, 'diaries': 0.3, 'vocabulary': 0.1}
+
+CATEGORIES = ['飲食', '交通', '購物', '娛樂', '醫療', '教育', '居住', '通訊', '其他']
+DESCRIPTIONS = ['午餐', '早餐', '晚餐', '咖啡', '捷運', '公車', '電影', '衣服', '房租', '書籍', '']
+DIARY_PHRASES = ['今天去跑步', '喝了一杯咖啡', '和朋友吃飯', '工作很忙', '讀了一本書',
+                 '天氣很好', '加班到很晚', '學了新的單字', '整理房間', '看了一場電影']
+WORDS = ['apple', 'banana', 'schedule', 'persistent', 'throughput', 'latency', 'index',
+         'journal', 'vocabulary', 'resilient', 'diligent', 'curious', 'ambition', 'habit']
+
+SLOW_PLAN_MARKERS = ('SCAN',)
+# 低於此差距（毫秒）的變化視為量測誤差
+NOISE_FLOOR_MS = 0.5
+
+
+def _poisson(rng, rate):
+    """簡單的卜瓦松抽樣（每天筆數）"""
+    count, threshold, product = 0, pow(2.718281828459045, -rate), rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def build_dataset(path, users, days, seed=42):
+    """產生合成資料庫"""
+    if os.path.exists(path):
+        os.remove(path)
+    db = Database(path)
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+
+    for index in range(users):
+        user_id = f'U{index:08d}'
+        cursor.execute('INSERT INTO users (user_id, name) VALUES (?, ?)', (user_id, f'用戶{index}'))
+        db._insert_default_preferences(cursor, user_id)
+        if rng.random() < 0.3:
+            cursor.executemany(
+                'INSERT INTO expense_categories (user_id, category_name) VALUES (?, ?)',
+                [(user_id, f'自訂{n}') for n in range(rng.randint(1, 5))]
+            )
+
+        expenses, goals, diaries, vocab = [], [], [], []
+        for offset in range(days):
+            date = (today - datetime.timedelta(days=offset)).isoformat()
+            for _ in range(_poisson(rng, RATES['expenses'])):
+                expenses.append((user_id, round(rng.uniform(20, 800), 0),
+                                 rng.choice(CATEGORIES), rng.choice(DESCRIPTIONS), date))
+            if rng.random() < RATES['goals']:
+                goals.append((user_id, '運動', '讀書', '早睡', date))
+            if rng.random() < RATES['diaries']:
+                diaries.append((user_id, '，'.join(rng.sample(DIARY_PHRASES, 3)), date))
+            if rng.random() < RATES['vocabulary']:
+                vocab.append((user_id, ', '.join(rng.sample(WORDS, 3)), date))
+
+        cursor.executemany('''
+            INSERT INTO expenses (user_id, amount, category, description, date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', expenses)
+        cursor.executemany('''
+            INSERT INTO daily_goals (user_id, goal1, goal2, goal3, date) VALUES (?, ?, ?, ?, ?)
+        ''', goals)
+        cursor.executemany('INSERT INTO diaries (user_id, content, date) VALUES (?, ?, ?)', diaries)
+        cursor.executemany('INSERT INTO vocabulary_records (user_id, words, date) VALUES (?, ?, ?)', vocab)
+        for _, words, date in reversed(vocab):
+            db._insert_words(cursor, user_id, words.split(', '), date)
+
+        if index % 500 == 499:
+            conn.commit()
+            print(f"  已產生 {index + 1}/{users} 位用戶", file=sys.stderr)
+
+    conn.commit()
+    cursor.execute('ANALYZE')
+    conn.close()
+
+
+def open_dataset(name, rebuild=False):
+    """取得（必要時產生）指定規模的資料庫路徑"""
+    params = SIZES[name]
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"{name}-{params['users']}x{params['days']}.db")
+    if rebuild or not os.path.exists(path):
+        print(f"產生 {name} 資料集（{params['users']} 位用戶 × {params['days']} 天）...", file=sys.stderr)
+        started = time.perf_counter()
+        build_dataset(path, params['users'], params['days'])
+        print(f"  完成，耗時 {time.perf_counter() - started:.1f} 秒", file=sys.stderr)
+    return path
+
+
+def build_operations(db, service, user_ids):
+    """回傳 {名稱: 函式(用戶)}"""
+    today = datetime.date.today()
+    windows = {7: today - datetime.timedelta(days=6), 30: today - datetime.timedelta(days=29),
+               90: today - datetime.timedelta(days=89), 'month': today.replace(day=1)}
+    batch = user_ids[:100]
+
+    def render_today(user_id):
+        service.view_cache.invalidate(user_id)
+        return service.render_today_view(user_id)
+
+    def render_summary(user_id):
+        service.view_cache.invalidate(user_id)
+        return service.render_summary_view(user_id, 30)
+
+    return {
+        'get_user': lambda user_id: db.get_user(user_id),
+        'get_expenses(今日)': lambda user_id: db.get_expenses(user_id),
+        'get_expenses(30天)': lambda user_id: db.get_expenses(
+            user_id, today - datetime.timedelta(days=29), today),
+        'get_expense_summary(365天)': lambda user_id: db.get_expense_summary(
+            user_id, today - datetime.timedelta(days=364), today),
+        'get_today_summary': lambda user_id: db.get_today_summary(user_id),
+        'get_user_categories': lambda user_id: db.get_user_categories(user_id),
+        'get_daily_goals': lambda user_id: db.get_daily_goals(user_id),
+        'compute_expense_windows': lambda user_id: db.compute_expense_windows(user_id, windows),
+        'get_expense_stats': lambda user_id: db.get_expense_stats(user_id, 30),
+        'search': lambda user_id: db.search(user_id, '咖啡'),
+        'get_due_words_for_users(100人)': lambda user_id: db.get_due_words_for_users(batch),
+        'get_users_for_reminder': lambda user_id: db.get_users_for_reminder('morning', 0),
+        'ExpenseService.render_today_view': render_today,
+        'ExpenseService.render_summary_view': render_summary,
+        'ExpenseService.export_expenses_csv': lambda user_id: service.export_expenses_csv(user_id),
+    }
+
+
+@contextmanager
+def capture_statements():
+    """記錄期間內所有連線執行的 SQL（參數已展開）"""
+    statements = []
+    original = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        conn = original(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    sqlite3.connect = connect
+    try:
+        yield statements
+    finally:
+        sqlite3.connect = original
+
+
+def explain(path, statements):
+    """回傳 [(SQL, [計畫步驟...]), ...]，只包含查詢語句"""
+    conn = sqlite3.connect(path)
+    plans = []
+    seen = set()
+    for sql in statements:
+        normalized = ' '.join(sql.split())
+        if not normalized.upper().startswith(('SELECT', 'WITH')) or normalized in seen:
+            continue
+        seen.add(normalized)
+        try:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+        except sqlite3.Error as e:
+            rows = [(0, 0, 0, f'無法解析：{e}')]
+        plans.append((normalized, [row[3] for row in rows]))
+    conn.close()
+    return plans
+
+
+def full_scans(plans):
+    """找出沒有使用索引的全表掃描步驟"""
+    return sorted({
+        step for _, steps in plans for step in steps
+        if step.startswith(SLOW_PLAN_MARKERS) and 'INDEX' not in step
+    })
+
+
+def measure(func, user_ids, repeat):
+    """輪流以不同用戶呼叫，回傳 (中位數 ms, p95 ms)
+
+    先對每位用戶各呼叫一次，讓預先計算的統計等首次存取成本不計入。
+    """
+    for user_id in user_ids:
+        func(user_id)
+    timings = []
+    for index in range(repeat):
+        user_id = user_ids[index % len(user_ids)]
+        started = time.perf_counter()
+        func(user_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def run_size(name, repeat, rebuild=False, show_plans=False, profile=False):
+    path = open_dataset(name, rebuild)
+    db = Database(path)
+    service = ExpenseService(db=db)
+    conn = sqlite3.connect(path)
+    rows = dict(
+        (table, conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0])
+        for table in ('users', 'expenses', 'daily_goals', 'diaries', 'vocabulary_words')
+    )
+    all_users = [row[0] for row in conn.execute('SELECT user_id FROM users ORDER BY user_id')]
+    conn.close()
+    user_ids = random.Random(7).sample(all_users, min(50, len(all_users)))
+
+    print(f"\n== {name}：" + '，'.join(f"{table} {count:,}" for table, count in rows.items()))
+    print(f"{'操作':<36}{'中位數 ms':>11}{'p95 ms':>10}  全表掃描")
+
+    if profile:
+        # 計時會包含分析本身的成本，與基準比較時不要開啟
+        query_profiler.enabled = True
+        query_profiler.profiler.reset()
+
+    results = {}
+    for op_name, func in build_operations(db, service, user_ids).items():
+        with capture_statements() as statements:
+            func(user_ids[0])
+        plans = explain(path, statements)
+        scans = full_scans(plans)
+        median, p95 = measure(func, user_ids, repeat)
+        results[op_name] = {'median_ms': round(median, 3), 'p95_ms': round(p95, 3), 'full_scans': scans}
+        print(f"{op_name:<36}{median:>11.3f}{p95:>10.3f}  {'; '.join(scans) or '-'}")
+        if show_plans:
+            for sql, steps in plans:
+                print(f"    {sql[:120]}")
+                for step in steps:
+                    print(f"      {step}")
+
+    if profile:
+        query_profiler.enabled = False
+        print(f"\n查詢統計（依總耗時排序）\n{query_profiler.profiler.format_report(15)}")
+    return {'rows': rows, 'operations': results}
+
+
+def compare(results, baseline, threshold):
+    """與基準比較，回傳退化項目清單"""
+    regressions = []
+    for size, current in results.items():
+        base_size = baseline.get('sizes', {}).get(size)
+        if not base_size:
+            continue
+        for op_name, current_op in current['operations'].items():
+            base_op = base_size['operations'].get(op_name)
+            if not base_op:
+                continue
+            base, now = base_op['median_ms'], current_op['median_ms']
+            if now > base * threshold and now - base > NOISE_FLOOR_MS:
+                regressions.append(f"{size}/{op_name}：{base:.3f} ms → {now:.3f} ms（×{now / base:.2f}）")
+            new_scans = set(current_op['full_scans']) - set(base_op['full_scans'])
+            if new_scans:
+                regressions.append(f"{size}/{op_name}：新增全表掃描 {'; '.join(sorted(new_scans))}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='資料庫操作效能測試')
+    parser.add_argument('--size', action='append', choices=list(SIZES),
+                        help='資料量規模，可重複指定（預設 small 與 medium）')
+    parser.add_argument('--repeat', type=int, default=100, help='每個操作的執行次數')
+    parser.add_argument('--rebuild', action='store_true', help='重新產生資料集')
+    parser.add_argument('--plans', action='store_true', help='顯示每個查詢的完整查詢計畫')
+    parser.add_argument('--profile', action='store_true', help='以查詢分析統計各語句的耗時')
+    parser.add_argument('--save-baseline', metavar='PATH', help='將結果儲存為基準')
+    parser.add_argument('--compare', metavar='PATH', help='與基準比較，退化時以狀態碼 1 結束')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='中位數超過基準幾倍視為退化')
+    args = parser.parse_args()
+
+    sizes = args.size or ['small', 'medium']
+    results = {size: run_size(size, args.repeat, args.rebuild, args.plans, args.profile) for size in sizes}
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'sqlite': sqlite3.sqlite_version,
+                'repeat': args.repeat,
+                'sizes': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n基準已儲存：{args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n與基準（{baseline.get('created_at')}）相比發現 {len(regressions)} 項退化：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n與基準（{baseline.get('created_at')}）相比沒有退化")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""記帳輸入解析效能測試
+
+比較舊版 split()/float() 解析與 ExpenseParser 在實際輸入語料上的速度與解析結果。
+
+使用方式：
+    python -m benchmarks.bench_expense_parser [--rounds 2000]
+"""
+import argparse
+import time
+
+from expense_parser import ExpenseParser
+
+DEFAULT_CATEGORIES = [
+    '飲食', '交通', '購物', '娛樂', '醫療',
+    '教育', '居住', '通訊', '其他', '寵物用品'
+]
+
+# 取自實際對話紀錄的記帳輸入
+CORPUS = [
+    '100 飲食 午餐',
+    '飲食 100 午餐',
+    '50 交通',
+    '交通 50 捷運',
+    '200 購物 衣服',
+    '午餐 120元',
+    '早餐 45 元',
+    '$1,200 購物 外套',
+    'NT$80 交通',
+    'NTD 35 公車',
+    '早餐 50 午餐 120',
+    '120 午餐 50 飲料',
+    '咖啡 65',
+    '房租 12,000',
+    '寵物 300 飼料',
+    '娛樂 350.5 電影',
+    '１５０ 飲食 便當',
+    '計程車 280塊',
+    '100 飲食 7-11',
+    '150 飲食 麥當勞2號餐',
+    '100 其他 iPhone15',
+    '今天好累',
+    '記帳',
+    '飲食 午餐',
+    'abc def',
+]
+
+
+def legacy_parse_expense_input(text):
+    """舊版解析邏輯（保留作為比較基準）"""
+    parts = text.strip().split()
+
+    if len(parts) < 2:
+        return None, None, None
+
+    amount = None
+    category = None
+    description = None
+
+    try:
+        amount = float(parts[0])
+        if len(parts) >= 2:
+            category = parts[1]
+        if len(parts) >= 3:
+            description = ' '.join(parts[2:])
+    except ValueError:
+        if len(parts) >= 2:
+            try:
+                amount = float(parts[1])
+                category = parts[0]
+                if len(parts) >= 3:
+                    description = ' '.join(parts[2:])
+            except ValueError:
+                return None, None, None
+
+    return amount, category, description
+
+
+def _time(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in CORPUS:
+            func(text)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(CORPUS)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='記帳輸入解析效能測試')
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    expense_parser = ExpenseParser()
+
+    def new_parse(text):
+        return expense_parser.parse(text, DEFAULT_CATEGORIES)
+
+    legacy_us = _time(legacy_parse_expense_input, args.rounds)
+    tokenize_us = _time(expense_parser.tokenize, args.rounds)
+    new_us = _time(new_parse, args.rounds)
+
+    print(f"語料筆數: {len(CORPUS)}，每筆重複 {args.rounds} 次")
+    print(f"舊版解析: {legacy_us:.2f} µs/筆")
+    print(f"新版斷詞: {tokenize_us:.2f} µs/筆")
+    print(f"新版解析（含分類比對）: {new_us:.2f} µs/筆")
+    print()
+
+    legacy_ok = 0
+    new_ok = 0
+    for text in CORPUS:
+        legacy = legacy_parse_expense_input(text)
+        items = new_parse(text)
+        legacy_ok += legacy[0] is not None
+        new_ok += bool(items)
+        print(f"{text!r:24} 舊版={legacy}  新版={items}")
+
+    print()
+    print(f"可解析筆數: 舊版 {legacy_ok}/{len(CORPUS)}，新版 {new_ok}/{len(CORPUS)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""排程任務吞吐量測試
+
+建立 N 位合成用戶，將 Scheduler 接到本機替身（假 LINE 推播伺服器、SMTP 收件伺服器、
+可設定延遲的假 OpenAI），執行早上、晚上、總結與單字任務，
+回報每個任務的總耗時、每秒處理用戶數，以及資料庫、任務記錄、AI、LINE、郵件各階段的耗時。
+
+使用方式：
+    python -m benchmarks.bench_scheduler [--users 1000] [--concurrency 4] \\
+        [--openai-latency 0.5] [--line-latency 0.05] [--smtp-latency 0.05] [--job morning]
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from linebot import LineBotApi
+from linebot.deprecations import LineBotSdkDeprecatedIn30
+
+from config import Config
+from database import Database
+from email_service import EmailService
+from scheduler import Scheduler
+from vocabulary_service import VocabularyService
+from benchmarks.fake_line import FakeLineServer
+from benchmarks.fake_openai import FakeOpenAIService
+from benchmarks.fake_smtp import SMTPSink
+from logging_setup import setup_logging, shutdown_logging
+
+JOBS = ['morning', 'evening', 'summary', 'vocabulary']
+
+# 任務執行記錄相關的資料庫操作另外統計
+LEDGER_METHODS = {
+    'start_job_run', 'add_job_deliveries', 'get_pending_deliveries',
+    'mark_deliveries', 'finish_job_run'
+}
+
+
+class StageTimer:
+    """累計各階段的呼叫次數與耗時（多執行緒共用）"""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.totals[stage] += seconds
+            self.calls[stage] += 1
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+            self.calls.clear()
+
+    def wrap(self, target, stage):
+        """回傳代理物件，呼叫 target 的方法時計入 stage（stage 可為 方法名稱 -> 階段 的函式）"""
+        return _Timed(target, stage, self)
+
+
+class _Timed:
+    def __init__(self, target, stage, timer):
+        self._target = target
+        self._stage = stage
+        self._timer = timer
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        stage = self._stage(name) if callable(self._stage) else self._stage
+        timer = self._timer
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                timer.add(stage, time.perf_counter() - started)
+
+        return timed
+
+
+def seed_users(db_path, count, seed=42):
+    """建立合成用戶與今日、昨日的資料，回傳用戶 ID 清單"""
+    db = Database(db_path)
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+    user_ids = [f'Ubench{index:07d}' for index in range(count)]
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for user_id in user_ids:
+        cursor.execute('INSERT INTO users (user_id, name) VALUES (?, ?)', (user_id, f'用戶{user_id[-4:]}'))
+        db._insert_default_preferences(cursor, user_id)
+        if rng.random() < 0.6:
+            cursor.execute('''
+                INSERT INTO daily_goals (user_id, goal1, goal2, goal3, date) VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, '運動', '讀書', '早睡', yesterday))
+        if rng.random() < 0.6:
+            cursor.execute('''
+                INSERT INTO daily_goals (user_id, goal1, goal2, goal3, date) VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, '跑步', '背單字', '記帳', today))
+        if rng.random() < 0.4:
+            cursor.execute('INSERT INTO diaries (user_id, content, date) VALUES (?, ?, ?)',
+                           (user_id, '今天完成了很多事情，也喝了一杯咖啡。', today))
+        cursor.executemany('''
+            INSERT INTO expenses (user_id, amount, category, description, date) VALUES (?, ?, ?, ?, ?)
+        ''', [(user_id, rng.randint(30, 500), '飲食', '午餐', today) for _ in range(rng.randint(0, 4))])
+        if rng.random() < 0.5:
+            # 昨天記錄的單字今天到期
+            db._insert_words(cursor, user_id, ['habit', 'persistent', 'diligent'], yesterday)
+    conn.commit()
+    conn.close()
+    return user_ids
+
+
+def run_job(scheduler, job, users, concurrency):
+    """將用戶分成 concurrency 批同時執行（類似派送視窗中的多個批次）"""
+    task = getattr(scheduler, f'{job}_task')
+    run_prefix = f'bench-{time.time_ns()}'
+    chunks = [users[index::concurrency] for index in range(concurrency)]
+    with ThreadPoolExecutor(concurrency) as pool:
+        futures = [
+            pool.submit(task, chunk, f'{run_prefix}-{index}')
+            for index, chunk in enumerate(chunks) if chunk
+        ]
+        for future in futures:
+            future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='排程任務吞吐量測試')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=Config.SCHEDULER_WORKERS,
+                        help='同時執行的批次數')
+    parser.add_argument('--openai-latency', type=float, default=0.0, help='假 OpenAI 每次回應的延遲秒數')
+    parser.add_argument('--line-latency', type=float, default=0.0, help='假 LINE API 每次回應的延遲秒數')
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help='SMTP 伺服器每封郵件的延遲秒數')
+    parser.add_argument('--job', action='append', choices=JOBS, help='只執行指定任務，可重複指定')
+    parser.add_argument('--verbose', action='store_true', help='顯示排程器的日誌')
+    args = parser.parse_args()
+
+    # 專案仍使用舊版 LineBotApi，避免每次推播都印出棄用警告
+    warnings.filterwarnings('ignore', category=LineBotSdkDeprecatedIn30)
+    setup_logging(level='INFO' if args.verbose else 'ERROR')
+
+    workdir = tempfile.mkdtemp(prefix='bench-scheduler-')
+    db_path = os.path.join(workdir, 'bench.db')
+    fake_line = FakeLineServer(latency=args.line_latency).start()
+    smtp = SMTPSink(latency=args.smtp_latency).start()
+
+    Config.EMAIL_HOST, Config.EMAIL_PORT = smtp.host, smtp.port
+    Config.EMAIL_USER, Config.EMAIL_PASSWORD, Config.EMAIL_TO = 'bench', 'bench', 'bench@example.com'
+    Config.EMAIL_USE_TLS = False
+    # 停用速率限制，量測的是系統本身的處理能力
+    Config.DISPATCH_RATE = 0
+
+    try:
+        started = time.perf_counter()
+        users = seed_users(db_path, args.users)
+        print(f"已建立 {len(users)} 位用戶（{time.perf_counter() - started:.1f} 秒）")
+
+        stages = StageTimer()
+        db = Database(db_path)
+        line_bot_api = LineBotApi('bench-token', endpoint=fake_line.url)
+        scheduler = Scheduler(
+            stages.wrap(line_bot_api, 'LINE 推播'),
+            max_workers=args.concurrency,
+            db=stages.wrap(db, lambda name: '任務記錄' if name in LEDGER_METHODS else '資料庫'),
+            email_service=stages.wrap(EmailService(), '郵件'),
+            openai_service=stages.wrap(FakeOpenAIService(args.openai_latency), 'AI'),
+            vocabulary_service=stages.wrap(VocabularyService(db), '單字服務')
+        )
+
+        print(f"同時批次 {args.concurrency}，延遲 OpenAI {args.openai_latency}s / "
+              f"LINE {args.line_latency}s / SMTP {args.smtp_latency}s")
+        for job in args.job or JOBS:
+            stages.reset()
+            fake_line.reset()
+            sent_before = smtp.messages
+
+            started = time.perf_counter()
+            run_job(scheduler, job, users, args.concurrency)
+            elapsed = time.perf_counter() - started
+
+            stage_total = sum(stages.totals.values()) or 1
+            print(f"\n== {job}_task：{len(users)} 位用戶，{elapsed:.2f} 秒，{len(users) / elapsed:.1f} 用戶/秒，"
+                  f"LINE 推播 {fake_line.calls['push']}，郵件 {smtp.messages - sent_before}")
+            print(f"{'階段':<10}{'呼叫':>9}{'總耗時 s':>11}{'平均 ms':>10}{'占比':>8}")
+            for stage, total in sorted(stages.totals.items(), key=lambda item: -item[1]):
+                calls = stages.calls[stage]
+                print(f"{stage:<10}{calls:>9}{total:>11.2f}{total / calls * 1000:>10.2f}"
+                      f"{total / stage_total:>8.0%}")
+    finally:
+        fake_line.stop()
+        smtp.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutdown_logging()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Webhook 端對端效能測試
+
+在本機啟動 Flask 應用與假的 LINE API 伺服器（benchmarks.fake_line），使用暫存資料庫，
+送出已簽章的合成事件（文字指令、加好友、取消好友、多事件批次），
+依指令類型回報 p50/p95/p99 延遲與每秒處理事件數。
+
+使用方式：
+    python -m benchmarks.bench_webhook [--iterations 200] [--concurrency 8] [--line-latency 0.02]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from config import Config
+from benchmarks.fake_line import FakeLineServer
+from benchmarks.load_callback import percentile
+from benchmarks.webhook_events import build_body, follow_event, sign, text_event, unfollow_event
+
+SECRET = 'bench-channel-secret'
+
+# 每個情境是一連串送給同一位用戶的請求：(標籤, 產生事件的函式)
+# 有對話狀態的指令（記帳、目標）以完整流程送出，後續輸入另外計時
+SCENARIOS = {
+    'follow': [('加好友', lambda user: [follow_event(user)])],
+    'help': [('幫助', lambda user: [text_event(user, '幫助')])],
+    'expense': [
+        ('記帳', lambda user: [text_event(user, '記帳')]),
+        ('記帳輸入', lambda user: [text_event(user, '120 飲食 午餐')]),
+    ],
+    'expense_summary': [('記帳統計', lambda user: [text_event(user, '記帳統計')])],
+    'budget': [('預算', lambda user: [text_event(user, '預算')])],
+    'goals': [
+        ('目標', lambda user: [text_event(user, '目標')]),
+        ('目標輸入', lambda user: [text_event(user, '運動')]),
+        ('目標輸入', lambda user: [text_event(user, '讀書')]),
+        ('目標輸入', lambda user: [text_event(user, '早睡')]),
+    ],
+    'search': [('搜尋', lambda user: [text_event(user, '搜尋 午餐')])],
+    'default': [('一般訊息', lambda user: [text_event(user, '今天天氣很好')])],
+    'batch': [('批次（5 事件）', lambda user: [
+        text_event(user, '幫助'),
+        text_event(user, '記帳統計'),
+        text_event(user, '預算'),
+        text_event(user, '搜尋 午餐'),
+        text_event(user, '今天天氣很好'),
+    ])],
+    'unfollow': [('取消好友', lambda user: [unfollow_event(user)])],
+}
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def post(url, events):
+    body = build_body(events)
+    req = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'X-Line-Signature': sign(SECRET, body)
+    })
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run_scenario(url, steps, iterations, concurrency, users):
+    """執行單一情境，回傳 {標籤: {'latencies': [...], 'events': n, 'errors': n}} 與耗時"""
+    results = defaultdict(lambda: {'latencies': [], 'events': 0, 'errors': 0})
+    lock = threading.Lock()
+
+    def worker(offset):
+        # 每個執行緒使用不重複的用戶，避免對話狀態互相干擾
+        for index in range(offset, iterations, concurrency):
+            user = users[index % len(users)]
+            for label, make_events in steps:
+                events = make_events(user)
+                started = time.perf_counter()
+                status = post(url, events)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    result = results[label]
+                    result['latencies'].append(elapsed)
+                    result['events'] += len(events)
+                    if status != 200:
+                        result['errors'] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook 端對端效能測試')
+    parser.add_argument('--iterations', type=int, default=200, help='每個情境執行次數')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--line-latency', type=float, default=0.0,
+                        help='假 LINE API 每次回應的延遲秒數')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help='只執行指定情境，可重複指定（預設全部，依序執行）')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-webhook-')
+    fake_line = FakeLineServer(latency=args.line_latency).start()
+
+    # 服務延遲建立，在第一次請求前替換設定即可指向暫存資料庫與假伺服器
+    Config.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+    Config.LINE_CHANNEL_SECRET = SECRET
+    Config.LINE_CHANNEL_ACCESS_TOKEN = 'bench-token'
+    Config.LINE_API_ENDPOINT = fake_line.url
+    Config.OPENAI_API_KEY = None
+
+    from logging_setup import setup_logging, shutdown_logging
+    # 應用程式的日誌只保留錯誤，避免與結果表格混在一起
+    setup_logging(level='ERROR')
+    import services
+    from app import create_app
+    services.reset()
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True,
+                         request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/callback'
+
+    users = [f'Ubench{index:05d}' for index in range(args.users)]
+    names = args.scenario or list(SCENARIOS)
+    if 'follow' not in names:
+        # 先建立用戶，避免後續情境都走新用戶（取得個人資料）的路徑
+        run_scenario(url, SCENARIOS['follow'], len(users), args.concurrency, users)
+
+    rows = []
+    try:
+        for name in names:
+            results, elapsed = run_scenario(url, SCENARIOS[name], args.iterations, args.concurrency, users)
+            for label, result in results.items():
+                latencies = sorted(result['latencies'])
+                rows.append(
+                    f"{label:<14}{len(latencies):>7}{result['events']:>7}{result['errors']:>6}"
+                    f"{percentile(latencies, 50) * 1000:>9.1f}"
+                    f"{percentile(latencies, 95) * 1000:>9.1f}"
+                    f"{percentile(latencies, 99) * 1000:>9.1f}"
+                    f"{result['events'] / elapsed:>10.1f}"
+                )
+
+        # 表格最後一次印出，不與執行過程的輸出交錯
+        print(f"{'指令':<14}{'請求':>7}{'事件':>7}{'錯誤':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'事件/秒':>10}")
+        print('\n'.join(rows))
+        print('假 LINE API 呼叫：' + '，'.join(f"{kind}×{count}" for kind, count in sorted(fake_line.calls.items())))
+    finally:
+        server.shutdown()
+        fake_line.stop()
+        services.reset()
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutdown_logging()
+
+
+if __name__ == '__main__':
+    main()
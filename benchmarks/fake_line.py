@@ -0,0 +1,90 @@
+"""本機假 LINE Messaging API 伺服器
+
+回應 reply / push / multicast 與 get_profile 請求並記錄呼叫次數，讓壓力測試不必連到真正的 LINE 平台。
+將 LINE_API_ENDPOINT 指向 FakeLineServer.url 即可使用。
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLineServer:
+    """假 LINE API 伺服器，latency 可模擬網路延遲（秒）"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.messages = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-line', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.messages.clear()
+
+    def record(self, kind, message_count=0):
+        with self._lock:
+            self.calls[kind] += 1
+            self.messages[kind] += message_count
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                if self.path.startswith('/v2/bot/profile/'):
+                    user_id = self.path.rsplit('/', 1)[-1]
+                    server.record('profile')
+                    self._reply(200, {'userId': user_id, 'displayName': f'測試{user_id[-4:]}'})
+                else:
+                    server.record('unknown')
+                    self._reply(404, {'message': 'Not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if server.latency:
+                    time.sleep(server.latency)
+                kind = self.path.rsplit('/', 1)[-1]
+                if self.path.startswith('/v2/bot/message/') and kind in ('reply', 'push', 'multicast', 'broadcast'):
+                    server.record(kind, len(body.get('messages', [])))
+                    self._reply(200, {})
+                else:
+                    server.record('unknown')
+                    self._reply(404, {'message': 'Not found'})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
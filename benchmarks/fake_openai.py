@@ -0,0 +1,30 @@
+"""模擬 OpenAI 回應的 OpenAIService
+
+不連線 OpenAI，每次呼叫等待 latency 秒後回傳固定內容，用來評估 AI 回應時間對排程任務的影響。
+"""
+import time
+
+from openai_service import OpenAIService
+
+
+class FakeOpenAIService(OpenAIService):
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+
+    def _respond(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return text
+
+    def generate_motivational_message(self, user_name, goals=None):
+        return self._respond(f"早安 {user_name}！今天也一起努力達成目標吧！")
+
+    def generate_evening_reflection(self, user_name):
+        return self._respond(f"晚安 {user_name}，今天過得如何？花幾分鐘記錄一下吧。")
+
+    def generate_vocabulary_suggestions(self, user_name):
+        return self._respond(f"{user_name}，今天試著學習 habit、persistent、diligent 這幾個單字吧！")
+
+    def enhance_summary(self, summary_data):
+        return self._respond("今天的你很棒，明天繼續保持！")
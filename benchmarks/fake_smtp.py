@@ -0,0 +1,97 @@
+"""本機 SMTP 收件伺服器
+
+接受任何帳號登入（AUTH PLAIN / LOGIN）並丟棄收到的郵件，只記錄封數與大小。
+不支援 STARTTLS，使用時請設定 EMAIL_USE_TLS=false。
+"""
+import socketserver
+import threading
+
+
+class SMTPSink:
+    """SMTP 收件伺服器，latency 可模擬每封郵件的處理延遲（秒）"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _received(self, size):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+    def _make_handler(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            # 逐行回應，關閉 Nagle 避免與延遲 ACK 疊加出約 40ms 的假延遲
+            disable_nagle_algorithm = True
+
+            def send(self, line):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                self.send('220 smtp-sink ready')
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('utf-8', 'replace').strip()
+                    verb = command.split(' ', 1)[0].upper()
+                    if verb == 'EHLO':
+                        self.send('250-smtp-sink')
+                        self.send('250-AUTH PLAIN LOGIN')
+                        self.send('250 8BITMIME')
+                    elif verb == 'HELO':
+                        self.send('250 smtp-sink')
+                    elif verb == 'AUTH':
+                        parts = command.split()
+                        if len(parts) == 2 and parts[1].upper() == 'LOGIN':
+                            # 帳號與密碼各一次挑戰
+                            for _ in range(2):
+                                self.send('334 ')
+                                self.rfile.readline()
+                        elif len(parts) == 2:
+                            self.send('334 ')
+                            self.rfile.readline()
+                        self.send('235 authenticated')
+                    elif verb == 'DATA':
+                        self.send('354 end with <CRLF>.<CRLF>')
+                        size = 0
+                        while True:
+                            data = self.rfile.readline()
+                            if not data or data in (b'.\r\n', b'.\n'):
+                                break
+                            size += len(data)
+                        if sink.latency:
+                            threading.Event().wait(sink.latency)
+                        sink._received(size)
+                        self.send('250 queued')
+                    elif verb == 'QUIT':
+                        self.send('221 bye')
+                        return
+                    elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                        self.send('250 ok')
+                    else:
+                        self.send('502 not implemented')
+
+        return Handler
@@ -0,0 +1,112 @@
+"""/callback 壓力測試
+
+以多個執行緒持續送出已簽章的 LINE Webhook 請求，回報吞吐量與延遲百分位數，
+用來決定 gunicorn 的工作程序數（WEB_CONCURRENCY）與執行緒數（WEB_THREADS）。
+
+回覆訊息會送往 LINE_API_ENDPOINT，請在測試用的頻道或假的 LINE 伺服器（benchmarks.fake_line）上執行；
+不需要外部伺服器的完整測試請使用 benchmarks.bench_webhook。
+
+使用方式：
+    python -m benchmarks.load_callback --url http://127.0.0.1:5000/callback \\
+        [--concurrency 16] [--requests 2000] [--users 200] [--secret ...]
+"""
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from config import Config
+from benchmarks.webhook_events import build_body, sign, text_event
+
+# 不進入對話狀態的指令，重複送出時每次都走相同的處理路徑
+DEFAULT_COMMANDS = ['幫助', '記帳統計', '預算', '搜尋 午餐']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(url, secret, total, concurrency, users, commands, timeout=10):
+    """送出 total 個請求，回傳 (各請求延遲秒數, 狀態碼統計, 總耗時)"""
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    result_lock = threading.Lock()
+
+    def next_index():
+        with counter_lock:
+            return next(counter, None)
+
+    def worker():
+        while True:
+            index = next_index()
+            if index is None:
+                return
+            body = build_body([text_event(f'Uload{index % users:05d}', commands[index % len(commands)])])
+            req = urllib.request.Request(url, data=body, method='POST', headers={
+                'Content-Type': 'application/json',
+                'X-Line-Signature': sign(secret, body)
+            })
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as resp:
+                    resp.read()
+                    status = resp.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with result_lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/callback 壓力測試')
+    parser.add_argument('--url', default=f'http://127.0.0.1:{Config.PORT}/callback')
+    parser.add_argument('--secret', default=Config.LINE_CHANNEL_SECRET,
+                        help='簽章用的 Channel Secret（需與伺服器設定相同）')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--command', action='append', dest='commands',
+                        help='送出的訊息內容，可重複指定（預設為一組唯讀指令）')
+    args = parser.parse_args()
+
+    if not args.secret:
+        parser.error('請以 --secret 或 LINE_CHANNEL_SECRET 指定 Channel Secret')
+
+    commands = args.commands or DEFAULT_COMMANDS
+    latencies, statuses, elapsed = run(
+        args.url, args.secret, args.requests, args.concurrency, args.users, commands
+    )
+    latencies.sort()
+
+    print(f"請求數 {len(latencies)}，同時連線 {args.concurrency}，耗時 {elapsed:.2f} 秒")
+    print(f"吞吐量 {len(latencies) / elapsed:.1f} 請求/秒")
+    print(
+        f"延遲 p50 {percentile(latencies, 50) * 1000:.1f} ms"
+        f"  p95 {percentile(latencies, 95) * 1000:.1f} ms"
+        f"  p99 {percentile(latencies, 99) * 1000:.1f} ms"
+        f"  最大 {latencies[-1] * 1000 if latencies else 0:.1f} ms"
+    )
+    print('狀態碼：' + '，'.join(f"{status}×{count}" for status, count in sorted(statuses.items(), key=str)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""合成 LINE Webhook 事件與簽章"""
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import time
+
+_ids = itertools.count(1)
+
+
+def _base(event_type, user_id):
+    index = next(_ids)
+    return {
+        'type': event_type,
+        'mode': 'active',
+        'timestamp': int(time.time() * 1000),
+        'source': {'type': 'user', 'userId': user_id},
+        'webhookEventId': f'bench-{index}',
+        'deliveryContext': {'isRedelivery': False},
+        'replyToken': f'reply-{index}'
+    }
+
+
+def text_event(user_id, text):
+    event = _base('message', user_id)
+    event['message'] = {
+        'type': 'text', 'id': event['webhookEventId'],
+        'quoteToken': event['replyToken'], 'text': text
+    }
+    return event
+
+
+def follow_event(user_id):
+    event = _base('follow', user_id)
+    event['follow'] = {'isUnblocked': False}
+    return event
+
+
+def unfollow_event(user_id):
+    event = _base('unfollow', user_id)
+    del event['replyToken']
+    return event
+
+
+def build_body(events):
+    """將事件組成 Webhook 請求內容"""
+    return json.dumps({'destination': 'bench', 'events': events}, ensure_ascii=False).encode('utf-8')
+
+
+def sign(secret, body):
+    """計算 X-Line-Signature"""
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('utf-8')
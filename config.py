@@ -7,6 +7,8 @@ class Config:
     # Line Bot 設定
     LINE_CHANNEL_ACCESS_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
     LINE_CHANNEL_SECRET = os.getenv('LINE_CHANNEL_SECRET')
+    # LINE API 端點（壓力測試時指向本機假伺服器）
+    LINE_API_ENDPOINT = os.getenv('LINE_API_ENDPOINT', 'https://api.line.me')
     
     # OpenAI 設定
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -17,11 +19,111 @@ class Config:
     EMAIL_USER = os.getenv('EMAIL_USER')
     EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
     EMAIL_TO = os.getenv('EMAIL_TO')
+    # 是否使用 STARTTLS（本機測試用的 SMTP 伺服器可關閉）
+    EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'true').lower() == 'true'
     
     # 資料庫設定
-    DATABASE_PATH = 'never_give_up.db'
+    DATABASE_PATH = os.getenv('DATABASE_PATH', 'never_give_up.db')
+    # 設定 postgresql:// 連線字串時改用 PostgreSQL（多台機器共用），未設定時使用 DATABASE_PATH 的 SQLite
+    DATABASE_URL = os.getenv('DATABASE_URL', '')
+    # PostgreSQL 連線池大小（每個程序）
+    DATABASE_POOL_MIN = int(os.getenv('DATABASE_POOL_MIN', '1'))
+    DATABASE_POOL_MAX = int(os.getenv('DATABASE_POOL_MAX', '10'))
+    # SQLite 分片數：大於 1 時用戶依 ID 分到多個資料庫檔案，不同分片的寫入可以同時進行
+    DATABASE_SHARDS = int(os.getenv('DATABASE_SHARDS', 1))
     
-    # 時間設定
+    # 時間設定（新用戶的預設時區與提醒時間，用戶可自行調整）
+    DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE', 'Asia/Taipei')
     MORNING_TIME = "08:00"
     EVENING_TIME = "20:00"
-    SUMMARY_TIME = "20:30" 
\ No newline at end of file
+    SUMMARY_TIME = "20:30"
+    VOCABULARY_TIME = "12:00"
+    
+    # 排程器同時執行的任務數
+    SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', 4))
+    
+    # 派送視窗：同一分鐘到期的用戶依 ID 雜湊分散到視窗內（0 表示不分散）
+    DISPATCH_WINDOW_MINUTES = int(os.getenv('DISPATCH_WINDOW_MINUTES', 0))
+    # 每秒最多處理的用戶數（0 表示不限制）
+    DISPATCH_RATE = float(os.getenv('DISPATCH_RATE', 0))
+    
+    # 網頁程序是否同時執行排程（建議改用 python -m worker 獨立執行）
+    RUN_SCHEDULER_IN_WEB = os.getenv('RUN_SCHEDULER_IN_WEB', 'false').lower() == 'true'
+    
+    # 領導者租約秒數（多程序時只有持有租約者執行排程）
+    LEADER_LEASE_SECONDS = int(os.getenv('LEADER_LEASE_SECONDS', 30))
+    
+    # 任務執行記錄：單一用戶最多嘗試次數、中斷後可續跑的時限（小時）
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    JOB_RESUME_HOURS = int(os.getenv('JOB_RESUME_HOURS', 6))
+    # 任務執行記錄與各用戶發送狀態的保留天數（每小時清除更早結束的記錄）
+    JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 14))
+    
+    # 單字複習提醒每批處理的用戶數
+    VOCABULARY_BATCH_SIZE = int(os.getenv('VOCABULARY_BATCH_SIZE', 500))
+    
+    # 記帳統計設定（DEBOUNCE：記帳後多少秒由排程器重新計算統計）
+    EXPENSE_STATS_WINDOWS = [7, 30, 90]
+    EXPENSE_STATS_DEBOUNCE = float(os.getenv('EXPENSE_STATS_DEBOUNCE', 5))
+    BUDGET_ALERT_THRESHOLDS = [0.8, 1.0]
+    
+    # 訊息快取設定
+    VIEW_CACHE_MAX_USERS = int(os.getenv('VIEW_CACHE_MAX_USERS', 10000))
+    # 沿用畫面版本的秒數：其他程序寫入後最慢這麼久才失效（0 表示每次命中都查詢資料庫）
+    VIEW_CACHE_VERSION_TTL = float(os.getenv('VIEW_CACHE_VERSION_TTL', 2))
+    
+    # 對話狀態保存秒數（超過未回應即視為放棄）
+    USER_STATE_TTL = int(os.getenv('USER_STATE_TTL', 3600))
+    
+    # 網頁服務設定（gunicorn.conf.py 讀取）
+    PORT = int(os.getenv('PORT', 5000))
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 2))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 8))
+    WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', 5))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 30))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', 2000))
+    FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'false').lower() == 'true'
+    
+    # 效能指標（/metrics），關閉時不增加任何成本
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    # 多個程序（gunicorn 工作程序、排程工作程序）共用的指標目錄，設定後 /metrics 輸出所有程序的合計
+    METRICS_DIR = os.getenv('METRICS_DIR', '')
+    METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+    # /metrics 以 Authorization: Bearer <METRICS_TOKEN> 驗證（未設定時使用 ADMIN_TOKEN）
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    
+    # 日誌設定：等級、格式（text / json）、INFO 以下記錄的抽樣比例、慢請求門檻（毫秒）
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1))
+    LOG_SLOW_MS = int(os.getenv('LOG_SLOW_MS', 1000))
+    
+    # 資料庫查詢分析：啟用後統計各語句耗時，超過門檻（毫秒）的查詢連同執行計畫記錄為 WARNING
+    DB_PROFILE = os.getenv('DB_PROFILE', 'false').lower() == 'true'
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 100))
+    DB_PROFILE_TOP = int(os.getenv('DB_PROFILE_TOP', 20))
+    
+    # 管理端點（/admin/...）使用的 Bearer token，未設定時不提供管理端點
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    
+    # 取樣分析（/admin/profile 或 SIGUSR2 開關）：輸出目錄、取樣間隔（毫秒）、單次最長秒數
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 10))
+    PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', 300))
+    
+    # 資料保留：早於 RETENTION_DAYS 的記帳、目標、日記與單字記錄依年份搬到 ARCHIVE_DIR
+    # ARCHIVE_TIME（HH:MM）設定後由排程器每天執行，未設定時只能以 python -m archive 手動執行
+    RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', 730))
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+    ARCHIVE_TIME = os.getenv('ARCHIVE_TIME', '')
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+    
+    # 線上備份：備份目錄、保留份數、是否壓縮、每段複製頁數與段間暫停（毫秒）
+    # BACKUP_TIME（HH:MM）設定後由排程器每天執行，未設定時以 python -m backup 手動或 cron 執行
+    BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', 7))
+    BACKUP_COMPRESS = os.getenv('BACKUP_COMPRESS', 'true').lower() == 'true'
+    BACKUP_PAGES = int(os.getenv('BACKUP_PAGES', 1024))
+    BACKUP_SLEEP_MS = float(os.getenv('BACKUP_SLEEP_MS', 10))
+    BACKUP_TIME = os.getenv('BACKUP_TIME', '')
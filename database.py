@@ -1,134 +1,577 @@
 import sqlite3
 import datetime
+import json
+import time
+import threading
+import logging
 from config import Config
+import metrics
+import query_profiler
+from vocabulary_service import parse_words, normalize_word
+from reminders import REMINDER_TYPES, default_reminder_times, to_utc_minute, local_today
+from models import User, DailyGoals, Diary, Expense, row_factory
 
+logger = logging.getLogger(__name__)
+
+# 全文檢索 rowid 編碼：日記為 id*2，單字記錄為 id*2+1，觸發器可直接以 rowid 刪除
+SEARCH_SOURCES = {
+    'diary': ('diaries', 'content', 0),
+    'vocabulary': ('vocabulary_records', 'words', 1),
+}
+
+# 遞增用戶畫面版本：與資料寫入放在同一交易，不另外開連線與提交
+BUMP_VIEW_VERSION_SQL = '''
+    INSERT INTO view_versions (user_id, version) VALUES (?, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = view_versions.version + 1
+'''
+
+# 表格與索引定義（SQLite 語法）；PostgreSQL 後端轉換欄位型別後建立同樣的表格（postgres_database.py）
+# interval 是 PostgreSQL 的保留字，欄位名稱一律加上雙引號
+_REMINDER_COLUMNS = ''.join(
+    f'{reminder}_time TEXT, {reminder}_minute INTEGER, ' for reminder in REMINDER_TYPES
+)
+TABLES = [
+    # 用戶表格
+    '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    # 用戶時區與提醒時間設定（*_minute 為 UTC 當日分鐘數，供排程分桶查詢）
+    f'''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id TEXT PRIMARY KEY,
+            timezone TEXT NOT NULL,
+            {_REMINDER_COLUMNS}
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 每日目標表格
+    '''
+        CREATE TABLE IF NOT EXISTS daily_goals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            goal1 TEXT,
+            goal2 TEXT,
+            goal3 TEXT,
+            date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 日記表格
+    '''
+        CREATE TABLE IF NOT EXISTS diaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            content TEXT,
+            date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 單字學習記錄表格
+    '''
+        CREATE TABLE IF NOT EXISTS vocabulary_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            words TEXT,
+            date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 單字表格（每個單字一列，含間隔重複排程）
+    '''
+        CREATE TABLE IF NOT EXISTS vocabulary_words (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            word TEXT NOT NULL,
+            normalized TEXT NOT NULL,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            "interval" INTEGER NOT NULL DEFAULT 0,
+            ease REAL NOT NULL DEFAULT 2.5,
+            due_date DATE NOT NULL,
+            last_reviewed DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, normalized),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 記帳表格
+    '''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            amount DECIMAL(10,2) NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT,
+            date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 記帳分類表格
+    '''
+        CREATE TABLE IF NOT EXISTS expense_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            category_name TEXT NOT NULL,
+            color TEXT DEFAULT '#4CAF50',
+            is_default BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 記帳統計快取表格（滾動區間預先計算）
+    '''
+        CREATE TABLE IF NOT EXISTS expense_stats (
+            user_id TEXT,
+            window_days INTEGER,
+            total DECIMAL(10,2) NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            categories TEXT,
+            stats_date DATE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, window_days),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 待重新計算統計的用戶：記帳時與記錄同一交易寫入，程序重啟或多個工作程序時也不會遺失
+    '''
+        CREATE TABLE IF NOT EXISTS expense_stats_pending (
+            user_id TEXT PRIMARY KEY,
+            marked_at REAL NOT NULL
+        )
+    ''',
+    # 記帳預算表格（每月各分類預算）
+    '''
+        CREATE TABLE IF NOT EXISTS expense_budgets (
+            user_id TEXT,
+            category TEXT NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            spent DECIMAL(10,2) NOT NULL DEFAULT 0,
+            alert_level REAL NOT NULL DEFAULT 0,
+            alert_period TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, category),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''',
+    # 排程任務執行記錄（每次執行一列，用於中斷後續跑）
+    '''
+        CREATE TABLE IF NOT EXISTS job_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_name TEXT NOT NULL,
+            run_key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            UNIQUE (job_name, run_key)
+        )
+    ''',
+    # 排程任務各用戶的發送狀態（pending / done / skipped / failed）
+    '''
+        CREATE TABLE IF NOT EXISTS job_deliveries (
+            run_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, user_id),
+            FOREIGN KEY (run_id) REFERENCES job_runs (run_id)
+        )
+    ''',
+    # 排程器領導者租約表格（多個程序只有一個執行排程）
+    '''
+        CREATE TABLE IF NOT EXISTS leader_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''',
+    # 對話狀態表格（多個網頁程序共用）
+    '''
+        CREATE TABLE IF NOT EXISTS user_states (
+            user_id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''',
+    # 畫面版本表格：資料異動時遞增，讓各程序的訊息快取得知需要重新產生
+    '''
+        CREATE TABLE IF NOT EXISTS view_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+]
+
+INDEXES = [
+    '''
+        CREATE INDEX IF NOT EXISTS idx_vocabulary_words_due
+        ON vocabulary_words (user_id, due_date)
+    ''',
+    # 記帳查詢索引
+    '''
+        CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+        ON expenses (user_id, date)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_job_runs_status
+        ON job_runs (status, started_at)
+    ''',
+    # 日記與單字記錄的用戶索引（搜尋短關鍵字時使用）
+    '''
+        CREATE INDEX IF NOT EXISTS idx_diaries_user_date
+        ON diaries (user_id, date)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_vocabulary_records_user_date
+        ON vocabulary_records (user_id, date)
+    ''',
+    # 目標與自訂分類的用戶索引（每次訊息與總結都會查詢）
+    '''
+        CREATE INDEX IF NOT EXISTS idx_daily_goals_user_date
+        ON daily_goals (user_id, date)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_expense_categories_user
+        ON expense_categories (user_id)
+    ''',
+] + [
+    f'''
+        CREATE INDEX IF NOT EXISTS idx_user_preferences_{reminder}
+        ON user_preferences ({reminder}_minute)
+    '''
+    for reminder in REMINDER_TYPES
+]
+
+# 到期單字查詢每個語句合併的用戶數（每位用戶 3 個參數，低於舊版 SQLite 999 個參數與 500 個複合查詢的上限）
+DUE_WORDS_USERS_PER_QUERY = 100
+
+# 已初始化的資料庫路徑 -> 是否支援全文檢索（同一程序內每個資料庫只建立一次表格）
+_initialized = {}
+_init_lock = threading.Lock()
+
+@metrics.instrument_methods('db_query_seconds', '資料庫操作執行時間')
 class Database:
-    def __init__(self):
-        self.db_path = Config.DATABASE_PATH
-        self.init_database()
+    # 後端名稱（封存、備份與查詢分析只支援 sqlite）
+    backend = 'sqlite'
+    # 未使用全文檢索時的搜尋比對運算子（SQLite 的 LIKE 不分英文大小寫）
+    like_operator = 'LIKE'
+    
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        with _init_lock:
+            if self.db_path not in _initialized:
+                self.init_database()
+                _initialized[self.db_path] = self.fts_enabled
+            self.fts_enabled = _initialized[self.db_path]
+    
+    @property
+    def db_paths(self):
+        """此後端使用的所有資料庫檔案（封存與備份逐一處理）"""
+        return [self.db_path]
+    
+    def _connect(self, **kwargs):
+        """開啟連線（啟用查詢分析時會記錄各語句耗時）"""
+        return query_profiler.connect(self.db_path, **kwargs)
     
     def init_database(self):
         """初始化資料庫表格"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        # 用戶表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id TEXT PRIMARY KEY,
-                name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # 新資料庫啟用 incremental vacuum，封存舊記錄後可分次歸還空間（既有資料庫由 archive 轉換）
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
         
-        # 每日目標表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS daily_goals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                goal1 TEXT,
-                goal2 TEXT,
-                goal3 TEXT,
-                date DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
+        # WAL 模式讓多個網頁程序可以同時讀取，寫入時不會互相阻擋讀取
+        cursor.execute('PRAGMA journal_mode=WAL')
         
-        # 日記表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS diaries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                content TEXT,
-                date DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
+        for statement in TABLES + INDEXES:
+            cursor.execute(statement)
         
-        # 單字學習記錄表格
+        # 新增提醒設定前已存在的用戶補上預設值
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS vocabulary_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                words TEXT,
-                date DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
+            SELECT user_id FROM users
+            WHERE user_id NOT IN (SELECT user_id FROM user_preferences)
         ''')
+        for (user_id,) in cursor.fetchall():
+            self._insert_default_preferences(cursor, user_id)
         
-        # 記帳表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                amount DECIMAL(10,2) NOT NULL,
-                category TEXT NOT NULL,
-                description TEXT,
-                date DATE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
+        self._backfill_vocabulary_words(cursor)
         
-        # 記帳分類表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expense_categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                category_name TEXT NOT NULL,
-                color TEXT DEFAULT '#4CAF50',
-                is_default BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
+        self.fts_enabled = self._init_search_index(cursor)
         
         conn.commit()
         conn.close()
     
+    def _init_search_index(self, cursor):
+        """建立全文檢索表與同步觸發器，SQLite 不支援 FTS5 時回傳 False"""
+        cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'search_index'")
+        row = cursor.fetchone()
+        exists = row is not None
+        if exists and 'user_id UNINDEXED' in row[0]:
+            # 舊版索引的 user_id 不在索引中，查詢會先比對所有用戶的記錄，重建後匯入既有資料
+            cursor.execute('DROP TABLE search_index')
+            exists = False
+        
+        if not exists:
+            try:
+                # trigram 分詞支援中文任意子字串搜尋；user_id 也建立索引，查詢時由索引限定用戶
+                cursor.execute('''
+                    CREATE VIRTUAL TABLE search_index USING fts5(
+                        content, user_id, source UNINDEXED, date UNINDEXED,
+                        tokenize = 'trigram'
+                    )
+                ''')
+            except sqlite3.OperationalError as e:
+                logger.warning("SQLite 不支援 FTS5 trigram，搜尋將使用一般查詢: %s", e)
+                return False
+        
+        for source, (table, column, offset) in SEARCH_SOURCES.items():
+            rowid = f'{{row}}.id * 2 + {offset}'
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO search_index (rowid, content, user_id, source, date)
+                    VALUES ({rowid.format(row='new')}, new.{column}, new.user_id, '{source}', new.date);
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+                    DELETE FROM search_index WHERE rowid = {rowid.format(row='old')};
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} BEGIN
+                    DELETE FROM search_index WHERE rowid = {rowid.format(row='old')};
+                    INSERT INTO search_index (rowid, content, user_id, source, date)
+                    VALUES ({rowid.format(row='new')}, new.{column}, new.user_id, '{source}', new.date);
+                END
+            ''')
+            
+            if not exists:
+                # 首次建立時匯入既有資料
+                cursor.execute(f'''
+                    INSERT INTO search_index (rowid, content, user_id, source, date)
+                    SELECT {rowid.format(row=table)}, {column}, user_id, '{source}', date
+                    FROM {table} WHERE {column} IS NOT NULL
+                ''')
+        
+        return True
+    
+    def _backfill_vocabulary_words(self, cursor):
+        """將舊的單字記錄拆成單字列（只在單字表為空時執行）"""
+        cursor.execute('SELECT 1 FROM vocabulary_words LIMIT 1')
+        if cursor.fetchone():
+            return
+        
+        cursor.execute('SELECT user_id, words, date FROM vocabulary_records ORDER BY id')
+        for user_id, words, date in cursor.fetchall():
+            self._insert_words(cursor, user_id, parse_words(words or ''), date)
+    
+    def _insert_words(self, cursor, user_id, word_list, date):
+        """新增單字列，已存在的單字略過，回傳新增數量"""
+        due_date = datetime.date.fromisoformat(str(date)) + datetime.timedelta(days=1)
+        cursor.executemany('''
+            INSERT INTO vocabulary_words (user_id, word, normalized, due_date)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        ''', [(user_id, word, normalize_word(word), due_date) for word in word_list])
+        # executemany 的 rowcount 為各筆異動數的總和，略過的單字不計入
+        return max(cursor.rowcount, 0)
+    
+    def _insert_default_preferences(self, cursor, user_id):
+        """建立用戶預設提醒設定（已存在則略過）"""
+        timezone = Config.DEFAULT_TIMEZONE
+        columns = ['user_id', 'timezone']
+        values = [user_id, timezone]
+        for reminder, local_time in default_reminder_times().items():
+            columns += [f'{reminder}_time', f'{reminder}_minute']
+            values += [local_time, to_utc_minute(local_time, timezone)]
+        cursor.execute(f'''
+            INSERT INTO user_preferences ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(values))})
+            ON CONFLICT DO NOTHING
+        ''', values)
+    
     def add_user(self, user_id, name):
         """新增用戶"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, name)
+            INSERT INTO users (user_id, name)
             VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET name = excluded.name
         ''', (user_id, name))
+        self._insert_default_preferences(cursor, user_id)
+        conn.commit()
+        conn.close()
+    
+    def get_user_preferences(self, user_id):
+        """取得用戶時區與提醒時間"""
+        columns = ', '.join(f'{reminder}_time' for reminder in REMINDER_TYPES)
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT timezone, {columns} FROM user_preferences WHERE user_id = ?
+        ''', (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return None
+        preferences = {'timezone': row[0]}
+        for index, reminder in enumerate(REMINDER_TYPES, 1):
+            preferences[reminder] = row[index]
+        return preferences
+    
+    def _today(self, cursor, user_id):
+        """在同一連線中查詢用戶時區，回傳用戶當地的今天"""
+        cursor.execute('SELECT timezone FROM user_preferences WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+        return local_today(row[0] if row else None)
+    
+    def get_user_today(self, user_id):
+        """取得用戶時區的今天（記錄日期與「今日」「昨日」都以此為準）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        today = self._today(cursor, user_id)
+        conn.close()
+        return today
+    
+    def get_user_dates(self, user_ids):
+        """一次查詢多位用戶時區的今天，回傳 {user_id: 日期}"""
+        if not user_ids:
+            return {}
+        placeholders = ', '.join('?' * len(user_ids))
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT user_id, timezone FROM user_preferences WHERE user_id IN ({placeholders})
+        ''', list(user_ids))
+        timezones = dict(cursor.fetchall())
+        conn.close()
+        
+        dates = {}
+        for user_id in user_ids:
+            timezone = timezones.get(user_id)
+            if timezone not in dates:
+                dates[timezone] = local_today(timezone)
+        return {user_id: dates[timezones.get(user_id)] for user_id in user_ids}
+    
+    def set_user_timezone(self, user_id, timezone):
+        """設定用戶時區並重新計算所有提醒的分桶"""
+        preferences = self.get_user_preferences(user_id)
+        assignments = ['timezone = ?']
+        values = [timezone]
+        for reminder in REMINDER_TYPES:
+            assignments.append(f'{reminder}_minute = ?')
+            values.append(to_utc_minute(preferences[reminder], timezone))
+        self._update_preferences(user_id, assignments, values)
+    
+    def set_reminder_time(self, user_id, reminder, local_time):
+        """設定單一提醒的當地時間"""
+        if reminder not in REMINDER_TYPES:
+            raise ValueError(f"未知的提醒類型: {reminder}")
+        preferences = self.get_user_preferences(user_id)
+        self._update_preferences(
+            user_id,
+            [f'{reminder}_time = ?', f'{reminder}_minute = ?'],
+            [local_time, to_utc_minute(local_time, preferences['timezone'])]
+        )
+    
+    def _update_preferences(self, user_id, assignments, values):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            UPDATE user_preferences
+            SET {', '.join(assignments)}, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ?
+        ''', values + [user_id])
+        conn.commit()
+        conn.close()
+    
+    def get_users_for_reminder(self, reminder, minute):
+        """取得指定 UTC 分鐘需要提醒的用戶（索引查詢）"""
+        if reminder not in REMINDER_TYPES:
+            raise ValueError(f"未知的提醒類型: {reminder}")
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT user_id FROM user_preferences WHERE {reminder}_minute = ?
+        ''', (minute,))
+        users = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return users
+    
+    def refresh_reminder_minutes(self):
+        """依今天的時區偏移重新計算分桶（處理日光節約時間），回傳更新筆數"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        updated = 0
+        for reminder in REMINDER_TYPES:
+            cursor.execute(f'''
+                SELECT DISTINCT timezone, {reminder}_time, {reminder}_minute
+                FROM user_preferences
+            ''')
+            for timezone, local_time, minute in cursor.fetchall():
+                new_minute = to_utc_minute(local_time, timezone)
+                if new_minute != minute:
+                    cursor.execute(f'''
+                        UPDATE user_preferences SET {reminder}_minute = ?
+                        WHERE timezone = ? AND {reminder}_time = ?
+                    ''', (new_minute, timezone, local_time))
+                    updated += cursor.rowcount
         conn.commit()
         conn.close()
+        return updated
     
     def get_user(self, user_id):
-        """取得用戶資料"""
-        conn = sqlite3.connect(self.db_path)
+        """取得用戶資料（User，不存在時為 None）"""
+        conn = self._connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        cursor.row_factory = row_factory(User)
+        cursor.execute('SELECT user_id, name, created_at FROM users WHERE user_id = ?', (user_id,))
         user = cursor.fetchone()
         conn.close()
         return user
     
+    def get_all_user_ids(self):
+        """取得所有用戶 ID"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT user_id FROM users')
+        users = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return users
+    
     def save_daily_goals(self, user_id, goal1, goal2, goal3):
         """儲存每日目標"""
-        today = datetime.date.today()
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        today = self._today(cursor, user_id)
         cursor.execute('''
-            INSERT OR REPLACE INTO daily_goals (user_id, goal1, goal2, goal3, date)
+            INSERT INTO daily_goals (user_id, goal1, goal2, goal3, date)
             VALUES (?, ?, ?, ?, ?)
         ''', (user_id, goal1, goal2, goal3, today))
         conn.commit()
         conn.close()
     
     def get_daily_goals(self, user_id, date=None):
-        """取得每日目標"""
-        if date is None:
-            date = datetime.date.today()
-        conn = sqlite3.connect(self.db_path)
+        """取得每日目標（DailyGoals，未設定時為 None；date 預設為用戶時區的今天）"""
+        conn = self._connect()
         cursor = conn.cursor()
+        if date is None:
+            date = self._today(cursor, user_id)
+        cursor.row_factory = row_factory(DailyGoals)
         cursor.execute('''
-            SELECT * FROM daily_goals 
+            SELECT id, user_id, goal1, goal2, goal3, date, created_at FROM daily_goals 
             WHERE user_id = ? AND date = ?
         ''', (user_id, date))
         goals = cursor.fetchone()
@@ -137,58 +580,141 @@ class Database:
     
     def save_diary(self, user_id, content):
         """儲存日記"""
-        today = datetime.date.today()
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        today = self._today(cursor, user_id)
         cursor.execute('''
-            INSERT OR REPLACE INTO diaries (user_id, content, date)
+            INSERT INTO diaries (user_id, content, date)
             VALUES (?, ?, ?)
         ''', (user_id, content, today))
         conn.commit()
         conn.close()
     
     def get_diary(self, user_id, date=None):
-        """取得日記"""
-        if date is None:
-            date = datetime.date.today()
-        conn = sqlite3.connect(self.db_path)
+        """取得日記（Diary，未記錄時為 None；date 預設為用戶時區的今天）"""
+        conn = self._connect()
         cursor = conn.cursor()
+        if date is None:
+            date = self._today(cursor, user_id)
+        cursor.row_factory = row_factory(Diary)
         cursor.execute('''
-            SELECT * FROM diaries 
+            SELECT id, user_id, content, date, created_at FROM diaries 
             WHERE user_id = ? AND date = ?
         ''', (user_id, date))
         diary = cursor.fetchone()
         conn.close()
         return diary
     
-    def save_vocabulary_record(self, user_id, words):
-        """儲存單字學習記錄"""
-        today = datetime.date.today()
-        conn = sqlite3.connect(self.db_path)
+    def save_vocabulary_record(self, user_id, words, word_list=None):
+        """儲存單字學習記錄並拆成單字加入複習排程，回傳新單字數量"""
+        if word_list is None:
+            word_list = parse_words(words)
+        conn = self._connect()
         cursor = conn.cursor()
+        today = self._today(cursor, user_id)
         cursor.execute('''
             INSERT INTO vocabulary_records (user_id, words, date)
             VALUES (?, ?, ?)
         ''', (user_id, words, today))
+        new_count = self._insert_words(cursor, user_id, word_list, today)
+        conn.commit()
+        conn.close()
+        return new_count
+    
+    def get_due_words_for_users(self, user_ids, date=None, limit_per_user=20):
+        """一次查詢多位用戶到期需複習的單字，回傳 {user_id: [單字, ...]}
+
+        未指定 date 時以各用戶時區的今天為準（同一分鐘的用戶可能在不同日期），依日期分組查詢。
+        每位用戶一個附 LIMIT 的子查詢（以 UNION ALL 合併），沿 (user_id, due_date) 索引讀到
+        limit_per_user 個就停止，累積大量未複習單字的用戶不會讓每次提醒讀取整段歷史。
+        """
+        if not user_ids:
+            return {}
+        if date is None:
+            groups = {}
+            for user_id, today in self.get_user_dates(user_ids).items():
+                groups.setdefault(today, []).append(user_id)
+        else:
+            groups = {date: list(user_ids)}
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        rows = []
+        for date, group in groups.items():
+            for start in range(0, len(group), DUE_WORDS_USERS_PER_QUERY):
+                chunk = group[start:start + DUE_WORDS_USERS_PER_QUERY]
+                query = ' UNION ALL '.join(['''
+                    SELECT * FROM (
+                        SELECT id, user_id, word, normalized, repetitions, "interval", ease, due_date
+                        FROM vocabulary_words
+                        WHERE user_id = ? AND due_date <= ?
+                        ORDER BY due_date, id LIMIT ?
+                    ) AS due_words
+                '''] * len(chunk))
+                parameters = []
+                for user_id in chunk:
+                    parameters += [user_id, date, limit_per_user]
+                cursor.execute(query + ' ORDER BY user_id, due_date, id', parameters)
+                rows.extend(cursor.fetchall())
+        conn.close()
+        
+        due = {}
+        for row in rows:
+            due.setdefault(row[1], []).append({
+                'id': row[0], 'word': row[2], 'normalized': row[3],
+                'repetitions': row[4], 'interval': row[5], 'ease': row[6],
+                'due_date': row[7]
+            })
+        return due
+    
+    def update_word_reviews(self, user_id, updates):
+        """更新單字複習排程"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE vocabulary_words
+            SET repetitions = ?, "interval" = ?, ease = ?, due_date = ?, last_reviewed = ?
+            WHERE id = ? AND user_id = ?
+        ''', [(u['repetitions'], u['interval'], u['ease'], u['due_date'], u['last_reviewed'],
+               u['id'], user_id) for u in updates])
         conn.commit()
         conn.close()
     
-    def get_today_summary(self, user_id):
-        """取得今日總結資料"""
-        today = datetime.date.today()
-        conn = sqlite3.connect(self.db_path)
+    def get_vocabulary_progress(self, user_id, date=None):
+        """取得單字學習進度"""
+        conn = self._connect()
         cursor = conn.cursor()
+        if date is None:
+            date = self._today(cursor, user_id)
+        cursor.execute('''
+            SELECT COUNT(*),
+                   SUM(CASE WHEN repetitions >= 3 THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN due_date <= ? THEN 1 ELSE 0 END)
+            FROM vocabulary_words
+            WHERE user_id = ?
+        ''', (date, user_id))
+        total, learned, due = cursor.fetchone()
+        conn.close()
+        return {'total': total or 0, 'learned': learned or 0, 'due': due or 0}
+    
+    def get_today_summary(self, user_id, date=None):
+        """取得今日總結資料（date 預設為用戶時區的今天）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        today = date or self._today(cursor, user_id)
         
         # 取得用戶資料
         cursor.execute('SELECT name FROM users WHERE user_id = ?', (user_id,))
         user = cursor.fetchone()
         
         # 取得今日目標
+        cursor.row_factory = row_factory(DailyGoals)
         cursor.execute('''
-            SELECT goal1, goal2, goal3 FROM daily_goals 
+            SELECT id, user_id, goal1, goal2, goal3, date, created_at FROM daily_goals 
             WHERE user_id = ? AND date = ?
         ''', (user_id, today))
         goals = cursor.fetchone()
+        cursor.row_factory = None
         
         # 取得今日日記
         cursor.execute('''
@@ -204,14 +730,13 @@ class Database:
         ''', (user_id, today))
         vocab_records = cursor.fetchall()
         
-        conn.close()
-        
         # 取得今日記帳記錄
+        cursor.row_factory = row_factory(Expense)
         cursor.execute('''
-            SELECT amount, category, description FROM expenses 
+            SELECT id, amount, category, description, date FROM expenses 
             WHERE user_id = ? AND date = ?
         ''', (user_id, today))
-        expense_records = cursor.fetchall()
+        expenses = cursor.fetchall()
         
         conn.close()
         
@@ -220,31 +745,39 @@ class Database:
             'goals': goals,
             'diary': diary[0] if diary else None,
             'vocabulary': [record[0] for record in vocab_records],
-            'expenses': [{'amount': record[0], 'category': record[1], 'description': record[2]} for record in expense_records]
+            'expenses': expenses,
+            'date': today
         }
     
     def save_expense(self, user_id, amount, category, description, date=None):
         """儲存記帳記錄"""
-        if date is None:
-            date = datetime.date.today()
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        if date is None:
+            date = self._today(cursor, user_id)
         cursor.execute('''
             INSERT INTO expenses (user_id, amount, category, description, date)
             VALUES (?, ?, ?, ?, ?)
         ''', (user_id, amount, category, description, date))
+        cursor.execute('''
+            INSERT INTO expense_stats_pending (user_id, marked_at)
+            VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET marked_at = excluded.marked_at
+        ''', (user_id, time.time()))
+        cursor.execute(BUMP_VIEW_VERSION_SQL, (user_id,))
         conn.commit()
         conn.close()
     
     def get_expenses(self, user_id, start_date=None, end_date=None):
-        """取得記帳記錄"""
+        """取得記帳記錄（Expense 清單，start_date 預設為用戶時區的今天）"""
+        conn = self._connect()
+        cursor = conn.cursor()
         if start_date is None:
-            start_date = datetime.date.today()
+            start_date = self._today(cursor, user_id)
         if end_date is None:
             end_date = start_date
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor.row_factory = row_factory(Expense)
         cursor.execute('''
             SELECT id, amount, category, description, date 
             FROM expenses 
@@ -256,14 +789,14 @@ class Database:
         return expenses
     
     def get_expense_summary(self, user_id, start_date=None, end_date=None):
-        """取得記帳統計"""
+        """取得記帳統計（start_date 預設為用戶時區的今天）"""
+        conn = self._connect()
+        cursor = conn.cursor()
         if start_date is None:
-            start_date = datetime.date.today()
+            start_date = self._today(cursor, user_id)
         if end_date is None:
             end_date = start_date
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         
         # 總支出
         cursor.execute('''
@@ -298,18 +831,19 @@ class Database:
     
     def save_category(self, user_id, category_name, color='#4CAF50'):
         """儲存自定義分類"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO expense_categories (user_id, category_name, color)
             VALUES (?, ?, ?)
         ''', (user_id, category_name, color))
+        cursor.execute(BUMP_VIEW_VERSION_SQL, (user_id,))
         conn.commit()
         conn.close()
     
     def get_user_categories(self, user_id):
         """取得用戶的分類"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT category_name, color FROM expense_categories 
@@ -323,4 +857,437 @@ class Database:
         default_categories = self.get_default_categories()
         custom_categories = [cat[0] for cat in categories]
         
-        return default_categories + custom_categories 
\ No newline at end of file
+        return default_categories + custom_categories
+    
+    def compute_expense_windows(self, user_id, windows, today=None):
+        """一次掃描計算多個區間的分類統計
+
+        windows: {區間名稱: 起始日期}，結束日期皆為 today（預設為用戶時區的今天）
+        回傳 {區間名稱: {'total', 'count', 'categories'}}
+        """
+        names = list(windows)
+        earliest = min(windows.values())
+        
+        columns = []
+        params = []
+        for name in names:
+            columns.append('SUM(CASE WHEN date >= ? THEN amount ELSE 0 END)')
+            columns.append('SUM(CASE WHEN date >= ? THEN 1 ELSE 0 END)')
+            params.extend([windows[name], windows[name]])
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        if today is None:
+            today = self._today(cursor, user_id)
+        cursor.execute(f'''
+            SELECT category, {', '.join(columns)}
+            FROM expenses
+            WHERE user_id = ? AND date BETWEEN ? AND ?
+            GROUP BY category
+        ''', params + [user_id, earliest, today])
+        rows = cursor.fetchall()
+        conn.close()
+        
+        result = {}
+        for index, name in enumerate(names):
+            categories = []
+            for row in rows:
+                total = row[1 + index * 2] or 0
+                count = row[2 + index * 2] or 0
+                if count:
+                    categories.append({'category': row[0], 'total': total, 'count': count})
+            categories.sort(key=lambda cat: cat['total'], reverse=True)
+            result[name] = {
+                'total': sum(cat['total'] for cat in categories),
+                'count': sum(cat['count'] for cat in categories),
+                'categories': categories
+            }
+        return result
+    
+    def save_expense_stats(self, user_id, stats, stats_date=None, computed_at=None):
+        """儲存預先計算的記帳統計 {區間天數: 統計}
+
+        computed_at 為開始計算的時間，早於此時間的待計算標記一併清除（計算期間新增的記帳仍保留標記）。
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        if stats_date is None:
+            stats_date = self._today(cursor, user_id)
+        cursor.executemany('''
+            INSERT INTO expense_stats
+                (user_id, window_days, total, count, categories, stats_date, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, window_days) DO UPDATE SET
+                total = excluded.total,
+                count = excluded.count,
+                categories = excluded.categories,
+                stats_date = excluded.stats_date,
+                updated_at = excluded.updated_at
+        ''', [
+            (user_id, days, summary['total'], summary['count'],
+             json.dumps(summary['categories'], ensure_ascii=False), stats_date)
+            for days, summary in stats.items()
+        ])
+        if computed_at is not None:
+            cursor.execute('''
+                DELETE FROM expense_stats_pending WHERE user_id = ? AND marked_at <= ?
+            ''', (user_id, computed_at))
+        conn.commit()
+        conn.close()
+    
+    def get_expense_stats(self, user_id, window_days):
+        """取得預先計算的記帳統計，沒有資料時回傳 None"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT total, count, categories, stats_date,
+                   EXISTS (SELECT 1 FROM expense_stats_pending WHERE user_id = ?)
+            FROM expense_stats
+            WHERE user_id = ? AND window_days = ?
+        ''', (user_id, user_id, window_days))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return None
+        return {
+            'total': row[0],
+            'count': row[1],
+            'categories': json.loads(row[2]) if row[2] else [],
+            'stats_date': row[3],
+            'pending': bool(row[4])
+        }
+    
+    def is_expense_stats_pending(self, user_id):
+        """用戶是否有尚未計入統計的記帳"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM expense_stats_pending WHERE user_id = ?', (user_id,))
+        pending = cursor.fetchone() is not None
+        conn.close()
+        return pending
+    
+    def get_pending_expense_stats(self, marked_before):
+        """取得在 marked_before 以前記帳、尚未重新計算統計的用戶"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id FROM expense_stats_pending WHERE marked_at <= ?
+        ''', (marked_before,))
+        users = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return users
+    
+    def save_budget(self, user_id, category, amount):
+        """設定分類每月預算（同一交易標記用戶待重新計算，由排程器更新使用狀況）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO expense_budgets (user_id, category, amount)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id, category) DO UPDATE SET
+                amount = excluded.amount,
+                alert_level = 0,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (user_id, category, amount))
+        cursor.execute('''
+            INSERT INTO expense_stats_pending (user_id, marked_at)
+            VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET marked_at = excluded.marked_at
+        ''', (user_id, time.time()))
+        conn.commit()
+        conn.close()
+    
+    def get_budgets(self, user_id):
+        """取得用戶的預算與本月使用狀況"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT category, amount, spent, alert_level, alert_period
+            FROM expense_budgets
+            WHERE user_id = ?
+            ORDER BY category
+        ''', (user_id,))
+        budgets = cursor.fetchall()
+        conn.close()
+        return [
+            {'category': row[0], 'amount': row[1], 'spent': row[2],
+             'alert_level': row[3], 'alert_period': row[4]}
+            for row in budgets
+        ]
+    
+    def update_budget_usage(self, user_id, category, spent, alert_level, alert_period):
+        """更新預算使用金額與已發送的提醒等級"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE expense_budgets
+            SET spent = ?, alert_level = ?, alert_period = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND category = ?
+        ''', (spent, alert_level, alert_period, user_id, category))
+        conn.commit()
+        conn.close()
+    
+    def search(self, user_id, query, limit=10):
+        """搜尋用戶的日記與單字記錄，依相關度排序並回傳摘要片段"""
+        terms = query.split()
+        if not terms:
+            return []
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        # trigram 索引需要至少 3 個字元，較短的關鍵字改用用戶索引 + LIKE
+        if self.fts_enabled and len(user_id) >= 3 and all(len(term) >= 3 for term in terms):
+            # 用戶 ID 與關鍵字都由索引比對，只讀取該用戶的記錄；trigram 片語是子字串比對，再以等號確認用戶
+            match = 'user_id : {} AND content : ({})'.format(
+                self._fts_phrase(user_id), ' '.join(self._fts_phrase(term) for term in terms)
+            )
+            cursor.execute('''
+                SELECT source, rowid / 2, date,
+                       snippet(search_index, 0, '【', '】', '…', 16),
+                       bm25(search_index, 1.0, 0.0)
+                FROM search_index
+                WHERE search_index MATCH ? AND user_id = ?
+                ORDER BY bm25(search_index, 1.0, 0.0)
+                LIMIT ?
+            ''', (match, user_id, limit))
+            rows = cursor.fetchall()
+        else:
+            rows = []
+            for source, (table, column, _) in SEARCH_SOURCES.items():
+                conditions = ' AND '.join(f"{column} {self.like_operator} ? ESCAPE '\\'" for _ in terms)
+                patterns = [
+                    '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                    for term in terms
+                ]
+                cursor.execute(f'''
+                    SELECT '{source}', id, date, {column}, 0
+                    FROM {table}
+                    WHERE user_id = ? AND {conditions}
+                    ORDER BY date DESC
+                    LIMIT ?
+                ''', [user_id] + patterns + [limit])
+                rows.extend(
+                    (row[0], row[1], row[2], self._make_snippet(row[3], terms[0]), row[4])
+                    for row in cursor.fetchall()
+                )
+            rows.sort(key=lambda row: str(row[2]), reverse=True)
+            rows = rows[:limit]
+        
+        conn.close()
+        
+        return [
+            {'source': row[0], 'id': row[1], 'date': row[2], 'snippet': row[3], 'rank': row[4]}
+            for row in rows
+        ]
+    
+    @staticmethod
+    def _fts_phrase(text):
+        """將文字轉成 FTS5 片語（雙引號跳脫）"""
+        return '"' + text.replace('"', '""') + '"'
+    
+    def _make_snippet(self, text, term, width=16):
+        """擷取關鍵字附近的文字片段"""
+        index = text.lower().find(term.lower())
+        start = max(index - width // 2, 0)
+        end = min(index + len(term) + width // 2, len(text))
+        snippet = text[start:index] + '【' + text[index:index + len(term)] + '】' + text[index + len(term):end]
+        return ('…' if start > 0 else '') + snippet + ('…' if end < len(text) else '')
+    
+    def acquire_lease(self, name, holder, lease_seconds):
+        """取得或續約租約，成功時回傳 True（租約過期才能被其他持有者接手）"""
+        now = time.time()
+        conn = self._connect(timeout=10, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                INSERT INTO leader_leases (name, holder, expires_at)
+                VALUES (?, '', 0)
+                ON CONFLICT DO NOTHING
+            ''', (name,))
+            cursor.execute('''
+                UPDATE leader_leases SET holder = ?, expires_at = ?
+                WHERE name = ? AND (holder = ? OR expires_at < ?)
+            ''', (holder, now + lease_seconds, name, holder, now))
+            acquired = cursor.rowcount == 1
+            cursor.execute('COMMIT')
+            return acquired
+        finally:
+            conn.close()
+    
+    def release_lease(self, name, holder):
+        """釋放租約，讓其他程序可以立即接手"""
+        conn = self._connect(timeout=10)
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE leader_leases SET expires_at = 0
+            WHERE name = ? AND holder = ?
+        ''', (name, holder))
+        conn.commit()
+        conn.close()
+    
+    def start_job_run(self, job_name, run_key):
+        """建立（或取得既有的）任務執行記錄，回傳 (run_id, 是否新建立)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO job_runs (job_name, run_key)
+            VALUES (?, ?)
+            ON CONFLICT DO NOTHING
+        ''', (job_name, run_key))
+        created = cursor.rowcount == 1
+        cursor.execute('''
+            SELECT run_id FROM job_runs WHERE job_name = ? AND run_key = ?
+        ''', (job_name, run_key))
+        run_id = cursor.fetchone()[0]
+        if not created:
+            # 重新執行既有記錄時恢復為執行中
+            cursor.execute('''
+                UPDATE job_runs SET status = 'running', finished_at = NULL
+                WHERE run_id = ?
+            ''', (run_id,))
+        conn.commit()
+        conn.close()
+        return run_id, created
+    
+    def add_job_deliveries(self, run_id, user_ids):
+        """加入任務要處理的用戶（已存在的略過）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO job_deliveries (run_id, user_id)
+            VALUES (?, ?)
+            ON CONFLICT DO NOTHING
+        ''', [(run_id, user_id) for user_id in user_ids])
+        conn.commit()
+        conn.close()
+    
+    def get_pending_deliveries(self, run_id, max_attempts):
+        """取得尚未完成的用戶（失敗次數未達上限者會重試）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id FROM job_deliveries
+            WHERE run_id = ? AND status IN ('pending', 'failed') AND attempts < ?
+            ORDER BY rowid
+        ''', (run_id, max_attempts))
+        users = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return users
+    
+    def mark_deliveries(self, run_id, results):
+        """在同一交易中記錄多位用戶的處理結果 [(user_id, status, error), ...]"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE job_deliveries
+            SET status = ?, error = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE run_id = ? AND user_id = ?
+        ''', [(status, error, run_id, user_id) for user_id, status, error in results])
+        conn.commit()
+        conn.close()
+    
+    def finish_job_run(self, run_id):
+        """標記任務執行完成"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE job_runs SET status = 'completed', finished_at = CURRENT_TIMESTAMP
+            WHERE run_id = ?
+        ''', (run_id,))
+        conn.commit()
+        conn.close()
+    
+    def get_incomplete_job_runs(self, max_age_hours):
+        """取得未完成的任務執行，超過時限的標記為放棄，回傳 [(job_name, run_key), ...]"""
+        cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=max_age_hours)).strftime('%Y-%m-%d %H:%M:%S')
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE job_runs SET status = 'abandoned', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'running' AND started_at < ?
+        ''', (cutoff,))
+        cursor.execute('''
+            SELECT job_name, run_key FROM job_runs
+            WHERE status = 'running'
+            ORDER BY started_at
+        ''')
+        runs = cursor.fetchall()
+        conn.commit()
+        conn.close()
+        return runs
+    
+    def purge_job_runs(self, retention_days):
+        """刪除結束超過 retention_days 天的任務執行記錄與發送狀態，回傳刪除的執行記錄數"""
+        cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM job_deliveries WHERE run_id IN (
+                SELECT run_id FROM job_runs WHERE status != 'running' AND finished_at < ?
+            )
+        ''', (cutoff,))
+        cursor.execute('''
+            DELETE FROM job_runs WHERE status != 'running' AND finished_at < ?
+        ''', (cutoff,))
+        purged = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return purged
+    
+    def get_user_state(self, user_id, max_age=None):
+        """取得用戶對話狀態，不存在或超過 max_age 秒時回傳 None"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT state, updated_at FROM user_states WHERE user_id = ?
+        ''', (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if row is None or (max_age and row[1] < time.time() - max_age):
+            return None
+        return json.loads(row[0])
+    
+    def set_user_state(self, user_id, state):
+        """儲存用戶對話狀態"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO user_states (user_id, state, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                state = excluded.state,
+                updated_at = excluded.updated_at
+        ''', (user_id, json.dumps(state, ensure_ascii=False), time.time()))
+        conn.commit()
+        conn.close()
+    
+    def delete_user_state(self, user_id):
+        """刪除用戶對話狀態"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM user_states WHERE user_id = ?', (user_id,))
+        conn.commit()
+        conn.close()
+    
+    def get_view_state(self, user_id):
+        """取得用戶畫面版本與時區 (版本, 時區)；時區決定「今天」，改變時快取的畫面也要失效"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT (SELECT version FROM view_versions WHERE user_id = ?),
+                   (SELECT timezone FROM user_preferences WHERE user_id = ?)
+        ''', (user_id, user_id))
+        version, timezone = cursor.fetchone()
+        conn.close()
+        return (version or 0, timezone)
+    
+    def bump_view_version(self, user_id):
+        """遞增用戶畫面版本，使所有程序中的快取畫面失效"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(BUMP_VIEW_VERSION_SQL, (user_id,))
+        conn.commit()
+        conn.close()
@@ -49,7 +49,7 @@ fi
 echo "🔧 建立Supervisor配置..."
 sudo tee /etc/supervisor/conf.d/never-give-up.conf > /dev/null <<EOF
 [program:never-give-up]
-command=$PROJECT_DIR/venv/bin/python $PROJECT_DIR/app.py
+command=$PROJECT_DIR/venv/bin/gunicorn -c gunicorn.conf.py wsgi:app
 directory=$PROJECT_DIR
 user=$USER
 autostart=true
@@ -57,6 +57,18 @@ autorestart=true
 stderr_logfile=/var/log/never-give-up.err.log
 stdout_logfile=/var/log/never-give-up.out.log
 environment=HOME="$PROJECT_DIR"
+
+[program:never-give-up-worker]
+command=$PROJECT_DIR/venv/bin/python -m worker
+directory=$PROJECT_DIR
+user=$USER
+autostart=true
+autorestart=true
+stopsignal=TERM
+stopwaitsecs=120
+stderr_logfile=/var/log/never-give-up-worker.err.log
+stdout_logfile=/var/log/never-give-up-worker.out.log
+environment=HOME="$PROJECT_DIR"
 EOF
 
 # 建立Nginx配置
@@ -110,7 +122,7 @@ fi
 echo "🔄 重啟Supervisor..."
 sudo supervisorctl reread
 sudo supervisorctl update
-sudo supervisorctl start never-give-up
+sudo supervisorctl start never-give-up never-give-up-worker
 
 # 設定防火牆
 echo "🔥 設定防火牆..."
@@ -135,7 +147,28 @@ Type=simple
 User=$USER
 WorkingDirectory=$PROJECT_DIR
 Environment=PATH=$PROJECT_DIR/venv/bin
-ExecStart=$PROJECT_DIR/venv/bin/python $PROJECT_DIR/app.py
+ExecStart=$PROJECT_DIR/venv/bin/gunicorn -c gunicorn.conf.py wsgi:app
+ExecReload=/bin/kill -HUP \$MAINPID
+Restart=always
+RestartSec=10
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+sudo tee /etc/systemd/system/never-give-up-worker.service > /dev/null <<EOF
+[Unit]
+Description=Never Give Up Scheduler Worker
+After=network.target
+
+[Service]
+Type=simple
+User=$USER
+WorkingDirectory=$PROJECT_DIR
+Environment=PATH=$PROJECT_DIR/venv/bin
+ExecStart=$PROJECT_DIR/venv/bin/python -m worker
+KillSignal=SIGTERM
+TimeoutStopSec=120
 Restart=always
 RestartSec=10
 
@@ -155,23 +188,31 @@ PROJECT_DIR="$PROJECT_DIR"
 case "\$1" in
     start)
         echo "🚀 啟動機器人..."
-        sudo supervisorctl start never-give-up
+        sudo supervisorctl start never-give-up never-give-up-worker
         ;;
     stop)
         echo "⏹️ 停止機器人..."
-        sudo supervisorctl stop never-give-up
+        sudo supervisorctl stop never-give-up never-give-up-worker
         ;;
     restart)
         echo "🔄 重啟機器人..."
-        sudo supervisorctl restart never-give-up
+        sudo supervisorctl restart never-give-up never-give-up-worker
+        ;;
+    restart-web)
+        echo "🔄 平滑重新載入網頁服務（不中斷處理中的請求，不影響排程）..."
+        sudo supervisorctl signal HUP never-give-up
+        ;;
+    restart-worker)
+        echo "🔄 重啟排程工作程序..."
+        sudo supervisorctl restart never-give-up-worker
         ;;
     status)
         echo "📊 機器人狀態..."
-        sudo supervisorctl status never-give-up
+        sudo supervisorctl status never-give-up never-give-up-worker
         ;;
     logs)
         echo "📋 查看日誌..."
-        tail -f /var/log/never-give-up.out.log
+        tail -f /var/log/never-give-up.out.log /var/log/never-give-up-worker.out.log
         ;;
     update)
         echo "📦 更新程式碼..."
@@ -179,12 +220,15 @@ case "\$1" in
         git pull
         source venv/bin/activate
         pip install -r requirements.txt
-        sudo supervisorctl restart never-give-up
+        sudo supervisorctl restart never-give-up never-give-up-worker
         ;;
     backup)
         echo "💾 備份資料庫..."
-        cp \$PROJECT_DIR/never_give_up.db \$PROJECT_DIR/backup_\$(date +%Y%m%d_%H%M%S).db
-        echo "備份完成"
+        # 以 SQLite backup API 線上備份（服務不需停止），壓縮後保留最新 BACKUP_KEEP 份
+        cd \$PROJECT_DIR
+        source venv/bin/activate
+        python -m backup
+        echo "備份完成，檔案位於 \$PROJECT_DIR/backups"
         ;;
     ssl)
         echo "🔒 SSL憑證管理..."
@@ -201,7 +245,7 @@ case "\$1" in
         sudo certbot renew
         ;;
     *)
-        echo "使用方法: \$0 {start|stop|restart|status|logs|update|backup|ssl|ssl-renew}"
+        echo "使用方法: \$0 {start|stop|restart|restart-web|restart-worker|status|logs|update|backup|ssl|ssl-renew}"
         exit 1
         ;;
 esac
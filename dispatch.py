@@ -0,0 +1,38 @@
+import hashlib
+import threading
+import time
+
+
+def dispatch_offset(user_id, window_seconds):
+    """將用戶 ID 穩定地雜湊成派送視窗內的偏移秒數（同一用戶每天相同）"""
+    if window_seconds <= 0:
+        return 0
+    digest = hashlib.blake2b(user_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % window_seconds
+
+
+class RatePacer:
+    """平滑派送速率：每次 acquire 佔用下一個時間格，超過目標速率時等待
+
+    rate 為每秒處理數，0 表示不限制。
+    """
+
+    def __init__(self, rate=0):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        """等待輪到下一個時間格；stop_event 被設定時提早返回 False"""
+        if not self.interval:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            if stop_event is not None:
+                return not stop_event.wait(wait)
+            time.sleep(wait)
+        return True
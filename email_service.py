@@ -3,6 +3,10 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config import Config
 import datetime
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
 
 class EmailService:
     def __init__(self):
@@ -11,16 +15,19 @@ class EmailService:
         self.user = Config.EMAIL_USER
         self.password = Config.EMAIL_PASSWORD
         self.to_email = Config.EMAIL_TO
+        self.use_tls = Config.EMAIL_USE_TLS
     
+    @metrics.timed('email_send_seconds', '每日總結郵件發送時間')
     def send_daily_summary(self, user_name, summary_data):
         """發送每日總結郵件"""
         if not all([self.user, self.password, self.to_email]):
-            print("郵件設定不完整，跳過發送郵件")
+            logger.info("郵件設定不完整，跳過發送郵件")
             return False
         
         try:
             # 建立郵件內容
-            subject = f"Never Give Up - {user_name} 的每日總結 ({datetime.date.today()})"
+            date = summary_data.get('date') or datetime.date.today()
+            subject = f"Never Give Up - {user_name} 的每日總結 ({date})"
             
             # 建立HTML內容
             html_content = self._create_summary_html(user_name, summary_data)
@@ -37,20 +44,21 @@ class EmailService:
             
             # 發送郵件
             with smtplib.SMTP(self.host, self.port) as server:
-                server.starttls()
+                if self.use_tls:
+                    server.starttls()
                 server.login(self.user, self.password)
                 server.send_message(msg)
             
-            print(f"成功發送每日總結郵件給 {user_name}")
+            logger.info("成功發送每日總結郵件給 %s", user_name)
             return True
             
         except Exception as e:
-            print(f"發送郵件失敗: {str(e)}")
+            logger.error("發送郵件失敗: %s", e, extra={"user_name": user_name})
             return False
     
     def _create_summary_html(self, user_name, summary_data):
         """建立總結HTML內容"""
-        today = datetime.date.today()
+        today = summary_data.get('date') or datetime.date.today()
         
         html = f"""
         <!DOCTYPE html>
@@ -82,8 +90,7 @@ class EmailService:
             <div class="section">
                 <h2>📋 今日目標</h2>
             """
-            goals = summary_data['goals']
-            for i, goal in enumerate([goals[0], goals[1], goals[2]], 1):
+            for i, goal in enumerate(summary_data['goals'].goals, 1):
                 if goal:
                     html += f'<div class="goal-item">🎯 目標 {i}: {goal}</div>'
             html += "</div>"
@@ -115,11 +122,11 @@ class EmailService:
             """
             total_expense = 0
             for expense in summary_data['expenses']:
-                amount = expense['amount']
+                amount = expense.amount
                 total_expense += amount
-                html += f'<div class="expense-item">💵 {expense["category"]}: ${amount:,.0f}</div>'
-                if expense['description']:
-                    html += f'<div class="expense-desc">📝 {expense["description"]}</div>'
+                html += f'<div class="expense-item">💵 {expense.category}: ${amount:,.0f}</div>'
+                if expense.description:
+                    html += f'<div class="expense-desc">📝 {expense.description}</div>'
             
             html += f'<div class="expense-total">💸 今日總支出: ${total_expense:,.0f}</div>'
             html += "</div>"
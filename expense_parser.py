@@ -0,0 +1,221 @@
+import re
+import unicodedata
+
+# 常見描述詞對應到預設分類，讓「午餐 120」也能自動歸類
+CATEGORY_ALIASES = {
+    '飲食': ['早餐', '午餐', '晚餐', '宵夜', '便當', '飲料', '咖啡', '零食', '餐廳', '外送'],
+    '交通': ['捷運', '公車', '計程車', '高鐵', '火車', '油錢', '油費', '加油', '停車', 'uber'],
+    '購物': ['衣服', '鞋子', '日用品', '網購'],
+    '娛樂': ['電影', '遊戲', '運動', '唱歌'],
+    '醫療': ['看病', '藥品', '掛號', '保健'],
+    '教育': ['書籍', '課程', '學費'],
+    '居住': ['房租', '水電', '水費', '電費', '瓦斯'],
+    '通訊': ['手機費', '電話費', '網路費'],
+}
+
+# 金額必須是獨立的 token（前後為分隔符號或字串邊界），「7-11」「2號餐」「iPhone15」「1,2」整段視為文字
+# 可帶負號、幣別前綴（NT$、NTD、$）、千分位與幣別後綴（元、塊）；負數照樣解析，由記帳檢查回覆金額錯誤
+AMOUNT_PATTERN = re.compile(
+    r'(-)?(?:NT\$|NTD|US\$|\$)?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?(?:元|塊錢|塊|圓)?',
+    re.IGNORECASE
+)
+
+# 分隔符號：空白、頓號、分號，以及後面不是數字的逗號（千分位的逗號不切開）
+SEPARATOR_PATTERN = re.compile(r'[\s、;]+|,(?!\d)')
+_has_separator = re.compile(r'[、;,]').search
+
+# 可能是金額的 token 開頭（數字或幣別前綴），其餘不必比對正規表示式
+AMOUNT_START = frozenset('-0123456789$NnUu')
+
+# 與金額以空白分開的幣別（NTD 35、45 元）
+CURRENCY_WORDS = frozenset(['nt$', 'ntd', 'us$', '$', '元', '塊', '塊錢', '圓'])
+
+
+def parse_amount(token):
+    """token 整段是金額時回傳數值，否則回傳 None"""
+    if token.isdigit():
+        return float(token)
+    if token[0] not in AMOUNT_START:
+        return None
+    match = AMOUNT_PATTERN.fullmatch(token)
+    if match is None:
+        return None
+    sign, number, fraction = match.groups()
+    return float((sign or '') + number.replace(',', '') + (fraction or ''))
+
+
+class CategoryTrie:
+    """分類前綴樹，支援完全比對、最長前綴比對及唯一前綴補全"""
+
+    # 每個前綴樹記住的比對結果數上限（記帳輸入的文字重複率高）
+    MAX_CACHED_WORDS = 4096
+
+    def __init__(self, categories=(), aliases=None):
+        self.root = {}
+        self._matches = {}
+        for category in categories:
+            self.insert(category, category)
+        if aliases:
+            available = set(categories)
+            for category, keywords in aliases.items():
+                if category not in available:
+                    continue
+                for keyword in keywords:
+                    self.insert(keyword, category)
+
+    def insert(self, key, category):
+        """新增關鍵字與其對應的分類"""
+        node = self.root
+        for char in key.lower():
+            node = node.setdefault(char, {})
+        # 分類名稱本身優先於別名
+        if node.get('$') is None or key == category:
+            node['$'] = category
+
+    def match(self, word):
+        """找出文字對應的分類，找不到時回傳 None"""
+        try:
+            return self._matches[word]
+        except KeyError:
+            pass
+        if len(self._matches) >= self.MAX_CACHED_WORDS:
+            self._matches.clear()
+        category = self._matches[word] = self._match(word)
+        return category
+
+    def _match(self, word):
+        node = self.root
+        longest = None
+        for char in word.lower():
+            node = node.get(char)
+            if node is None:
+                return longest
+            if '$' in node:
+                longest = node['$']
+
+        if '$' in node:
+            return node['$']
+        if longest:
+            return longest
+
+        # 文字是某些關鍵字的前綴，若只對應到一個分類則採用
+        candidates = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for char, child in current.items():
+                if char == '$':
+                    candidates.add(child)
+                else:
+                    stack.append(child)
+            if len(candidates) > 1:
+                return None
+        return candidates.pop() if candidates else None
+
+
+class ExpenseParser:
+    """記帳輸入解析器，一次掃描完成斷詞與分類比對"""
+
+    def __init__(self, aliases=None):
+        self.aliases = CATEGORY_ALIASES if aliases is None else aliases
+        self._tries = {}
+
+    def get_trie(self, categories):
+        """取得（並快取）分類組合對應的前綴樹"""
+        key = categories if type(categories) is tuple else tuple(categories)
+        trie = self._tries.get(key)
+        if trie is None:
+            if len(self._tries) >= 1024:
+                self._tries.clear()
+            trie = CategoryTrie(key, self.aliases)
+            self._tries[key] = trie
+        return trie
+
+    def _split(self, text):
+        if not text.isascii():
+            # 全形數字與標點轉為半形（純 ASCII 輸入不需要）
+            text = unicodedata.normalize('NFKC', text)
+        return SEPARATOR_PATTERN.split(text) if _has_separator(text) else text.split()
+
+    def tokenize(self, text):
+        """將輸入拆成 ('amount', 數值) 與 ('word', 文字) 的序列"""
+        tokens = []
+        for part in self._split(text):
+            if not part:
+                continue
+            amount = parse_amount(part)
+            if amount is not None:
+                tokens.append(('amount', amount))
+            elif part.lower() not in CURRENCY_WORDS:
+                tokens.append(('word', part))
+        return tokens
+
+    def parse(self, text, categories=()):
+        """解析記帳輸入，回傳 [(金額, 分類, 描述), ...]；沒有任何文字的金額分類為 None
+
+        支援格式：
+        1. 金額 分類 描述 (例如: 100 飲食 午餐)
+        2. 分類 金額 描述 (例如: 飲食 100 午餐)
+        3. 含幣別 (例如: 午餐 120元、NT$80 交通、$1,200 購物)
+        4. 多筆金額 (例如: 早餐 50 午餐 120)
+        """
+        # 與 tokenize 相同的斷詞，直接切成 (金額, [文字...]) 的多段；
+        # 依第一個 token 判斷金額在前（文字接在前一個金額後）或在後（文字屬於下一個金額）
+        segments = []
+        words = []
+        amount_first = None
+        for part in self._split(text):
+            if not part:
+                continue
+            # 常見的純數字與純文字不必呼叫 parse_amount
+            if part.isdigit():
+                amount = float(part)
+            elif part[0] in AMOUNT_START:
+                amount = parse_amount(part)
+            else:
+                amount = None
+            if amount is None:
+                if part.lower() in CURRENCY_WORDS:
+                    continue
+                if amount_first:
+                    segments[-1][1].append(part)
+                else:
+                    words.append(part)
+            else:
+                if amount_first is None:
+                    amount_first = not words
+                if amount_first:
+                    segments.append((amount, []))
+                else:
+                    segments.append((amount, words))
+                    words = []
+        if not segments:
+            return []
+        if words:
+            # 最後一個金額後的文字視為描述
+            segments[-1][1].extend(words)
+
+        trie = self.get_trie(categories)
+        items = []
+        for amount, segment_words in segments:
+            if not segment_words:
+                # 只有金額（例如「$1,200」）仍回傳，讓呼叫端提示輸入分類，而不是回覆格式錯誤
+                items.append((amount, None, None))
+                continue
+            category, description = self._resolve_category(trie, segment_words)
+            items.append((amount, category, description))
+        return items
+
+    def _resolve_category(self, trie, words):
+        """從文字中挑出分類，其餘作為描述"""
+        for index, word in enumerate(words):
+            category = trie.match(word)
+            if category:
+                if word == category:
+                    rest = words[:index] + words[index + 1:]
+                else:
+                    # 以別名或前綴比對到分類時，保留原文字作為描述
+                    rest = words
+                return category, ' '.join(rest) or None
+        # 沒有符合的分類時沿用舊行為：第一個文字為分類
+        return words[0], ' '.join(words[1:]) or None
@@ -2,63 +2,114 @@ import csv
 import io
 import datetime
 from database import Database
+from expense_parser import ExpenseParser
+from expense_stats import ExpenseStatsService
+from view_cache import ViewCache
+from reminders import local_today
+from config import Config
 
 class ExpenseService:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db=None):
+        self.db = db or Database()
+        self.parser = ExpenseParser()
+        # 預算提醒由排程器推播，這裡只讀取統計
+        self.stats = ExpenseStatsService(self.db)
+        self.view_cache = ViewCache(Config.VIEW_CACHE_MAX_USERS, Config.VIEW_CACHE_VERSION_TTL)
     
     def add_expense(self, user_id, amount, category, description):
         """新增記帳記錄"""
+        return self.add_expenses(user_id, [(amount, category, description)])
+    
+    def validate_expense(self, amount, category):
+        """檢查一筆記帳，有問題時回傳錯誤訊息"""
         try:
-            # 驗證金額
             amount = float(amount)
-            if amount <= 0:
-                return False, "金額必須大於0"
-            
-            # 驗證分類
-            if not category or len(category.strip()) == 0:
-                return False, "請選擇或輸入分類"
-            
-            # 儲存記錄
-            self.db.save_expense(user_id, amount, category.strip(), description.strip())
-            return True, "記帳成功！"
-            
-        except ValueError:
-            return False, "金額格式錯誤，請輸入數字"
+        except (TypeError, ValueError):
+            return "金額格式錯誤，請輸入數字"
+        if amount <= 0:
+            return "金額必須大於0"
+        if not category or len(category.strip()) == 0:
+            return "請在金額前後輸入分類，例如：100 飲食 午餐"
+        return None
+    
+    def add_expenses(self, user_id, items):
+        """新增一或多筆記帳 [(金額, 分類, 描述), ...]
+
+        先檢查所有項目，任何一筆有問題時都不儲存；儲存途中失敗時訊息會列出已記錄的筆數，避免重新輸入造成重複。
+        """
+        for index, (amount, category, description) in enumerate(items, 1):
+            error = self.validate_expense(amount, category)
+            if error:
+                if len(items) > 1:
+                    error = f"第 {index} 筆：{error}，所有項目都未記錄"
+                return False, error
+        
+        saved = 0
+        try:
+            for amount, category, description in items:
+                self.db.save_expense(user_id, float(amount), category.strip(), (description or '').strip())
+                saved += 1
         except Exception as e:
-            return False, f"記帳失敗：{str(e)}"
+            if not saved:
+                return False, f"記帳失敗：{str(e)}"
+            return False, f"已記錄前 {saved} 筆，第 {saved + 1} 筆起記帳失敗：{str(e)}"
+        finally:
+            if saved:
+                self.invalidate_views(user_id)
+        
+        if len(items) > 1:
+            return True, f"已記錄 {len(items)} 筆支出！"
+        return True, "記帳成功！"
     
     def get_today_expenses(self, user_id):
-        """取得今日記帳記錄"""
-        today = datetime.date.today()
-        expenses = self.db.get_expenses(user_id, today, today)
-        
-        result = []
-        for expense in expenses:
-            result.append({
-                'id': expense[0],
-                'amount': expense[1],
-                'category': expense[2],
-                'description': expense[3],
-                'date': expense[4]
-            })
-        
-        return result
+        """取得今日記帳記錄（Expense 清單，以用戶時區的今天為準）"""
+        return self.db.get_expenses(user_id)
     
     def get_expense_summary(self, user_id, days=7):
         """取得記帳統計"""
-        end_date = datetime.date.today()
-        start_date = end_date - datetime.timedelta(days=days-1)
-        
-        summary = self.db.get_expense_summary(user_id, start_date, end_date)
-        return summary
+        return self.stats.get_summary(user_id, days)
+    
+    def invalidate_views(self, user_id):
+        """清除本程序中用戶的快取畫面（資料庫寫入時已在同一交易遞增版本，其他程序據此失效）"""
+        self.view_cache.invalidate(user_id)
+    
+    def render_today_view(self, user_id):
+        """取得今日記帳畫面（快取），沒有記錄時回傳 None"""
+        version = self.view_cache.version(user_id, self.db.get_view_state)
+        key = ('today', local_today(version[1]))
+        hit, message = self.view_cache.get(user_id, key, version)
+        if hit:
+            return message
+        
+        message = None
+        today_expenses = self.get_today_expenses(user_id)
+        if today_expenses:
+            summary = self.get_expense_summary(user_id, 1)
+            message = self.format_expense_message(today_expenses, summary)
+        
+        self.view_cache.set(user_id, key, message, version)
+        return message
+    
+    def render_summary_view(self, user_id, days=7):
+        """取得記帳統計畫面（快取）"""
+        version = self.view_cache.version(user_id, self.db.get_view_state)
+        key = ('summary', days, local_today(version[1]))
+        hit, message = self.view_cache.get(user_id, key, version)
+        if hit:
+            return message
+        
+        summary = self.get_expense_summary(user_id, days)
+        message = self.format_summary_message(summary, days)
+        
+        self.view_cache.set(user_id, key, message, version)
+        return message
     
     def export_expenses_csv(self, user_id, start_date=None, end_date=None):
         """匯出記帳記錄為CSV"""
-        if start_date is None:
-            start_date = datetime.date.today() - datetime.timedelta(days=30)
-        if end_date is None:
-            end_date = datetime.date.today()
+        if start_date is None or end_date is None:
+            today = self.db.get_user_today(user_id)
+            start_date = start_date or today - datetime.timedelta(days=30)
+            end_date = end_date or today
         
         expenses = self.db.get_expenses(user_id, start_date, end_date)
         
@@ -71,12 +122,7 @@ class ExpenseService:
         
         # 寫入資料
         for expense in expenses:
-            writer.writerow([
-                expense[4],  # 日期
-                expense[2],  # 分類
-                expense[1],  # 金額
-                expense[3]   # 描述
-            ])
+            writer.writerow([expense.date, expense.category, expense.amount, expense.description])
         
         csv_content = output.getvalue()
         output.close()
@@ -99,11 +145,42 @@ class ExpenseService:
                 return False, "分類已存在"
             
             self.db.save_category(user_id, category_name.strip())
+            self.invalidate_views(user_id)
             return True, "分類新增成功！"
             
         except Exception as e:
             return False, f"新增分類失敗：{str(e)}"
     
+    def set_budget(self, user_id, category, amount):
+        """設定分類每月預算"""
+        try:
+            amount = float(amount)
+            if amount <= 0:
+                return False, "預算必須大於0"
+            
+            if not category or len(category.strip()) == 0:
+                return False, "請輸入預算分類"
+            
+            # 同一交易標記用戶待重新計算，排程器隨後更新使用狀況並在超過門檻時提醒
+            self.db.save_budget(user_id, category.strip(), amount)
+            return True, f"已設定「{category.strip()}」每月預算 ${amount:,.0f}"
+            
+        except ValueError:
+            return False, "預算格式錯誤，請輸入數字"
+        except Exception as e:
+            return False, f"設定預算失敗：{str(e)}"
+    
+    def get_budgets(self, user_id):
+        """取得預算使用狀況（本月支出即時查詢，不寫入資料庫）"""
+        budgets = self.db.get_budgets(user_id)
+        if budgets:
+            today = self.db.get_user_today(user_id)
+            month = self.db.get_expense_summary(user_id, today.replace(day=1), today)
+            spent_by_category = {cat['category']: cat['total'] for cat in month['categories']}
+            for budget in budgets:
+                budget['spent'] = spent_by_category.get(budget['category'], 0)
+        return budgets
+    
     def format_expense_message(self, expenses, summary=None):
         """格式化記帳訊息"""
         if not expenses:
@@ -113,11 +190,11 @@ class ExpenseService:
         
         total = 0
         for expense in expenses:
-            amount = expense['amount']
+            amount = expense.amount
             total += amount
-            message += f"💰 {expense['category']}: ${amount:,.0f}\n"
-            if expense['description']:
-                message += f"   📝 {expense['description']}\n"
+            message += f"💰 {expense.category}: ${amount:,.0f}\n"
+            if expense.description:
+                message += f"   📝 {expense.description}\n"
             message += "\n"
         
         message += f"💵 今日總支出: ${total:,.0f}"
@@ -147,39 +224,30 @@ class ExpenseService:
         
         return message
     
-    def parse_expense_input(self, text):
-        """解析記帳輸入文字"""
-        """支援格式：
-        1. 金額 分類 描述 (例如: 100 飲食 午餐)
-        2. 分類 金額 描述 (例如: 飲食 100 午餐)
-        3. 金額 分類 (例如: 100 飲食)
-        """
-        parts = text.strip().split()
-        
-        if len(parts) < 2:
+    def parse_expense_input(self, text, user_id=None):
+        """解析記帳輸入文字，回傳第一筆 (金額, 分類, 描述)"""
+        items = self.parse_expense_items(text, user_id)
+        if not items:
             return None, None, None
+        return items[0]
+    
+    def parse_expense_items(self, text, user_id=None):
+        """解析記帳輸入文字，支援一次輸入多筆金額"""
+        if user_id is None:
+            categories = self.db.get_default_categories()
+        else:
+            categories = self.get_categories(user_id)
+        return self.parser.parse(text, categories)
+    
+    def format_budget_message(self, budgets):
+        """格式化預算訊息"""
+        if not budgets:
+            return "還沒有設定預算。\n\n請輸入「設定預算 分類 金額」，例如：設定預算 飲食 6000"
         
-        # 嘗試解析金額
-        amount = None
-        category = None
-        description = None
+        message = "🎯 本月預算使用狀況：\n\n"
+        for budget in budgets:
+            ratio = budget['spent'] / budget['amount'] if budget['amount'] else 0
+            icon = "⚠️" if ratio >= 1 else "🔔" if ratio >= 0.8 else "✅"
+            message += f"{icon} {budget['category']}: ${budget['spent']:,.0f} / ${budget['amount']:,.0f} ({ratio * 100:.0f}%)\n"
         
-        # 檢查第一個部分是否為數字
-        try:
-            amount = float(parts[0])
-            if len(parts) >= 2:
-                category = parts[1]
-            if len(parts) >= 3:
-                description = ' '.join(parts[2:])
-        except ValueError:
-            # 第一個不是數字，可能是分類
-            if len(parts) >= 2:
-                try:
-                    amount = float(parts[1])
-                    category = parts[0]
-                    if len(parts) >= 3:
-                        description = ' '.join(parts[2:])
-                except ValueError:
-                    return None, None, None
-        
-        return amount, category, description 
\ No newline at end of file
+        return message
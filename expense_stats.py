@@ -0,0 +1,117 @@
+import time
+import datetime
+import logging
+from linebot.models import TextSendMessage
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ExpenseStatsService:
+    """記帳統計預先計算服務
+
+    記帳時資料庫在同一交易中標記用戶待重新計算（expense_stats_pending），
+    排程器定期重新計算標記超過 debounce 秒的用戶（同一用戶短時間內多次記帳只計算一次），
+    標記存在資料庫中，多個工作程序或程序重啟都不會遺失。
+    重新計算滾動區間統計後寫入 expense_stats，讀取時只需一次主鍵查詢；
+    預算使用率只在排程器的計算中更新並推播提醒，讀取時即使重新計算統計也不會清除標記、寫入預算或推播。
+    """
+
+    def __init__(self, db, line_bot_api=None):
+        self.db = db
+        self.line_bot_api = line_bot_api
+        self.windows = Config.EXPENSE_STATS_WINDOWS
+        self.debounce = Config.EXPENSE_STATS_DEBOUNCE
+
+    def refresh_pending(self):
+        """重新計算記帳後已超過 debounce 秒的用戶統計（由排程器定期執行），回傳處理人數"""
+        user_ids = self.db.get_pending_expense_stats(time.time() - self.debounce)
+        for user_id in user_ids:
+            try:
+                self.refresh(user_id)
+                # 統計已更新，讓其他程序中依舊統計產生的快取畫面失效
+                self.db.bump_view_version(user_id)
+            except Exception:
+                logger.exception("更新記帳統計失敗", extra={"user_id": user_id})
+        return len(user_ids)
+
+    def refresh(self, user_id):
+        """重新計算各區間統計、更新本月預算使用狀況並推播提醒（由排程器執行）"""
+        # 計算期間新增的記帳標記時間晚於 started，會保留到下一次計算
+        started = time.time()
+        today = self.db.get_user_today(user_id)
+        results = self._compute(user_id, today)
+        month = results.pop('month')
+        self.db.save_expense_stats(user_id, results, today, computed_at=started)
+        self._check_budgets(user_id, month, today)
+        return results
+
+    def get_summary(self, user_id, days):
+        """取得預先計算的統計，不在預計算區間內則即時計算"""
+        today = self.db.get_user_today(user_id)
+        if days not in self.windows:
+            start_date = today - datetime.timedelta(days=days - 1)
+            return self.db.get_expense_summary(user_id, start_date, today)
+
+        stats = self.db.get_expense_stats(user_id, days)
+        # 有尚未計入的記帳，或（用戶時區）跨日後區間已移動，需要重新計算
+        if stats and not stats['pending'] and stats['stats_date'] == today.isoformat():
+            return stats
+        results = self._compute(user_id, today)
+        results.pop('month')
+        # 不清除待計算標記：預算檢查與提醒留給排程器
+        self.db.save_expense_stats(user_id, results, today)
+        return self.db.get_expense_stats(user_id, days)
+
+    def _compute(self, user_id, today):
+        """計算各滾動區間與本月（'month'）的統計"""
+        windows = {
+            days: today - datetime.timedelta(days=days - 1)
+            for days in self.windows
+        }
+        windows['month'] = today.replace(day=1)
+        return self.db.compute_expense_windows(user_id, windows, today)
+
+    def _check_budgets(self, user_id, month, today):
+        """更新預算使用率，跨過提醒門檻時推播通知"""
+        budgets = self.db.get_budgets(user_id)
+        if not budgets:
+            return
+
+        period = today.strftime('%Y-%m')
+        spent_by_category = {cat['category']: cat['total'] for cat in month['categories']}
+
+        for budget in budgets:
+            spent = spent_by_category.get(budget['category'], 0)
+            alert_level = budget['alert_level'] if budget['alert_period'] == period else 0
+            ratio = spent / budget['amount'] if budget['amount'] else 0
+
+            crossed = [level for level in Config.BUDGET_ALERT_THRESHOLDS
+                       if alert_level < level <= ratio]
+            if crossed:
+                alert_level = max(crossed)
+                self._send_budget_alert(user_id, budget, spent, ratio)
+
+            self.db.update_budget_usage(user_id, budget['category'], spent, alert_level, period)
+
+    def _send_budget_alert(self, user_id, budget, spent, ratio):
+        """推播預算提醒"""
+        if not self.line_bot_api:
+            return
+
+        if ratio >= 1:
+            headline = f"⚠️ 本月「{budget['category']}」已超出預算！"
+        else:
+            headline = f"🔔 本月「{budget['category']}」已使用 {ratio * 100:.0f}% 預算"
+
+        message = f"""{headline}
+
+💵 已支出: ${spent:,.0f}
+🎯 預算: ${budget['amount']:,.0f}
+📉 剩餘: ${max(budget['amount'] - spent, 0):,.0f}"""
+
+        try:
+            self.line_bot_api.push_message(user_id, TextSendMessage(text=message))
+            logger.info("已發送預算提醒", extra={"user_id": user_id, "category": budget['category']})
+        except Exception as e:
+            logger.error("發送預算提醒失敗: %s", e, extra={"user_id": user_id})
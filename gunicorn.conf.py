@@ -0,0 +1,67 @@
+"""gunicorn 設定
+
+使用方式：
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+每個工作程序以多執行緒（gthread）處理 Webhook，LINE API 與 OpenAI 的等待時間不會佔住整個程序。
+對話狀態與快取版本存於資料庫，請求可以分配到任一工作程序。
+排程預設由 python -m worker 獨立執行；若設定 RUN_SCHEDULER_IN_WEB=true，
+每個工作程序都會參與領導者選舉，只有取得租約的程序執行排程。
+
+調整方式請參考 benchmarks/load_callback.py 的壓力測試結果。
+"""
+from config import Config
+
+bind = f"0.0.0.0:{Config.PORT}"
+workers = Config.WEB_CONCURRENCY
+worker_class = 'gthread'
+threads = Config.WEB_THREADS
+
+# 反向代理（nginx）與 LINE 平台會重用連線
+keepalive = Config.WEB_KEEPALIVE
+timeout = Config.WEB_TIMEOUT
+# 收到 SIGTERM / SIGHUP 後等待處理中的請求完成
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+
+# 定期重啟工作程序，避免長時間執行後記憶體持續增加
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = Config.WEB_MAX_REQUESTS // 10
+
+# 不預先載入：收到 SIGHUP 時逐一以新程式碼啟動工作程序，處理中的請求不中斷
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # kill -USR2 <工作程序 pid> 開始／停止取樣分析（送給主程序的 USR2 是 gunicorn 的升級訊號）
+    import sampling_profiler
+    sampling_profiler.install_signal_handler()
+
+    if not Config.RUN_SCHEDULER_IN_WEB:
+        return
+    import services
+
+    worker.leader = services.get_scheduler().leader_election()
+    worker.leader.start()
+
+
+def worker_exit(server, worker):
+    leader = getattr(worker, 'leader', None)
+    if leader:
+        import services
+        services.get_scheduler().stop(wait=True)
+        leader.stop()
+
+    import metrics
+    import query_profiler
+    import sampling_profiler
+    sampling_profiler.profiler.stop()
+    query_profiler.log_report()
+    # 結束前將本程序的指標併入 METRICS_DIR 的合計，計數器不因工作程序重啟而減少
+    metrics.retire()
+
+    # 最後寫出佇列中尚未輸出的日誌（包含上面的查詢報表），再結束工作程序
+    from logging_setup import shutdown_logging
+    shutdown_logging()
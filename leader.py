@@ -0,0 +1,86 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """以資料庫租約進行領導者選舉
+
+    每個程序定期嘗試取得（或續約）同名租約，只有持有租約的程序會被呼叫 on_elected；
+    領導者停止續約（當機或結束）後，租約過期即由其他程序自動接手。
+    """
+
+    def __init__(self, db, name, lease_seconds=30, on_elected=None, on_revoked=None):
+        self.db = db
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.on_elected = on_elected
+        self.on_revoked = on_revoked
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._last_renewed = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """啟動選舉執行緒"""
+        if self._thread:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"leader-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止選舉並釋放租約"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(self.lease_seconds)
+            self._thread = None
+        if self.is_leader:
+            self._set_leader(False)
+            try:
+                self.db.release_lease(self.name, self.holder)
+            except Exception as e:
+                logger.error("釋放租約失敗: %s", e)
+
+    def holds_lease(self, margin=0):
+        """margin 秒後租約仍有效時回傳 True（依本程序最後一次成功續約的時間判斷）"""
+        return self.is_leader and time.time() + margin < self._last_renewed + self.lease_seconds
+
+    def _run(self):
+        # 續約間隔為租約時間的 1/3，暫時性錯誤不會立即失去領導權
+        interval = self.lease_seconds / 3
+        while not self._stop_event.is_set():
+            self.poll()
+            self._stop_event.wait(interval)
+
+    def poll(self):
+        """嘗試取得或續約一次"""
+        try:
+            acquired = self.db.acquire_lease(self.name, self.holder, self.lease_seconds)
+        except Exception as e:
+            logger.warning("租約續約失敗: %s", e)
+            # 無法確認租約時，超過租約時間就視為失去領導權
+            acquired = self.is_leader and time.time() < self._last_renewed + self.lease_seconds
+        else:
+            if acquired:
+                self._last_renewed = time.time()
+
+        if acquired != self.is_leader:
+            self._set_leader(acquired)
+
+    def _set_leader(self, leader):
+        self.is_leader = leader
+        if leader:
+            logger.info("取得領導權 %s (%s)", self.name, self.holder)
+            if self.on_elected:
+                self.on_elected()
+        else:
+            logger.info("失去領導權 %s (%s)", self.name, self.holder)
+            if self.on_revoked:
+                self.on_revoked()
@@ -0,0 +1,157 @@
+"""結構化日誌設定
+
+- 呼叫端只把記錄放進佇列（QueueHandler），格式化與寫出由背景執行緒（QueueListener）處理
+- 每筆記錄帶有關聯 ID（correlation_id），同一個 Webhook 事件或排程批次中的資料庫、LINE、OpenAI、郵件記錄可串在一起
+- LOG_SAMPLE_RATE 小於 1 時，INFO 以下的記錄依關聯 ID 抽樣（同一事件的記錄全留或全丟），WARNING 以上一律保留
+- LOG_FORMAT=json 時每行輸出一個 JSON 物件，方便集中收集與查詢
+
+各模組以 logging.getLogger(__name__) 取得 logger，以 extra={...} 附加結構化欄位。
+"""
+import contextlib
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import uuid
+import zlib
+
+from config import Config
+
+correlation_id = contextvars.ContextVar('correlation_id', default='-')
+
+# LogRecord 內建屬性，其餘屬性視為透過 extra 傳入的結構化欄位
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'correlation_id'}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def new_correlation_id():
+    return uuid.uuid4().hex[:12]
+
+
+@contextlib.contextmanager
+def correlation(value=None):
+    """在區塊內設定關聯 ID（未指定時產生新的）"""
+    token = correlation_id.set(value or new_correlation_id())
+    try:
+        yield correlation_id.get()
+    finally:
+        correlation_id.reset(token)
+
+
+class CorrelationFilter(logging.Filter):
+    """在呼叫端執行緒補上關聯 ID（背景執行緒無法讀取呼叫端的 contextvars）"""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """依關聯 ID 抽樣 INFO 以下的記錄"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.threshold = int(rate * 10000)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.threshold >= 10000:
+            return True
+        key = getattr(record, 'correlation_id', '-')
+        if key == '-':
+            return True
+        return zlib.crc32(key.encode('utf-8')) % 10000 < self.threshold
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                data[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(correlation_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        fields = ' '.join(f'{key}={value}' for key, value in vars(record).items() if key not in _RESERVED)
+        return f'{text} {fields}' if fields else text
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """呼叫端只合併訊息參數，時間、JSON 等格式化留給背景執行緒"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # traceback 物件只能在呼叫端轉成文字
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_traceback_formatter = logging.Formatter()
+
+
+def setup_logging(level=None, fmt=None, sample_rate=None):
+    """設定根 logger（重複呼叫不會重複設定），回傳背景寫出的 QueueListener"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        level = level or Config.LOG_LEVEL
+        fmt = fmt or Config.LOG_FORMAT
+        sample_rate = Config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+        log_queue = queue.SimpleQueue()
+        handler = _QueueHandler(log_queue)
+        handler.addFilter(CorrelationFilter())
+        if sample_rate < 1:
+            handler.addFilter(SamplingFilter(sample_rate))
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.handlers = [handler]
+        # 第三方套件的除錯訊息量大，維持在 WARNING
+        for name in ('urllib3',):
+            logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def shutdown_logging():
+    """停止背景執行緒並寫出佇列中剩餘的記錄"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,381 @@
+"""效能指標（Prometheus 文字格式）
+
+提供計數器與延遲直方圖，由 /metrics 輸出。METRICS_ENABLED 關閉時：
+- timed / instrument_methods 直接回傳原本的函式與類別，不增加任何呼叫成本
+- counter / histogram 回傳不做任何事的物件
+
+數值保存在各程序的記憶體中。設定 METRICS_DIR（同一台機器上各程序共用的目錄）時，
+每個程序每 METRICS_FLUSH_SECONDS 秒將數值寫成 <pid>-<隨機碼>.json，/metrics 合併所有檔案後輸出，
+gunicorn 的多個工作程序與排程工作程序（python -m worker）的計數會加總在一起；
+程序結束後其數值併入 retired.json，計數器不會因為工作程序重啟而減少。
+"""
+import atexit
+import fcntl
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 匯入時決定是否啟用，之後套用的裝飾器依此判斷
+enabled = Config.METRICS_ENABLED
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+# 多程序彙整：本程序寫出的檔案與已結束程序的合併檔案
+_directory = Config.METRICS_DIR
+_process_file = None
+_flusher = None
+_retired = False
+RETIRED_FILE = 'retired.json'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _NullMetric:
+    """停用時使用的指標，所有操作皆不做任何事"""
+
+    def labels(self, **labels):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+_NULL = _NullMetric()
+
+
+class _Metric:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return {key: child.value for key, child in self._snapshot()}
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        samples = {}
+        for key, child in self._snapshot():
+            with child._lock:
+                samples[key] = [list(child.counts), child.sum, child.count]
+        return samples
+
+
+def _get_or_create(cls, name, documentation, labelnames, **kwargs):
+    if not enabled:
+        return _NULL
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+                if _directory:
+                    _start_flusher()
+    return metric
+
+
+def counter(name, documentation='', labelnames=()):
+    """取得（或建立）計數器"""
+    return _get_or_create(Counter, name, documentation, labelnames)
+
+
+def histogram(name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS):
+    """取得（或建立）直方圖"""
+    return _get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def timed(name, documentation='', **labels):
+    """裝飾器：記錄函式執行時間到 {name} 直方圖，拋出例外時累加 {name} 對應的 _errors_total 計數器"""
+    def decorator(func):
+        if not enabled:
+            return func
+        labelnames = tuple(labels)
+        latency = histogram(name, documentation, labelnames).labels(**labels)
+        errors = counter(
+            name.replace('_seconds', '') + '_errors_total', f'{documentation}（失敗次數）', labelnames
+        ).labels(**labels)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - started)
+
+        return wrapper
+    return decorator
+
+
+def instrument_methods(name, documentation='', label='method'):
+    """類別裝飾器：以 timed 包裝類別中所有公開方法，方法名稱作為 label"""
+    def decorator(cls):
+        if not enabled:
+            return cls
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or not callable(value):
+                continue
+            setattr(cls, attr, timed(name, documentation, **{label: attr})(value))
+        return cls
+    return decorator
+
+
+# 標籤值以不會出現在文字中的字元串接，作為 JSON 的鍵
+_SEPARATOR = '\x1f'
+
+
+def snapshot():
+    """本程序所有指標的數值 {名稱: {type, help, labelnames, buckets, samples}}"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {
+        metric.name: {
+            'type': metric.type,
+            'help': metric.documentation,
+            'labelnames': list(metric.labelnames),
+            'buckets': list(getattr(metric, 'buckets', ())),
+            'samples': {_SEPARATOR.join(key): value for key, value in metric.samples().items()},
+        }
+        for metric in metrics
+    }
+
+
+def _merge(total, other):
+    """將 other 的數值加到 total（計數器與直方圖皆可直接相加）"""
+    for name, metric in other.items():
+        target = total.setdefault(name, dict(metric, samples={}))
+        samples = target['samples']
+        for key, value in metric['samples'].items():
+            current = samples.get(key)
+            if current is None:
+                samples[key] = value
+            elif metric['type'] == 'counter':
+                samples[key] = current + value
+            else:
+                samples[key] = [
+                    [a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]
+                ]
+    return total
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # 其他程序正在建立或已刪除
+        return {}
+
+
+def _write(path, data):
+    """先寫入暫存檔再取代，讀取端不會讀到寫一半的檔案"""
+    temp = f"{path}.tmp"
+    with open(temp, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(temp, path)
+
+
+def flush():
+    """將本程序的數值寫到 METRICS_DIR"""
+    global _process_file
+    if not _directory or _retired:
+        return
+    if _process_file is None:
+        os.makedirs(_directory, exist_ok=True)
+        _process_file = os.path.join(_directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+    _write(_process_file, snapshot())
+
+
+def _flush_loop():
+    while True:
+        time.sleep(Config.METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            logger.exception("寫出效能指標失敗")
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+        _flusher.start()
+        atexit.register(retire)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _retire_files(paths):
+    """將已結束程序的檔案併入 retired.json 後刪除（以檔案鎖避免多個程序同時合併）"""
+    with open(os.path.join(_directory, 'retired.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired_path = os.path.join(_directory, RETIRED_FILE)
+        retired = _read(retired_path)
+        paths = [path for path in paths if os.path.exists(path)]
+        for path in paths:
+            _merge(retired, _read(path))
+        if paths:
+            _write(retired_path, retired)
+            for path in paths:
+                os.remove(path)
+
+
+def retire():
+    """程序結束時將本程序的數值併入 retired.json（gunicorn worker_exit 與 atexit 呼叫，只執行一次）"""
+    global _retired
+    if not _directory or not enabled or _retired:
+        return
+    flush()
+    _retired = True
+    _retire_files([_process_file])
+
+
+def collect():
+    """本程序與 METRICS_DIR 中其他程序（含已結束程序）的數值合計"""
+    total = _merge({}, snapshot())
+    if not _directory or not os.path.isdir(_directory):
+        return total
+
+    dead = []
+    for name in sorted(os.listdir(_directory)):
+        path = os.path.join(_directory, name)
+        if not name.endswith('.json') or path == _process_file:
+            continue
+        if name != RETIRED_FILE:
+            pid = int(name.split('-', 1)[0])
+            if not _pid_alive(pid):
+                # 未經 retire 就結束（例如被強制終止）的程序
+                dead.append(path)
+                continue
+        _merge(total, _read(path))
+    if dead:
+        _retire_files(dead)
+        _merge(total, _read(os.path.join(_directory, RETIRED_FILE)))
+    return total
+
+
+def render():
+    """輸出所有程序合計的指標（Prometheus 文字格式）"""
+    lines = []
+    for name, metric in sorted(collect().items()):
+        if metric['help']:
+            lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labelnames']
+        for joined, value in sorted(metric['samples'].items()):
+            key = joined.split(_SEPARATOR) if labelnames else []
+            if metric['type'] == 'counter':
+                lines.append(f"{name}{_format_labels(labelnames, key)} {value:g}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(metric['buckets'], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labelnames, key, ('le', f'{bound:g}'))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, key)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labelnames, key)} {count}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,36 @@
+"""資料列模型
+
+Database 以 cursor.row_factory 直接產生以下 namedtuple：實例只有 tuple 本身（__slots__ = ()），
+不會為每一列另外建立 dict，呼叫端以欄位名稱存取，不再依賴欄位位置。
+仍是 tuple，可以解包與比較；需要 JSON 保存的資料（例如對話狀態中的複習單字）維持 dict。
+"""
+import functools
+from collections import namedtuple
+
+
+class User(namedtuple('User', 'user_id name created_at')):
+    __slots__ = ()
+
+
+class DailyGoals(namedtuple('DailyGoals', 'id user_id goal1 goal2 goal3 date created_at')):
+    __slots__ = ()
+
+    @property
+    def goals(self):
+        """三個目標（未設定者為 None）"""
+        return (self.goal1, self.goal2, self.goal3)
+
+
+class Diary(namedtuple('Diary', 'id user_id content date created_at')):
+    __slots__ = ()
+
+
+class Expense(namedtuple('Expense', 'id amount category description date')):
+    __slots__ = ()
+
+
+@functools.lru_cache(maxsize=None)
+def row_factory(model):
+    """回傳供 cursor.row_factory 使用的函式，以查詢結果直接建立 model（欄位順序需與 model 相同）"""
+    make = model._make
+    return lambda cursor, row: make(row)
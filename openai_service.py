@@ -1,11 +1,19 @@
-import openai
 from config import Config
+import logging
+import metrics
 
+logger = logging.getLogger(__name__)
+
+@metrics.instrument_methods('openai_request_seconds', 'OpenAI 服務呼叫時間')
 class OpenAIService:
     def __init__(self):
         self.api_key = Config.OPENAI_API_KEY
+        self.openai = None
         if self.api_key:
+            # 只有設定金鑰時才載入 openai 套件（載入時間較長）
+            import openai
             openai.api_key = self.api_key
+            self.openai = openai
     
     def generate_motivational_message(self, user_name, goals=None):
         """生成激勵訊息"""
@@ -27,7 +35,7 @@ class OpenAIService:
             if goals:
                 prompt += f"\n用戶今日目標：\n1. {goals[0] or '未設定'}\n2. {goals[1] or '未設定'}\n3. {goals[2] or '未設定'}"
             
-            response = openai.ChatCompletion.create(
+            response = self.openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "你是一個溫暖的個人助理，專門提供激勵和鼓勵。"},
@@ -40,7 +48,7 @@ class OpenAIService:
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            print(f"OpenAI API 錯誤: {str(e)}")
+            logger.warning("OpenAI API 錯誤: %s", e)
             return f"嗨 {user_name}，今天要達成的3件事是甚麼？"
     
     def generate_evening_reflection(self, user_name):
@@ -59,7 +67,7 @@ class OpenAIService:
             4. 字數控制在80字以內
             """
             
-            response = openai.ChatCompletion.create(
+            response = self.openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "你是一個溫暖的個人助理，專門幫助用戶進行日常反思。"},
@@ -72,7 +80,7 @@ class OpenAIService:
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            print(f"OpenAI API 錯誤: {str(e)}")
+            logger.warning("OpenAI API 錯誤: %s", e)
             return f"嗨 {user_name}，今天有什麼值得記錄下來的事情？"
     
     def generate_vocabulary_suggestions(self, user_name):
@@ -91,7 +99,7 @@ class OpenAIService:
             4. 字數控制在60字以內
             """
             
-            response = openai.ChatCompletion.create(
+            response = self.openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "你是一個溫暖的學習助理，專門鼓勵用戶進行語言學習。"},
@@ -104,7 +112,7 @@ class OpenAIService:
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            print(f"OpenAI API 錯誤: {str(e)}")
+            logger.warning("OpenAI API 錯誤: %s", e)
             return f"提醒：{user_name}，記得背單字喔！"
     
     def enhance_summary(self, summary_data):
@@ -114,11 +122,15 @@ class OpenAIService:
         
         try:
             # 建立總結內容
+            goals = summary_data.get('goals')
+            goals_text = '、'.join(
+                goal or '未設定' for goal in (goals.goals if goals else (None, None, None))
+            )
             summary_text = f"""
             用戶今日總結：
             
             目標：
-            {summary_data.get('goals', ['未設定', '未設定', '未設定'])}
+            {goals_text}
             
             日記：
             {summary_data.get('diary', '未記錄')}
@@ -139,7 +151,7 @@ class OpenAIService:
             4. 字數控制在100字以內
             """
             
-            response = openai.ChatCompletion.create(
+            response = self.openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "你是一個溫暖的個人成長助理，專門提供正面鼓勵和建設性建議。"},
@@ -152,5 +164,5 @@ class OpenAIService:
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            print(f"OpenAI API 錯誤: {str(e)}")
+            logger.warning("OpenAI API 錯誤: %s", e)
             return None 
\ No newline at end of file
@@ -0,0 +1,270 @@
+"""PostgreSQL 資料庫後端
+
+設定 DATABASE_URL=postgresql://... 時由 services.get_db 使用，讓多台機器上的網頁程序與排程器共用同一個資料庫，
+寫入不再受限於單一 SQLite 檔案的寫入鎖。需要另外安裝 psycopg2（pip install psycopg2-binary）。
+
+沿用 Database 的所有方法與 SQL，只替換連線：
+- _PooledConnection 從連線池取得連線，提供與 sqlite3 相同的 cursor() / commit() / close() 寫法，
+  close() 時歸還連線池；SQL 中的 ? 參數轉為 %s
+- DATE / TIMESTAMP 以字串、NUMERIC 以 float 回傳，與 SQLite 的資料型別一致，呼叫端不需要區分後端
+只覆寫 SQLite 專用的部分：建立表格（轉換 database.TABLES 的欄位型別）、租約交易與派送順序；搜尋以 pg_trgm 索引加速 ILIKE。
+封存（archive.py）、線上備份（backup.py）與查詢分析（query_profiler.py）只支援 SQLite。
+"""
+import functools
+import logging
+import re
+import threading
+import time
+
+from config import Config
+import metrics
+from database import Database, TABLES, INDEXES
+
+logger = logging.getLogger(__name__)
+
+# 單引號字串中的 ? 不是參數（% 則一律需要跳脫）
+_SQL_TOKENS = re.compile(r"('(?:[^']|'')*')|(\?)|(%)")
+
+_pools = {}
+_initialized = set()
+_pools_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=512)
+def _to_pyformat(sql):
+    """將 sqlite3 的 ? 參數轉為 psycopg2 的 %s（字面的 % 改為 %%）"""
+    def replace(match):
+        if match.group(1):
+            return match.group(1).replace('%', '%%')
+        return '%s' if match.group(2) else '%%'
+    return _SQL_TOKENS.sub(replace, sql)
+
+
+# SQLite 表格定義轉為 PostgreSQL：自動編號、整數（SQLite 為 64 位元）、時間精度（與 SQLite 相同到秒）、
+# 浮點數與布林預設值，並移除外鍵
+_DDL_REPLACEMENTS = (
+    (re.compile(r'\bINTEGER PRIMARY KEY AUTOINCREMENT\b'), 'BIGSERIAL PRIMARY KEY'),
+    (re.compile(r'\bINTEGER\b'), 'BIGINT'),
+    (re.compile(r'\bTIMESTAMP\b'), 'TIMESTAMP(0)'),
+    (re.compile(r'\bREAL\b'), 'DOUBLE PRECISION'),
+    (re.compile(r'\bDECIMAL\b'), 'NUMERIC'),
+    (re.compile(r'\bBOOLEAN DEFAULT 0\b'), 'BOOLEAN DEFAULT FALSE'),
+    (re.compile(r',\s*FOREIGN KEY \(\w+\) REFERENCES \w+ \(\w+\)'), ''),
+)
+
+
+def _to_postgres_ddl(sql):
+    for pattern, replacement in _DDL_REPLACEMENTS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _as_text(value, cursor):
+    return value
+
+
+def _as_float(value, cursor):
+    return float(value) if value is not None else None
+
+
+class _Pool:
+    """psycopg2 連線池；連線用完時等待其他執行緒歸還，而不是拋出例外"""
+
+    def __init__(self, url, minconn, maxconn):
+        import psycopg2
+        import psycopg2.extensions
+        import psycopg2.pool
+
+        # 回傳與 SQLite 相同的型別：日期與時間為字串，金額為 float
+        extensions = psycopg2.extensions
+        for caster, name, cast in (
+            (extensions.PYDATE, 'DATE_TEXT', _as_text),
+            (extensions.PYDATETIME, 'TIMESTAMP_TEXT', _as_text),
+            (extensions.DECIMAL, 'NUMERIC_FLOAT', _as_float),
+        ):
+            extensions.register_type(extensions.new_type(caster.values, name, cast))
+
+        # CURRENT_TIMESTAMP 與 SQLite 相同為 UTC
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, url, options='-c TimeZone=UTC')
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self):
+        self._slots.acquire()
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+
+def _get_pool(url):
+    with _pools_lock:
+        pool = _pools.get(url)
+        if pool is None:
+            pool = _pools[url] = _Pool(url, Config.DATABASE_POOL_MIN, Config.DATABASE_POOL_MAX)
+        return pool
+
+
+class _Cursor:
+    """sqlite3 游標的子集；支援 row_factory（Database 以此產生資料列模型）"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.row_factory = None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, sql, parameters=()):
+        self._cursor.execute(_to_pyformat(sql), tuple(parameters))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._cursor.executemany(_to_pyformat(sql), [tuple(parameters) for parameters in seq_of_parameters])
+        return self
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None or self.row_factory is None:
+            return row
+        return self.row_factory(self, row)
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if self.row_factory is None:
+            return rows
+        return [self.row_factory(self, row) for row in rows]
+
+    def __iter__(self):
+        if self.row_factory is None:
+            return iter(self._cursor)
+        return (self.row_factory(self, row) for row in self._cursor)
+
+
+class _PooledConnection:
+    """從連線池借出的連線，close() 時歸還"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+        self._conn = pool.getconn()
+
+    def cursor(self):
+        return _Cursor(self._conn.cursor())
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            if not conn.closed:
+                # 未提交的交易（例如只讀查詢或發生例外）先還原，連線才能乾淨地放回連線池
+                conn.rollback()
+        finally:
+            self._pool.putconn(conn)
+
+    def __del__(self):
+        # 方法在 close() 前拋出例外時，連線仍會在物件回收時歸還
+        self.close()
+
+
+@metrics.instrument_methods('db_query_seconds', '資料庫操作執行時間')
+class PostgresDatabase(Database):
+    backend = 'postgresql'
+    like_operator = 'ILIKE'
+
+    def __init__(self, url=None):
+        self.url = url or Config.DATABASE_URL
+        self.db_path = None
+        self.fts_enabled = False
+        self._pool = _get_pool(self.url)
+        with _pools_lock:
+            if self.url not in _initialized:
+                self.init_database()
+                _initialized.add(self.url)
+
+    def _connect(self, **kwargs):
+        # timeout、isolation_level 等 sqlite3 參數不適用
+        return _PooledConnection(self._pool)
+
+    def init_database(self):
+        """以 database.TABLES / INDEXES 建立表格與索引（欄位順序與 SQLite 相同，SELECT * 的結果一致）
+
+        外鍵不建立約束，與 SQLite 未啟用 foreign_keys 時的行為相同。
+        """
+        statements = [_to_postgres_ddl(statement) for statement in TABLES + INDEXES] + [
+            # seq 取代 SQLite 的 rowid，依加入順序處理用戶
+            'ALTER TABLE job_deliveries ADD COLUMN IF NOT EXISTS seq BIGSERIAL',
+        ]
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        # 多個程序同時啟動時只讓一個建立表格
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('never_give_up_schema'))")
+        for statement in statements:
+            cursor.execute(statement)
+
+        # 搜尋以 pg_trgm 的 GIN 索引加速 ILIKE '%關鍵字%'；沒有權限建立擴充套件時仍可搜尋（逐列比對）
+        cursor.execute('SAVEPOINT search_index')
+        try:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for table, column in (('diaries', 'content'), ('vocabulary_records', 'words')):
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_{table}_{column}_trgm
+                    ON {table} USING gin ({column} gin_trgm_ops)
+                ''')
+        except Exception as e:
+            cursor.execute('ROLLBACK TO SAVEPOINT search_index')
+            logger.warning("無法建立 pg_trgm 索引，搜尋將逐列比對: %s", e)
+        conn.commit()
+        conn.close()
+
+    def acquire_lease(self, name, holder, lease_seconds):
+        """取得或續約租約，成功時回傳 True（UPDATE 的列鎖讓同時競爭的程序依序判斷）"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO leader_leases (name, holder, expires_at)
+                VALUES (?, '', 0)
+                ON CONFLICT DO NOTHING
+            ''', (name,))
+            cursor.execute('''
+                UPDATE leader_leases SET holder = ?, expires_at = ?
+                WHERE name = ? AND (holder = ? OR expires_at < ?)
+            ''', (holder, now + lease_seconds, name, holder, now))
+            acquired = cursor.rowcount == 1
+            conn.commit()
+            return acquired
+        finally:
+            conn.close()
+
+    def get_pending_deliveries(self, run_id, max_attempts):
+        """取得尚未完成的用戶（失敗次數未達上限者會重試）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id FROM job_deliveries
+            WHERE run_id = ? AND status IN ('pending', 'failed') AND attempts < ?
+            ORDER BY seq
+        ''', (run_id, max_attempts))
+        users = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return users
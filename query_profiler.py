@@ -0,0 +1,234 @@
+"""SQLite 查詢分析（慢查詢記錄）
+
+DB_PROFILE=true 時，Database 開啟的連線改用 ProfiledConnection：
+- 以語句（空白正規化後）為單位統計執行次數、總耗時、單次最長耗時與 SQLite 虛擬機指令數（進度回呼）
+- 單次執行（含取回結果）超過 DB_SLOW_QUERY_MS 時以 WARNING 記錄，附上 EXPLAIN QUERY PLAN
+- report() 依總耗時排序列出前 N 個語句，由 /admin/queries 與程序結束時的日誌輸出
+
+關閉時 connect() 直接回傳 sqlite3.connect 的連線，不增加任何成本。
+統計保存在各程序的記憶體中。
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 匯入時決定是否啟用；基準測試可在執行期間切換
+enabled = Config.DB_PROFILE
+
+# 每執行這麼多個虛擬機指令呼叫一次進度回呼
+PROGRESS_INTERVAL = 1000
+
+# 不同語句數上限（以字串組出 IN (?, ?, ...) 的語句會產生許多變化），超過後併入同一筆
+MAX_STATEMENTS = 1000
+OTHER_STATEMENTS = '(其他語句)'
+
+# 執行計畫中代表全表掃描的步驟
+FULL_SCAN_MARKERS = ('SCAN ',)
+
+
+def normalize(sql):
+    return ' '.join(sql.split())
+
+
+def explain(conn, sql, parameters=()):
+    """回傳語句的 EXPLAIN QUERY PLAN 步驟；無法解析時回傳錯誤說明"""
+    try:
+        # 使用原生游標，避免分析本身被記錄
+        rows = sqlite3.Cursor(conn).execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+    except sqlite3.Error as e:
+        return [f'無法解析：{e}']
+    return [row[3] for row in rows]
+
+
+def is_full_scan(step):
+    return step.startswith(FULL_SCAN_MARKERS) and 'INDEX' not in step
+
+
+class _Stat:
+    __slots__ = ('count', 'total', 'max', 'steps', 'slow', 'plan')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.steps = 0
+        self.slow = 0
+        self.plan = None
+
+
+class QueryProfiler:
+    """彙總各語句的執行統計"""
+
+    def __init__(self, slow_ms=None):
+        self.slow_seconds = (Config.DB_SLOW_QUERY_MS if slow_ms is None else slow_ms) / 1000
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _stat(self, key):
+        stat = self._stats.get(key)
+        if stat is None:
+            with self._lock:
+                if key not in self._stats and len(self._stats) >= MAX_STATEMENTS:
+                    key = OTHER_STATEMENTS
+                stat = self._stats.setdefault(key, _Stat())
+        return stat
+
+    def record(self, key, elapsed, steps, execution_elapsed, new_execution):
+        """累加一次執行或取回結果的耗時；execution_elapsed 為該次執行目前累計的耗時"""
+        stat = self._stat(key)
+        with self._lock:
+            if new_execution:
+                stat.count += 1
+            stat.total += elapsed
+            stat.steps += steps
+            if execution_elapsed > stat.max:
+                stat.max = execution_elapsed
+        return stat
+
+    def slow_query(self, conn, key, sql, parameters, elapsed):
+        """記錄慢查詢；同一語句的執行計畫只分析一次"""
+        stat = self._stat(key)
+        with self._lock:
+            stat.slow += 1
+        if stat.plan is None:
+            stat.plan = explain(conn, sql, parameters)
+        logger.warning(
+            "慢查詢 %.1f ms：%s", elapsed * 1000, key[:200],
+            extra={'elapsed_ms': round(elapsed * 1000, 1), 'plan': ' | '.join(stat.plan)}
+        )
+
+    def report(self, limit=20):
+        """依總耗時排序，回傳前 limit 個語句的統計"""
+        with self._lock:
+            items = [
+                (key, stat.count, stat.total, stat.max, stat.steps, stat.slow, stat.plan)
+                for key, stat in self._stats.items()
+            ]
+        items.sort(key=lambda item: item[2], reverse=True)
+        return [
+            {
+                'sql': key,
+                'count': count,
+                'total_ms': round(total * 1000, 3),
+                'avg_ms': round(total * 1000 / count, 3) if count else 0.0,
+                'max_ms': round(max_elapsed * 1000, 3),
+                'vm_steps': steps * PROGRESS_INTERVAL,
+                'slow': slow,
+                'full_scans': [step for step in plan if is_full_scan(step)] if plan else [],
+            }
+            for key, count, total, max_elapsed, steps, slow, plan in items[:limit]
+        ]
+
+    def format_report(self, limit=20):
+        """以文字表格輸出 report()"""
+        lines = [f"{'次數':>8}{'總計 ms':>12}{'平均 ms':>10}{'最長 ms':>10}{'慢':>6}  語句"]
+        for row in self.report(limit):
+            lines.append(
+                f"{row['count']:>8}{row['total_ms']:>12.1f}{row['avg_ms']:>10.3f}{row['max_ms']:>10.1f}"
+                f"{row['slow']:>6}  {row['sql'][:120]}"
+            )
+            for step in row['full_scans']:
+                lines.append(f"{'':>48}  全表掃描：{step}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """記錄每次執行與取回結果的耗時，歸入目前執行中的語句"""
+
+    _key = None
+
+    def _begin(self, sql, parameters):
+        self._sql = sql
+        self._parameters = parameters
+        self._key = normalize(sql)
+        self._elapsed = 0.0
+        self._reported = False
+
+    def _measure(self, func, *args, new_execution=False):
+        conn = self.connection
+        steps = conn._steps
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            if self._key is not None:
+                self._elapsed += elapsed
+                profiler = conn._profiler
+                profiler.record(self._key, elapsed, conn._steps - steps, self._elapsed, new_execution)
+                if not self._reported and self._elapsed >= profiler.slow_seconds:
+                    self._reported = True
+                    profiler.slow_query(conn, self._key, self._sql, self._parameters, self._elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        return self._measure(super().execute, sql, parameters, new_execution=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        # 執行計畫以未綁定參數分析（視為 NULL），索引使用情形相同
+        self._begin(sql, ())
+        return self._measure(super().executemany, sql, seq_of_parameters, new_execution=True)
+
+    def fetchone(self):
+        return self._measure(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._measure(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._measure(super().fetchall)
+
+    def __next__(self):
+        return self._measure(super().__next__)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """游標一律使用 ProfiledCursor，並以進度回呼計算虛擬機指令數"""
+
+    _profiler = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._steps = 0
+        self.set_progress_handler(self._tick, PROGRESS_INTERVAL)
+
+    def _tick(self):
+        self._steps += 1
+        return 0
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute 不經過 cursor()，需另外導向
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+profiler = QueryProfiler()
+
+
+def connect(database, **kwargs):
+    """開啟資料庫連線；啟用時回傳記錄查詢統計的連線"""
+    if not enabled:
+        return sqlite3.connect(database, **kwargs)
+    conn = sqlite3.connect(database, factory=ProfiledConnection, **kwargs)
+    conn._profiler = profiler
+    return conn
+
+
+def log_report(limit=None):
+    """將前 N 個語句的統計寫入日誌（程序結束時呼叫）"""
+    if enabled and profiler.report(1):
+        logger.info("查詢統計（依總耗時排序）\n%s", profiler.format_report(limit or Config.DB_PROFILE_TOP))
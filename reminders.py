@@ -0,0 +1,58 @@
+import re
+import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from config import Config
+
+# 提醒類型與中文名稱
+REMINDER_TYPES = {
+    'morning': '早上',
+    'evening': '晚上',
+    'summary': '總結',
+    'vocabulary': '單字',
+}
+
+TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3])[:：]([0-5]\d)$')
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def default_reminder_times():
+    """取得預設提醒時間"""
+    return {
+        'morning': Config.MORNING_TIME,
+        'evening': Config.EVENING_TIME,
+        'summary': Config.SUMMARY_TIME,
+        'vocabulary': Config.VOCABULARY_TIME,
+    }
+
+
+def parse_time(text):
+    """解析 HH:MM 時間字串，格式錯誤時回傳 None"""
+    match = TIME_PATTERN.match(text.strip())
+    if not match:
+        return None
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def is_valid_timezone(name):
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def local_today(timezone=None):
+    """用戶時區的今天（未設定時區時使用 DEFAULT_TIMEZONE）"""
+    return datetime.datetime.now(ZoneInfo(timezone or Config.DEFAULT_TIMEZONE)).date()
+
+
+def to_utc_minute(local_time, timezone, date=None):
+    """將用戶時區的當地時間轉為 UTC 當日分鐘數（0-1439），作為排程分桶鍵值"""
+    tz = ZoneInfo(timezone)
+    if date is None:
+        date = datetime.datetime.now(tz).date()
+    hour, minute = (int(part) for part in local_time.split(':'))
+    local = datetime.datetime.combine(date, datetime.time(hour, minute), tzinfo=tz)
+    utc = local.astimezone(datetime.timezone.utc)
+    return utc.hour * 60 + utc.minute
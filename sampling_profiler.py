@@ -0,0 +1,180 @@
+"""取樣分析器（執行中開關，輸出 collapsed stack）
+
+背景執行緒每隔固定時間以 sys._current_frames() 取得所有執行緒的呼叫堆疊並計數，
+停止時寫出 collapsed stack 檔（每行「執行緒;外層函式;...;內層函式 次數」），
+可直接交給 flamegraph.pl 或 speedscope 繪製火焰圖。
+
+- 取樣的是牆上時間：等待 LINE / OpenAI 回應、資料庫鎖定的時間也會出現在堆疊中
+- 不需要重新啟動：由 /admin/profile 或 SIGUSR2 開始與停止
+- 未啟動時沒有任何成本；取樣期間的成本與執行緒數量成正比（預設每秒 100 次）
+
+只分析所在的程序；gunicorn 有多個工作程序時，對個別程序送出訊號或多次呼叫端點。
+"""
+import datetime
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 執行緒池的編號（ThreadPoolExecutor-0_3、scheduler-job_1）不區分，合併成同一個根節點
+_THREAD_SUFFIX = re.compile(r'[_-]\d+(?=\s|$)')
+
+
+def _thread_label(name):
+    return _THREAD_SUFFIX.sub('', name).replace(';', ':').replace(' ', '_')
+
+
+def _frame_label(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    # co_qualname 自 Python 3.11 起才有，較舊版本退回只有函式名稱的 co_name
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{module}:{name}".replace(';', ':').replace(' ', '_')
+
+
+class SamplingProfiler:
+    """以固定間隔取樣所有執行緒的呼叫堆疊"""
+
+    def __init__(self, output_dir=None, interval_ms=None, max_seconds=None):
+        self.output_dir = output_dir or Config.PROFILE_DIR
+        self.interval = (interval_ms or Config.PROFILE_INTERVAL_MS) / 1000
+        self.max_seconds = max_seconds or Config.PROFILE_MAX_SECONDS
+        self.last_path = None
+        self._counts = {}
+        self._samples = 0
+        self._started_at = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # 訊號處理只放入切換要求，由 _toggle_worker 執行（SimpleQueue.put 可重入，不會與 _lock 互鎖）
+        self._toggle_requests = queue.SimpleQueue()
+        self._toggle_worker = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def status(self):
+        return {
+            'running': self.running,
+            'samples': self._samples,
+            'started_at': self._started_at.isoformat(timespec='seconds') if self._started_at else None,
+            'interval_ms': self.interval * 1000,
+            'last_path': self.last_path,
+        }
+
+    def start(self, seconds=None, interval_ms=None):
+        """開始取樣，seconds 秒後（最多 PROFILE_MAX_SECONDS）自動停止並寫出；已在取樣時回傳 False"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            if interval_ms:
+                self.interval = interval_ms / 1000
+            duration = min(seconds or self.max_seconds, self.max_seconds)
+            self._counts = {}
+            self._samples = 0
+            self._started_at = datetime.datetime.now()
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(duration,), name='sampling-profiler', daemon=True
+            )
+            self._thread.start()
+        logger.info("開始取樣分析（每 %.0f ms，最多 %s 秒）", self.interval * 1000, duration)
+        return True
+
+    def stop(self):
+        """停止取樣並寫出結果，回傳檔案路徑（未在取樣時回傳 None）"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return None
+            self._stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        return self.last_path
+
+    def toggle(self):
+        """未取樣時開始，取樣中則停止"""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def request_toggle(self):
+        """要求切換取樣，立即返回（供訊號處理使用；需先呼叫 start_toggle_worker）
+
+        訊號處理在主執行緒執行，主執行緒可能正持有 _lock（例如在 start() 中），
+        也不能等待取樣執行緒寫出結果，因此不直接呼叫 toggle()。
+        """
+        self._toggle_requests.put(None)
+
+    def start_toggle_worker(self):
+        """啟動執行切換要求的背景執行緒（只啟動一次）"""
+        with self._lock:
+            if self._toggle_worker is None:
+                self._toggle_worker = threading.Thread(
+                    target=self._toggle_loop, name='sampling-profiler-toggle', daemon=True
+                )
+                self._toggle_worker.start()
+
+    def _toggle_loop(self):
+        while True:
+            self._toggle_requests.get()
+            try:
+                self.toggle()
+            except Exception:
+                logger.exception("切換取樣分析失敗")
+
+    def _run(self, duration):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        try:
+            while not self._stop_event.wait(self.interval) and time.monotonic() < deadline:
+                self._sample(own_id)
+        finally:
+            path = self._write()
+            with self._lock:
+                self.last_path = path
+                self._thread = None
+
+    def _sample(self, own_id):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(_thread_label(names.get(thread_id, str(thread_id))))
+            key = ';'.join(reversed(stack))
+            self._counts[key] = self._counts.get(key, 0) + 1
+        self._samples += 1
+
+    def _write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = f"profile-{os.getpid()}-{self._started_at:%Y%m%d-%H%M%S}.folded"
+        path = os.path.join(self.output_dir, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self._counts.items()):
+                f.write(f"{stack} {count}\n")
+        logger.info("取樣分析結束：%s 次取樣，寫入 %s", self._samples, path,
+                    extra={'samples': self._samples, 'path': path})
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def install_signal_handler(signum=None):
+    """以訊號（預設 SIGUSR2）切換取樣；只能在主執行緒呼叫"""
+    import signal
+    signum = signum or signal.SIGUSR2
+    profiler.start_toggle_worker()
+    signal.signal(signum, lambda received, frame: profiler.request_toggle())
@@ -1,20 +1,55 @@
-import schedule
-import time
 import threading
 import datetime
+import functools
+import logging
+import time
 from linebot import LineBotApi
 from linebot.models import TextSendMessage
 from config import Config
 from database import Database
 from email_service import EmailService
 from openai_service import OpenAIService
+from vocabulary_service import VocabularyService
+from expense_stats import ExpenseStatsService
+from timer_heap import TimerHeap
+from archive import Archiver
+from backup import Backup
+from reminders import REMINDER_TYPES, MINUTES_PER_DAY
+from dispatch import dispatch_offset, RatePacer
+from leader import LeaderElection
+import metrics
+from logging_setup import correlation
+
+logger = logging.getLogger(__name__)
+
+# 排程延遲時最多補跑的分鐘數
+MAX_CATCHUP_MINUTES = 10
+
+# 每次寫入發送狀態的最多用戶數（也是當機後可能重複發送的上限）
+MAX_MARK_BATCH = 500
+
+JOB_SECONDS = metrics.histogram(
+    'scheduler_job_seconds', '排程任務（單一批次）執行時間', ['job'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+DELIVERIES = metrics.counter('scheduler_deliveries_total', '排程任務處理的用戶數', ['job', 'status'])
 
 class Scheduler:
-    def __init__(self, line_bot_api):
+    def __init__(self, line_bot_api, max_workers=None, db=None,
+                 email_service=None, openai_service=None, vocabulary_service=None):
         self.line_bot_api = line_bot_api
-        self.db = Database()
-        self.email_service = EmailService()
-        self.openai_service = OpenAIService()
+        self.db = db or Database()
+        self.email_service = email_service or EmailService()
+        self.openai_service = openai_service or OpenAIService()
+        self.vocabulary_service = vocabulary_service or VocabularyService(self.db)
+        self.expense_stats = ExpenseStatsService(self.db, line_bot_api)
+        self.timers = TimerHeap(max_workers or Config.SCHEDULER_WORKERS)
+        self._stop_event = threading.Event()
+        self._last_minute = None
+        self.window_seconds = Config.DISPATCH_WINDOW_MINUTES * 60
+        self.pacer = RatePacer(Config.DISPATCH_RATE)
+        # 由領導者選舉設定：回傳 False 時暫停發送（見 leader_election）
+        self.lease_check = None
         self.running = False
     
     def start(self):
@@ -23,161 +58,340 @@ class Scheduler:
             return
         
         self.running = True
+        self._stop_event.clear()
         
-        # 設定定時任務
-        schedule.every().day.at(Config.MORNING_TIME).do(self.morning_task)
-        schedule.every().day.at(Config.EVENING_TIME).do(self.evening_task)
-        schedule.every().day.at(Config.SUMMARY_TIME).do(self.summary_task)
+        # 每分鐘處理該分鐘到期的用戶（依各用戶時區與提醒時間分桶）
+        self._last_minute = None
+        self.timers.every(60, self._tick, align=True)
+        # 每小時重新計算分桶，處理日光節約時間
+        self.timers.every(3600, self.db.refresh_reminder_minutes, align=True)
+        # 每小時清除過期的任務執行記錄
+        self.timers.every(3600, self.job_cleanup_task, align=True)
+        # 重新計算記帳後待更新的統計（標記存在資料庫，任何工作程序的記帳都會處理）
+        self.timers.every(max(Config.EXPENSE_STATS_DEBOUNCE, 1), self.expense_stats_task)
+        # 每天封存保留期限以前的記錄（只支援 SQLite；PostgreSQL 以 pg_dump 等工具備份）
+        sqlite = self.db.backend == 'sqlite'
+        if Config.ARCHIVE_TIME and sqlite:
+            self.timers.every_day_at(Config.ARCHIVE_TIME, self.archive_task)
+        # 每天線上備份
+        if Config.BACKUP_TIME and sqlite:
+            self.timers.every_day_at(Config.BACKUP_TIME, self.backup_task)
+        self.timers.start()
+        # 續跑上次中斷的任務
+        self.timers.submit(self.resume_incomplete_runs)
         
-        # 在背景執行排程器
-        scheduler_thread = threading.Thread(target=self._run_scheduler)
-        scheduler_thread.daemon = True
-        scheduler_thread.start()
-        
-        print(f"排程器已啟動，定時任務設定：")
-        print(f"  早上 {Config.MORNING_TIME} - 發送目標提醒")
-        print(f"  晚上 {Config.EVENING_TIME} - 發送日記提醒")
-        print(f"  晚上 {Config.SUMMARY_TIME} - 發送總結郵件")
+        logger.info(
+            "排程器已啟動，依用戶設定的時區與時間發送提醒（預設時區 %s）："
+            "早上 %s 目標提醒、晚上 %s 日記提醒、晚上 %s 總結郵件、中午 %s 單字複習提醒",
+            Config.DEFAULT_TIMEZONE, Config.MORNING_TIME, Config.EVENING_TIME,
+            Config.SUMMARY_TIME, Config.VOCABULARY_TIME
+        )
     
-    def stop(self):
-        """停止排程器"""
+    def stop(self, wait=False):
+        """停止排程器（立即生效，執行中的任務會在處理完目前用戶後結束）"""
+        if not self.running:
+            return
         self.running = False
-        schedule.clear()
-        print("排程器已停止")
+        self._stop_event.set()
+        self.timers.stop(wait=wait)
+        logger.info("排程器已停止")
     
-    def _run_scheduler(self):
-        """執行排程器主迴圈"""
-        while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # 每分鐘檢查一次
+    def leader_election(self):
+        """建立排程器的領導者選舉（需呼叫 start()）
+
+        失去或釋放租約前先停止排程並等待執行中的任務寫入發送結果，
+        新的領導者續跑同一筆任務時就不會再發送給已處理的用戶。
+        """
+        leader = LeaderElection(
+            self.db, 'scheduler', Config.LEADER_LEASE_SECONDS,
+            on_elected=self.start, on_revoked=functools.partial(self.stop, wait=True)
+        )
+        # 續約失敗、租約剩不到一次續約間隔時暫停發送，租約過期後不會與新的領導者同時發送
+        self.lease_check = lambda: leader.holds_lease(leader.lease_seconds / 3)
+        return leader
     
-    def morning_task(self):
-        """早上任務：發送目標提醒"""
-        print(f"執行早上任務 - {datetime.datetime.now()}")
+    def _stopping(self):
+        """排程器是否正在停止"""
+        return self._stop_event.is_set()
+    
+    def _tick(self):
+        """每分鐘執行：派送這一分鐘（含延遲未處理的分鐘）到期的提醒"""
+        current = int(time.time() // 60)
+        if self._last_minute is None:
+            self._last_minute = current - 1
+        start = max(self._last_minute + 1, current - MAX_CATCHUP_MINUTES + 1)
+        self._last_minute = current
         
-        try:
-            # 取得所有用戶
-            users = self._get_all_users()
+        for epoch_minute in range(start, current + 1):
+            self._dispatch_bucket(epoch_minute)
+    
+    def _dispatch_bucket(self, epoch_minute):
+        """查詢指定分鐘的用戶並派送對應任務"""
+        tasks = {
+            'morning': self.morning_task,
+            'evening': self.evening_task,
+            'summary': self.summary_task,
+            'vocabulary': self.vocabulary_task,
+        }
+        minute = epoch_minute % MINUTES_PER_DAY
+        for reminder in REMINDER_TYPES:
+            users = self.db.get_users_for_reminder(reminder, minute)
+            if not users:
+                continue
+            name = f"{reminder}_task"
+            start = epoch_minute * 60
+            # run_key 為預定執行時間（epoch 秒），同一批次重新執行時會略過已完成的用戶
+            if not self.window_seconds:
+                self.timers.submit(tasks[reminder], users, str(start), name=name)
+                continue
             
+            # 派送視窗模式：依用戶 ID 雜湊出固定偏移，同一秒的用戶合併成一批
+            batches = {}
             for user_id in users:
-                try:
-                    user = self.db.get_user(user_id)
-                    user_name = user[1] if user else "用戶"
-                    
-                    # 取得昨日目標作為參考
-                    yesterday = datetime.date.today() - datetime.timedelta(days=1)
-                    yesterday_goals = self.db.get_daily_goals(user_id, yesterday)
-                    
-                    # 生成激勵訊息
-                    message = self.openai_service.generate_motivational_message(
-                        user_name, 
-                        yesterday_goals[1:4] if yesterday_goals else None
-                    )
-                    
-                    # 發送訊息
-                    self.line_bot_api.push_message(
-                        user_id,
-                        TextSendMessage(text=message)
-                    )
-                    
-                    print(f"已發送早晨訊息給 {user_name}")
-                    
-                except Exception as e:
-                    print(f"發送早晨訊息給用戶 {user_id} 失敗: {str(e)}")
-            
-        except Exception as e:
-            print(f"早上任務執行失敗: {str(e)}")
+                batches.setdefault(dispatch_offset(user_id, self.window_seconds), []).append(user_id)
+            for offset, batch in batches.items():
+                self.timers.schedule_at(start + offset, tasks[reminder], batch, str(start + offset), name=name)
+    
+    def _pace(self):
+        """依 DISPATCH_RATE 控制處理速率，排程器停止時回傳 False"""
+        if not self.pacer.acquire(self._stop_event):
+            return False
+        # 租約可能即將過期：等待續約恢復，或失去領導權後由 stop() 結束
+        while self.lease_check and not self.lease_check():
+            if self._stop_event.wait(1):
+                return False
+        return not self._stopping()
+    
+    def _run_job(self, job_name, users, run_key, deliver, batch_size=None, prepare=None):
+        """以執行記錄逐一處理用戶，中斷後以相同 run_key 重新執行會略過已完成的用戶
+
+        deliver(user_id, context) 回傳 False 表示略過；prepare(batch) 可為每批用戶預先查詢資料。
+        """
+        if run_key is None:
+            # 與分桶派送相同，以目前 UTC 分鐘的 epoch 秒為鍵；伺服器的日期對其他時區的用戶沒有意義
+            run_key = str(int(time.time() // 60) * 60)
+        
+        # 同一批次的記錄（含資料庫、LINE、OpenAI、郵件）使用相同的關聯 ID
+        with correlation(f"{job_name}:{run_key}"):
+            started = time.perf_counter()
+            try:
+                self._process_job(job_name, users, run_key, deliver, batch_size, prepare)
+            finally:
+                elapsed = time.perf_counter() - started
+                JOB_SECONDS.labels(job=job_name).observe(elapsed)
+                logger.info("%s 批次結束，耗時 %.2f 秒", job_name, elapsed, extra={"run_key": run_key})
+    
+    def _process_job(self, job_name, users, run_key, deliver, batch_size, prepare):
+        run_id, created = self.db.start_job_run(job_name, run_key)
+        if users is None and created:
+            # 未指定時處理所有用戶
+            users = self.db.get_all_user_ids()
+        if users:
+            self.db.add_job_deliveries(run_id, users)
+        
+        pending = self.db.get_pending_deliveries(run_id, Config.JOB_MAX_ATTEMPTS)
+        batch_size = min(batch_size or len(pending) or 1, MAX_MARK_BATCH)
+        
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            context = prepare(batch) if prepare else None
+            # 每批的處理結果在同一交易中寫入；中途當機時這一批會在續跑時重新發送
+            results = []
+            try:
+                for user_id in batch:
+                    if not self._pace():
+                        # 保留為執行中，下次啟動時續跑
+                        logger.warning("%s (%s) 已中斷，剩餘用戶將於重新啟動後續跑", job_name, run_key)
+                        return
+                    try:
+                        delivered = deliver(user_id, context)
+                        status = 'skipped' if delivered is False else 'done'
+                        results.append((user_id, status, None))
+                    except Exception as e:
+                        logger.error("%s 處理用戶失敗: %s", job_name, e, extra={"user_id": user_id})
+                        status = 'failed'
+                        results.append((user_id, status, str(e)))
+                    DELIVERIES.labels(job=job_name, status=status).inc()
+            finally:
+                if results:
+                    self.db.mark_deliveries(run_id, results)
+        
+        self.db.finish_job_run(run_id)
+    
+    def resume_incomplete_runs(self):
+        """續跑上次中斷（程序重啟或當機）的任務"""
+        tasks = {
+            'morning_task': self.morning_task,
+            'evening_task': self.evening_task,
+            'summary_task': self.summary_task,
+            'vocabulary_task': self.vocabulary_task,
+        }
+        for job_name, run_key in self.db.get_incomplete_job_runs(Config.JOB_RESUME_HOURS):
+            task = tasks.get(job_name)
+            if task:
+                logger.info("續跑未完成的任務 %s (%s)", job_name, run_key)
+                self.timers.submit(task, None, run_key, name=job_name)
+    
+    def archive_task(self):
+        """封存任務：將保留期限以前的記錄搬到封存資料庫並歸還空間"""
+        with correlation(f"archive:{datetime.date.today().isoformat()}"):
+            try:
+                # 保留期限涵蓋所有統計區間，快取的畫面不受影響，不需要使其失效
+                for path in self.db.db_paths:
+                    Archiver(path).run()
+            except Exception:
+                logger.exception("封存任務執行失敗")
+    
+    def job_cleanup_task(self):
+        """清除結束超過 JOB_RETENTION_DAYS 天的任務執行記錄與發送狀態"""
+        try:
+            purged = self.db.purge_job_runs(Config.JOB_RETENTION_DAYS)
+            if purged:
+                logger.info("已清除 %s 筆過期的任務執行記錄", purged)
+        except Exception:
+            logger.exception("清除任務執行記錄失敗")
+    
+    def expense_stats_task(self):
+        """記帳統計任務：重新計算記帳後已超過 debounce 秒的用戶統計並檢查預算"""
+        try:
+            self.expense_stats.refresh_pending()
+        except Exception:
+            logger.exception("記帳統計任務執行失敗")
+    
+    def backup_task(self):
+        """備份任務：以 backup API 建立一致的資料庫快照並輪替舊備份"""
+        with correlation(f"backup:{datetime.date.today().isoformat()}"):
+            try:
+                for path in self.db.db_paths:
+                    Backup(path).run()
+            except Exception:
+                logger.exception("備份任務執行失敗")
+    
+    def morning_task(self, users=None, run_key=None):
+        """早上任務：發送目標提醒"""
+        logger.info("執行早上任務", extra={"users": len(users) if users else None})
+        
+        try:
+            self._run_job('morning_task', users, run_key, self._send_morning_message)
+        except Exception:
+            logger.exception("早上任務執行失敗")
+    
+    def _send_morning_message(self, user_id, context=None):
+        user = self.db.get_user(user_id)
+        user_name = user.name if user else "用戶"
+        
+        # 取得昨日目標作為參考（用戶時區的昨天）
+        yesterday = self.db.get_user_today(user_id) - datetime.timedelta(days=1)
+        yesterday_goals = self.db.get_daily_goals(user_id, yesterday)
+        
+        # 生成激勵訊息
+        message = self.openai_service.generate_motivational_message(
+            user_name, 
+            yesterday_goals.goals if yesterday_goals else None
+        )
+        
+        # 發送訊息
+        self.line_bot_api.push_message(
+            user_id,
+            TextSendMessage(text=message)
+        )
+        
+        logger.debug("已發送早晨訊息", extra={"user_id": user_id})
     
-    def evening_task(self):
+    def evening_task(self, users=None, run_key=None):
         """晚上任務：發送日記提醒"""
-        print(f"執行晚上任務 - {datetime.datetime.now()}")
+        logger.info("執行晚上任務", extra={"users": len(users) if users else None})
         
         try:
-            # 取得所有用戶
-            users = self._get_all_users()
-            
-            for user_id in users:
-                try:
-                    user = self.db.get_user(user_id)
-                    user_name = user[1] if user else "用戶"
-                    
-                    # 生成晚上反思提示
-                    message = self.openai_service.generate_evening_reflection(user_name)
-                    
-                    # 發送訊息
-                    self.line_bot_api.push_message(
-                        user_id,
-                        TextSendMessage(text=message)
-                    )
-                    
-                    print(f"已發送晚上訊息給 {user_name}")
-                    
-                except Exception as e:
-                    print(f"發送晚上訊息給用戶 {user_id} 失敗: {str(e)}")
-            
-        except Exception as e:
-            print(f"晚上任務執行失敗: {str(e)}")
+            self._run_job('evening_task', users, run_key, self._send_evening_message)
+        except Exception:
+            logger.exception("晚上任務執行失敗")
+    
+    def _send_evening_message(self, user_id, context=None):
+        user = self.db.get_user(user_id)
+        user_name = user.name if user else "用戶"
+        
+        # 生成晚上反思提示
+        message = self.openai_service.generate_evening_reflection(user_name)
+        
+        # 發送訊息
+        self.line_bot_api.push_message(
+            user_id,
+            TextSendMessage(text=message)
+        )
+        
+        logger.debug("已發送晚上訊息", extra={"user_id": user_id})
     
-    def summary_task(self):
+    def summary_task(self, users=None, run_key=None):
         """總結任務：發送每日總結郵件"""
-        print(f"執行總結任務 - {datetime.datetime.now()}")
+        logger.info("執行總結任務", extra={"users": len(users) if users else None})
         
         try:
-            # 取得所有用戶
-            users = self._get_all_users()
-            
-            for user_id in users:
-                try:
-                    # 取得今日總結資料
-                    summary_data = self.db.get_today_summary(user_id)
-                    
-                    # 使用AI增強總結
-                    ai_enhancement = self.openai_service.enhance_summary(summary_data)
-                    if ai_enhancement:
-                        summary_data['ai_enhancement'] = ai_enhancement
-                    
-                    # 發送郵件
-                    self.email_service.send_daily_summary(
-                        summary_data['user_name'], 
-                        summary_data
-                    )
-                    
-                    print(f"已發送總結郵件給 {summary_data['user_name']}")
-                    
-                except Exception as e:
-                    print(f"發送總結郵件給用戶 {user_id} 失敗: {str(e)}")
-            
-        except Exception as e:
-            print(f"總結任務執行失敗: {str(e)}")
-    
-    def _get_all_users(self):
-        """取得所有用戶ID"""
-        conn = self.db.db_path
-        import sqlite3
-        conn = sqlite3.connect(conn)
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id FROM users')
-        users = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return users
-    
-    def send_vocabulary_reminder(self, user_id):
-        """發送單字學習提醒"""
+            self._run_job('summary_task', users, run_key, self._send_summary_email)
+        except Exception:
+            logger.exception("總結任務執行失敗")
+    
+    def _send_summary_email(self, user_id, context=None):
+        # 取得今日總結資料
+        summary_data = self.db.get_today_summary(user_id)
+        
+        # 使用AI增強總結
+        ai_enhancement = self.openai_service.enhance_summary(summary_data)
+        if ai_enhancement:
+            summary_data['ai_enhancement'] = ai_enhancement
+        
+        # 發送郵件
+        if not self.email_service.send_daily_summary(summary_data['user_name'], summary_data):
+            return False
+        
+        logger.debug("已發送總結郵件", extra={"user_id": user_id})
+    
+    def vocabulary_task(self, users=None, run_key=None):
+        """單字任務：推播今天到期需複習的單字"""
+        logger.info("執行單字任務", extra={"users": len(users) if users else None})
+        
         try:
-            user = self.db.get_user(user_id)
-            user_name = user[1] if user else "用戶"
-            
-            message = self.openai_service.generate_vocabulary_suggestions(user_name)
-            
-            self.line_bot_api.push_message(
-                user_id,
-                TextSendMessage(text=message)
+            # 每批用戶只查詢一次到期單字，沒有到期單字的用戶略過
+            self._run_job(
+                'vocabulary_task', users, run_key, self._send_due_words,
+                batch_size=Config.VOCABULARY_BATCH_SIZE,
+                prepare=self.db.get_due_words_for_users
             )
-            
-            print(f"已發送單字提醒給 {user_name}")
-            
+        except Exception:
+            logger.exception("單字任務執行失敗")
+    
+    def _send_due_words(self, user_id, due):
+        due_words = due.get(user_id)
+        if not due_words:
+            return False
+        self._push_vocabulary_reminder(user_id, due_words)
+    
+    def send_vocabulary_reminder(self, user_id, due_words=None):
+        """發送單字複習提醒（只推播今天到期的單字）"""
+        try:
+            self._push_vocabulary_reminder(user_id, due_words)
         except Exception as e:
-            print(f"發送單字提醒失敗: {str(e)}")
+            logger.error("發送單字提醒失敗: %s", e, extra={"user_id": user_id})
+    
+    def _push_vocabulary_reminder(self, user_id, due_words=None):
+        user = self.db.get_user(user_id)
+        user_name = user.name if user else "用戶"
+        
+        if due_words is None:
+            due_words = self.vocabulary_service.get_due_words(user_id)
+        
+        if due_words:
+            message = self.vocabulary_service.format_due_message(user_name, due_words)
+        else:
+            # 沒有到期單字時，提醒學習新單字
+            message = self.openai_service.generate_vocabulary_suggestions(user_name)
+        
+        self.line_bot_api.push_message(
+            user_id,
+            TextSendMessage(text=message)
+        )
+        
+        logger.debug("已發送單字提醒", extra={"user_id": user_id})
     
     def manual_trigger(self, task_type, user_id=None):
         """手動觸發任務（用於測試）"""
@@ -186,39 +400,39 @@ class Scheduler:
                 # 為特定用戶執行
                 users = [user_id]
             else:
-                users = self._get_all_users()
+                users = self.db.get_all_user_ids()
             
             for uid in users:
                 try:
                     user = self.db.get_user(uid)
-                    user_name = user[1] if user else "用戶"
+                    user_name = user.name if user else "用戶"
                     message = self.openai_service.generate_motivational_message(user_name)
                     self.line_bot_api.push_message(uid, TextSendMessage(text=message))
-                    print(f"手動觸發早晨任務 - 已發送給 {user_name}")
+                    logger.info("手動觸發早晨任務 - 已發送", extra={"user_id": uid})
                 except Exception as e:
-                    print(f"手動觸發早晨任務失敗: {str(e)}")
+                    logger.error("手動觸發早晨任務失敗: %s", e, extra={"user_id": uid})
         
         elif task_type == "evening":
             if user_id:
                 users = [user_id]
             else:
-                users = self._get_all_users()
+                users = self.db.get_all_user_ids()
             
             for uid in users:
                 try:
                     user = self.db.get_user(uid)
-                    user_name = user[1] if user else "用戶"
+                    user_name = user.name if user else "用戶"
                     message = self.openai_service.generate_evening_reflection(user_name)
                     self.line_bot_api.push_message(uid, TextSendMessage(text=message))
-                    print(f"手動觸發晚上任務 - 已發送給 {user_name}")
+                    logger.info("手動觸發晚上任務 - 已發送", extra={"user_id": uid})
                 except Exception as e:
-                    print(f"手動觸發晚上任務失敗: {str(e)}")
+                    logger.error("手動觸發晚上任務失敗: %s", e, extra={"user_id": uid})
         
         elif task_type == "summary":
             if user_id:
                 users = [user_id]
             else:
-                users = self._get_all_users()
+                users = self.db.get_all_user_ids()
             
             for uid in users:
                 try:
@@ -227,6 +441,6 @@ class Scheduler:
                     if ai_enhancement:
                         summary_data['ai_enhancement'] = ai_enhancement
                     self.email_service.send_daily_summary(summary_data['user_name'], summary_data)
-                    print(f"手動觸發總結任務 - 已發送給 {summary_data['user_name']}")
+                    logger.info("手動觸發總結任務 - 已發送", extra={"user_id": uid})
                 except Exception as e:
-                    print(f"手動觸發總結任務失敗: {str(e)}") 
\ No newline at end of file
+                    logger.error("手動觸發總結任務失敗: %s", e, extra={"user_id": uid}) 
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""共用服務（延遲建立的單例）
+
+各服務在第一次使用時才建立，同一程序內共用同一個實例；匯入本模組不會連線資料庫或載入外部套件。
+"""
+import threading
+from config import Config
+
+_instances = {}
+_lock = threading.RLock()
+
+
+def _get(name, factory):
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def reset():
+    """清除所有已建立的服務（測試用）"""
+    with _lock:
+        _instances.clear()
+
+
+def get_line_bot_api():
+    def create():
+        from linebot import LineBotApi
+        return LineBotApi(Config.LINE_CHANNEL_ACCESS_TOKEN, endpoint=Config.LINE_API_ENDPOINT)
+    return _get('line_bot_api', create)
+
+
+def get_webhook_handler(setup=None):
+    """取得 Webhook 處理器，第一次建立時呼叫 setup(handler) 註冊事件處理函式"""
+    def create():
+        from linebot import WebhookHandler
+        handler = WebhookHandler(Config.LINE_CHANNEL_SECRET)
+        if setup:
+            setup(handler)
+        return handler
+    return _get('webhook_handler', create)
+
+
+def get_db():
+    def create():
+        if Config.DATABASE_URL.startswith(('postgres://', 'postgresql://')):
+            from postgres_database import PostgresDatabase
+            return PostgresDatabase(Config.DATABASE_URL)
+        if Config.DATABASE_SHARDS > 1:
+            from sharded_database import ShardedDatabase
+            return ShardedDatabase()
+        from database import Database
+        return Database()
+    return _get('db', create)
+
+
+def get_user_states():
+    def create():
+        from state_store import UserStateStore
+        return UserStateStore(get_db(), Config.USER_STATE_TTL)
+    return _get('user_states', create)
+
+
+def get_openai_service():
+    def create():
+        from openai_service import OpenAIService
+        return OpenAIService()
+    return _get('openai_service', create)
+
+
+def get_email_service():
+    def create():
+        from email_service import EmailService
+        return EmailService()
+    return _get('email_service', create)
+
+
+def get_expense_service():
+    def create():
+        from expense_service import ExpenseService
+        return ExpenseService(db=get_db())
+    return _get('expense_service', create)
+
+
+def get_vocabulary_service():
+    def create():
+        from vocabulary_service import VocabularyService
+        return VocabularyService(get_db())
+    return _get('vocabulary_service', create)
+
+
+def get_scheduler(max_workers=None):
+    """取得排程器（max_workers 只在第一次建立時生效）"""
+    def create():
+        from scheduler import Scheduler
+        return Scheduler(
+            get_line_bot_api(),
+            max_workers=max_workers,
+            db=get_db(),
+            email_service=get_email_service(),
+            openai_service=get_openai_service(),
+            vocabulary_service=get_vocabulary_service()
+        )
+    return _get('scheduler', create)
@@ -0,0 +1,280 @@
+"""依用戶分片的 SQLite 資料庫
+
+設定 DATABASE_SHARDS=N（N > 1）時由 services.get_db 使用：用戶依 ID 雜湊分到 N 個 SQLite 檔案
+（never_give_up-shard0.db、never_give_up-shard1.db ...）。每個檔案有各自的寫入鎖，
+不同分片的寫入可以同時進行，單機多核心時寫入吞吐量隨分片數增加。
+
+- 用戶相關的方法依 user_id 轉給所屬分片的 Database，SQL 與單一資料庫完全相同
+- 任務記錄、派送狀態與領導者租約留在 DATABASE_PATH（全域資料庫）
+- 排程器的批次查詢（所有用戶、某分鐘需要提醒的用戶、到期單字）逐一查詢各分片後合併
+- 封存與備份對每個資料庫檔案分別執行（db_paths）；各分片的備份不是同一時間點，但用戶之間沒有關聯
+
+由單一資料庫改為分片、或改變分片數時，先停止服務再執行 python -m sharded_database，
+將記錄搬到所屬分片。
+"""
+import argparse
+import glob
+import hashlib
+import logging
+import os
+
+import query_profiler
+from config import Config
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# 以 user_id 區分的表格（其餘表格只使用全域資料庫）
+USER_TABLES = (
+    'users', 'user_preferences', 'daily_goals', 'diaries', 'vocabulary_records', 'vocabulary_words',
+    'expenses', 'expense_categories', 'expense_stats', 'expense_stats_pending', 'expense_budgets',
+    'user_states', 'view_versions',
+)
+
+# 記錄單字 id 的對話狀態：搬移後 id 由分片重新編號，這些狀態不搬移而是清除（用戶重新開始複習即可）
+ID_STATES = ('reviewing_vocabulary',)
+
+
+def shard_index(user_id, count):
+    """將用戶 ID 穩定地雜湊成分片編號"""
+    if user_id is None:
+        return None
+    # 與派送視窗的雜湊分開，同一分片的用戶不會集中在視窗的同一段
+    digest = hashlib.blake2b(user_id.encode('utf-8'), digest_size=8, person=b'shard').digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def shard_path(db_path, index):
+    root, ext = os.path.splitext(db_path)
+    return f"{root}-shard{index}{ext}"
+
+
+def database_paths(db_path=None, shards=None):
+    """全域資料庫與各分片的檔案路徑（未分片時只有 DATABASE_PATH）"""
+    db_path = db_path or Config.DATABASE_PATH
+    count = shards or Config.DATABASE_SHARDS
+    if count < 2:
+        return [db_path]
+    return [db_path] + [shard_path(db_path, index) for index in range(count)]
+
+
+def _route(name):
+    """依第一個參數 user_id 轉給所屬分片"""
+    def method(self, user_id, *args, **kwargs):
+        return getattr(self.shard(user_id), name)(user_id, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(Database, name).__doc__
+    return method
+
+
+def _global(name):
+    """轉給全域資料庫"""
+    def method(self, *args, **kwargs):
+        return getattr(self.global_db, name)(*args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(Database, name).__doc__
+    return method
+
+
+class ShardedDatabase:
+    """與 Database 相同的方法，依用戶轉給各分片"""
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path=None, shards=None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        count = shards or Config.DATABASE_SHARDS
+        self.global_db = Database(self.db_path)
+        self.shards = [Database(shard_path(self.db_path, index)) for index in range(count)]
+
+    @property
+    def db_paths(self):
+        return [self.global_db.db_path] + [shard.db_path for shard in self.shards]
+
+    def shard(self, user_id):
+        return self.shards[shard_index(user_id, len(self.shards))]
+
+    # 用戶相關
+    add_user = _route('add_user')
+    get_user = _route('get_user')
+    get_user_preferences = _route('get_user_preferences')
+    get_user_today = _route('get_user_today')
+    set_user_timezone = _route('set_user_timezone')
+    set_reminder_time = _route('set_reminder_time')
+    save_daily_goals = _route('save_daily_goals')
+    get_daily_goals = _route('get_daily_goals')
+    save_diary = _route('save_diary')
+    get_diary = _route('get_diary')
+    save_vocabulary_record = _route('save_vocabulary_record')
+    update_word_reviews = _route('update_word_reviews')
+    get_vocabulary_progress = _route('get_vocabulary_progress')
+    get_today_summary = _route('get_today_summary')
+    save_expense = _route('save_expense')
+    get_expenses = _route('get_expenses')
+    get_expense_summary = _route('get_expense_summary')
+    save_category = _route('save_category')
+    get_user_categories = _route('get_user_categories')
+    compute_expense_windows = _route('compute_expense_windows')
+    save_expense_stats = _route('save_expense_stats')
+    get_expense_stats = _route('get_expense_stats')
+    is_expense_stats_pending = _route('is_expense_stats_pending')
+    save_budget = _route('save_budget')
+    get_budgets = _route('get_budgets')
+    update_budget_usage = _route('update_budget_usage')
+    search = _route('search')
+    get_user_state = _route('get_user_state')
+    set_user_state = _route('set_user_state')
+    delete_user_state = _route('delete_user_state')
+    get_view_state = _route('get_view_state')
+    bump_view_version = _route('bump_view_version')
+
+    # 全域資料
+    get_default_categories = _global('get_default_categories')
+    acquire_lease = _global('acquire_lease')
+    release_lease = _global('release_lease')
+    start_job_run = _global('start_job_run')
+    add_job_deliveries = _global('add_job_deliveries')
+    get_pending_deliveries = _global('get_pending_deliveries')
+    mark_deliveries = _global('mark_deliveries')
+    finish_job_run = _global('finish_job_run')
+    get_incomplete_job_runs = _global('get_incomplete_job_runs')
+    purge_job_runs = _global('purge_job_runs')
+
+    # 跨分片
+    def get_all_user_ids(self):
+        """取得所有用戶 ID（依分片順序）"""
+        return [user_id for shard in self.shards for user_id in shard.get_all_user_ids()]
+
+    def get_users_for_reminder(self, reminder, minute):
+        """取得指定 UTC 分鐘需要提醒的用戶（各分片的索引查詢）"""
+        return [user_id for shard in self.shards for user_id in shard.get_users_for_reminder(reminder, minute)]
+
+    def refresh_reminder_minutes(self):
+        """依今天的時區偏移重新計算各分片的分桶，回傳更新筆數"""
+        return sum(shard.refresh_reminder_minutes() for shard in self.shards)
+
+    def get_user_dates(self, user_ids):
+        """依分片分組查詢各用戶時區的今天，回傳 {user_id: 日期}"""
+        groups = {}
+        for user_id in user_ids:
+            groups.setdefault(shard_index(user_id, len(self.shards)), []).append(user_id)
+        dates = {}
+        for index, group in groups.items():
+            dates.update(self.shards[index].get_user_dates(group))
+        return dates
+
+    def get_pending_expense_stats(self, marked_before):
+        """取得各分片待重新計算統計的用戶"""
+        return [user_id for shard in self.shards for user_id in shard.get_pending_expense_stats(marked_before)]
+
+    def get_due_words_for_users(self, user_ids, date=None, limit_per_user=20):
+        """依分片分組後各查詢一次，回傳 {user_id: [單字, ...]}"""
+        groups = {}
+        for user_id in user_ids:
+            groups.setdefault(shard_index(user_id, len(self.shards)), []).append(user_id)
+        due = {}
+        for index, group in groups.items():
+            due.update(self.shards[index].get_due_words_for_users(group, date, limit_per_user))
+        return due
+
+
+def rebalance(db_path=None, shards=None, dry_run=False):
+    """將全域資料庫與各分片檔案中不屬於該檔案的用戶記錄搬到所屬分片，回傳 {表格: 筆數}
+
+    搬移時不保留自動編號的 id（各分片各自編號），ID_STATES 的對話狀態會清除，需在服務停止時執行。
+    目標分片已有相同主鍵的記錄（例如同一用戶）時整批回滾並拋出 RuntimeError，不會刪除未搬到分片的記錄。
+    """
+    database = ShardedDatabase(db_path, shards)
+    count = len(database.shards)
+    targets = [shard.db_path for shard in database.shards]
+    # 分片數減少時，編號超過的分片檔案也要搬空
+    sources = [database.db_path] + sorted(
+        set(glob.glob(shard_path(database.db_path, '*'))) | set(targets)
+    )
+
+    moved = {}
+    for source in sources:
+        conn = query_profiler.connect(source, timeout=30, isolation_level=None)
+        conn.create_function('shard_index', 1, lambda user_id: shard_index(user_id, count), deterministic=True)
+        try:
+            for index, target in enumerate(targets):
+                if os.path.abspath(target) == os.path.abspath(source):
+                    continue
+                conn.execute('ATTACH DATABASE ? AS shard', (target,))
+                try:
+                    for table in USER_TABLES:
+                        rows = _move(conn, table, index, dry_run)
+                        if rows:
+                            moved[table] = moved.get(table, 0) + rows
+                            logger.info("%s：%s 筆 %s 搬到分片 %s", source, rows, table, index,
+                                        extra={'table': table, 'rows': rows, 'shard': index})
+                finally:
+                    conn.execute('DETACH DATABASE shard')
+        finally:
+            conn.close()
+    return moved
+
+
+def _move(conn, table, index, dry_run):
+    """在單一交易中複製並刪除屬於分片 index 的記錄"""
+    if not conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+        return 0
+    if dry_run:
+        return conn.execute(
+            f'SELECT COUNT(*) FROM main.{table} WHERE shard_index(user_id) = ?', (index,)
+        ).fetchone()[0]
+
+    # 依欄位名稱複製（舊資料庫的欄位順序可能不同），自動編號的 id 由分片重新產生
+    columns = ', '.join(
+        row[1] for row in conn.execute(f'PRAGMA main.table_info({table})') if row[1] != 'id'
+    )
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if table == 'user_states':
+            conn.execute(f'''
+                DELETE FROM main.user_states
+                WHERE shard_index(user_id) = ? AND json_extract(state, '$.state') IN ({', '.join('?' * len(ID_STATES))})
+            ''', (index, *ID_STATES))
+        inserted = conn.execute(f'''
+            INSERT INTO shard.{table} ({columns})
+            SELECT {columns} FROM main.{table}
+            WHERE shard_index(user_id) = ?
+            ON CONFLICT DO NOTHING
+        ''', (index,)).rowcount
+        deleted = conn.execute(
+            f'DELETE FROM main.{table} WHERE shard_index(user_id) = ?', (index,)
+        ).rowcount
+        if inserted != deleted:
+            # 分片已有相同主鍵的記錄，被略過的記錄若一併刪除就會遺失
+            raise RuntimeError(
+                f"{table} 搬到分片 {index} 寫入 {inserted} 筆與刪除 {deleted} 筆不符，已回滾，"
+                f"請先處理分片中重複的記錄"
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='將用戶記錄搬到所屬分片（請先停止服務）')
+    parser.add_argument('--shards', type=int, default=Config.DATABASE_SHARDS, help='分片數')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要搬移的筆數')
+    args = parser.parse_args()
+    if args.shards < 2:
+        parser.error('分片數至少為 2（DATABASE_SHARDS 或 --shards）')
+
+    from logging_setup import setup_logging, shutdown_logging
+    setup_logging()
+    moved = rebalance(shards=args.shards, dry_run=args.dry_run)
+    label = '需要搬移' if args.dry_run else '已搬移'
+    for table, rows in moved.items():
+        print(f"{table}：{label} {rows:,} 筆")
+    if not moved:
+        print('所有記錄都已在所屬分片')
+    shutdown_logging()
+
+
+if __name__ == '__main__':
+    main()
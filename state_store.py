@@ -0,0 +1,29 @@
+class UserStateStore:
+    """以資料庫保存的用戶對話狀態
+
+    提供與 dict 相同的 in / [] / del 操作，多個網頁程序處理同一位用戶的訊息時能看到相同的狀態。
+    狀態超過 ttl 秒未更新即視為過期。修改取回的狀態後需重新指定（store[user_id] = state）才會保存。
+    """
+
+    def __init__(self, db, ttl=None):
+        self.db = db
+        self.ttl = ttl
+
+    def get(self, user_id, default=None):
+        state = self.db.get_user_state(user_id, self.ttl)
+        return default if state is None else state
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id):
+        state = self.get(user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __setitem__(self, user_id, state):
+        self.db.set_user_state(user_id, state)
+
+    def __delitem__(self, user_id):
+        self.db.delete_user_state(user_id)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# 專案模組位於上一層（平面結構），直接執行 pytest 時也能匯入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    """暫存目錄中的 SQLite 資料庫"""
+    return Database(str(tmp_path / 'test.db'))
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_has_no_side_effects():
+    # 在新的直譯器中匯入，不受其他測試已設定的日誌與服務影響
+    code = '\n'.join([
+        'import logging, app, logging_setup, services',
+        'assert logging_setup._listener is None',
+        'assert logging.getLogger().handlers == []',
+        'assert services._instances == {}',
+        "assert not hasattr(app, 'app')",
+    ])
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+
+class Replies:
+    """記錄回覆內容的 LINE API"""
+
+    def __init__(self):
+        self.texts = []
+
+    def reply_message(self, reply_token, message):
+        self.texts.append(message.text)
+
+
+def test_help_shows_users_reminder_times(db, monkeypatch):
+    import app
+
+    replies = Replies()
+    monkeypatch.setattr(app, 'db', db)
+    monkeypatch.setattr(app, 'line_bot_api', replies)
+    db.add_user('u1', 'A')
+    db.set_user_timezone('u1', 'Asia/Tokyo')
+    db.set_reminder_time('u1', 'morning', '07:30')
+
+    app.handle_help(type('Event', (), {'reply_token': 'token'}), 'u1')
+    assert 'Asia/Tokyo 當地時間' in replies.texts[0]
+    assert '早上 07:30 - 目標提醒' in replies.texts[0]
+    assert '8:00' not in replies.texts[0]
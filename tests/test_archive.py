@@ -0,0 +1,76 @@
+import os
+import sqlite3
+
+import pytest
+
+from archive import Archiver
+
+OLD = '2000-03-01'
+RECENT = '2099-01-01'
+
+
+@pytest.fixture
+def archiver(db, tmp_path):
+    return Archiver(db.db_path, archive_dir=str(tmp_path / 'archive'), batch_size=2)
+
+
+def expense_ids(path, table='expenses'):
+    conn = sqlite3.connect(path)
+    rows = [row[0] for row in conn.execute(f'SELECT id FROM {table} ORDER BY id')]
+    conn.close()
+    return rows
+
+
+def test_moves_old_records_to_yearly_archive(db, archiver):
+    db.add_user('u1', 'A')
+    for amount in (100, 200, 300):
+        db.save_expense('u1', amount, '餐飲', '午餐', OLD)
+    db.save_expense('u1', 400, '餐飲', '晚餐', RECENT)
+
+    assert archiver.run() == {'2000': {'expenses': 3}}
+    assert expense_ids(archiver.archive_path('2000')) == [1, 2, 3]
+    assert expense_ids(db.db_path) == [4]
+    # 重新執行沒有待封存的記錄
+    assert archiver.run() == {}
+
+
+def test_conflicting_archive_rows_roll_back_batch(db, archiver):
+    db.add_user('u1', 'A')
+    for amount in (100, 200, 300):
+        db.save_expense('u1', amount, '餐飲', '午餐', OLD)
+    # 封存資料庫已有 id 2 的另一筆記錄，INSERT OR IGNORE 會略過主資料庫的 id 2
+    os.makedirs(archiver.archive_dir)
+    conn = archiver._connect()
+    conn.execute('ATTACH DATABASE ? AS archive', (archiver.archive_path('2000'),))
+    archiver._ensure_table(conn, 'expenses')
+    conn.execute('INSERT INTO archive.expenses SELECT * FROM expenses WHERE id = 2')
+    conn.execute('UPDATE archive.expenses SET amount = 999')
+    conn.close()
+
+    with pytest.raises(RuntimeError):
+        archiver.run()
+    assert expense_ids(db.db_path) == [1, 2, 3]
+    assert expense_ids(archiver.archive_path('2000')) == [2]
+
+
+def test_compact_does_not_convert_database(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE notes (body TEXT)')
+    conn.executemany('INSERT INTO notes VALUES (?)', [('x' * 1000,)] * 200)
+    conn.execute('DELETE FROM notes')
+    conn.commit()
+    conn.close()
+    archiver = Archiver(path, archive_dir=str(tmp_path / 'archive'))
+
+    # 每天的封存不執行會阻擋寫入的完整 VACUUM
+    assert archiver.compact() == 0
+    conn = archiver._connect()
+    assert not archiver.incremental_vacuum_enabled(conn)
+    conn.close()
+
+    assert archiver.enable_incremental_vacuum()
+    assert not archiver.enable_incremental_vacuum()
+    conn = archiver._connect()
+    assert archiver.incremental_vacuum_enabled(conn)
+    conn.close()
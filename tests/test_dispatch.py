@@ -0,0 +1,143 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from config import Config
+from dispatch import dispatch_offset, RatePacer
+from reminders import to_utc_minute
+from scheduler import Scheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WINDOW = 600
+
+
+def test_offsets_are_stable_and_inside_window():
+    users = [f"U{number:032x}" for number in range(1000)]
+    offsets = [dispatch_offset(user_id, WINDOW) for user_id in users]
+    assert offsets == [dispatch_offset(user_id, WINDOW) for user_id in users]
+    assert all(0 <= offset < WINDOW for offset in offsets)
+    # 雜湊分散到整個視窗，而不是集中在開頭
+    assert len(set(offsets)) > WINDOW // 2
+    assert dispatch_offset(users[0], 0) == 0
+
+
+def test_offsets_do_not_depend_on_process():
+    # 與內建 hash() 不同，重新啟動（不同 PYTHONHASHSEED）後偏移不變
+    code = f"from dispatch import dispatch_offset; print(dispatch_offset('U1234', {WINDOW}))"
+    output = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+        env={**os.environ, 'PYTHONHASHSEED': '123'}, cwd=ROOT,
+    ).stdout
+    assert int(output) == dispatch_offset('U1234', WINDOW)
+
+
+class FakeTime:
+    """time.monotonic 與 time.sleep：sleep 直接推進時間"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(time, 'sleep', fake.sleep)
+    return fake
+
+
+def test_pacer_limits_rate(fake_time):
+    pacer = RatePacer(rate=10)
+    started = fake_time.now
+    for _ in range(21):
+        assert pacer.acquire()
+    # 第一個立即處理，之後每 0.1 秒一個
+    assert fake_time.now - started == pytest.approx(2.0)
+    assert fake_time.slept == pytest.approx([0.1] * 20)
+
+
+def test_pacer_does_not_save_up_idle_time(fake_time):
+    pacer = RatePacer(rate=10)
+    pacer.acquire()
+    fake_time.now += 60
+    pacer.acquire()
+    pacer.acquire()
+    assert fake_time.slept == pytest.approx([0.1])
+
+
+def test_pacer_unlimited_and_stop(fake_time):
+    unlimited = RatePacer(rate=0)
+    assert all(unlimited.acquire() for _ in range(100))
+    assert fake_time.slept == []
+
+    pacer = RatePacer(rate=1)
+    stop = threading.Event()
+    stop.set()
+    assert pacer.acquire(stop)
+    # 需要等待時，已設定的停止事件讓 acquire 立即回傳 False
+    assert not pacer.acquire(stop)
+
+
+class RecordingTimers:
+    def __init__(self):
+        self.scheduled = []
+        self.submitted = []
+
+    def schedule_at(self, when, func, users, run_key, name=None):
+        self.scheduled.append((when, sorted(users), run_key, name))
+
+    def submit(self, func, users, run_key, name=None):
+        self.submitted.append((sorted(users), run_key, name))
+
+
+@pytest.fixture
+def scheduler(db):
+    scheduler = Scheduler(None, db=db, email_service=object(), openai_service=object())
+    scheduler.timers = RecordingTimers()
+    return scheduler
+
+
+def bucket_minute(db, users):
+    for user_id in users:
+        db.add_user(user_id, user_id)
+    minute = to_utc_minute(Config.MORNING_TIME, Config.DEFAULT_TIMEZONE)
+    return 20_000 * 1440 + minute
+
+
+def test_dispatch_bucket_spreads_users_over_window(db, scheduler):
+    users = [f"U{number}" for number in range(50)]
+    epoch_minute = bucket_minute(db, users)
+    scheduler.window_seconds = WINDOW
+    scheduler._dispatch_bucket(epoch_minute)
+
+    start = epoch_minute * 60
+    morning = [job for job in scheduler.timers.scheduled if job[3] == 'morning_task']
+    assert sorted(user for _, batch, _, _ in morning for user in batch) == sorted(users)
+    for when, batch, run_key, _ in morning:
+        # 同一秒的用戶合併成一批，run_key 為該批的預定時間
+        assert run_key == str(when)
+        assert all(when == start + dispatch_offset(user_id, WINDOW) for user_id in batch)
+    assert len(morning) > 1
+    assert scheduler.timers.submitted == []
+
+
+def test_dispatch_bucket_without_window_submits_once(db, scheduler):
+    users = ['U1', 'U2', 'U3']
+    epoch_minute = bucket_minute(db, users)
+    scheduler.window_seconds = 0
+    scheduler._dispatch_bucket(epoch_minute)
+
+    assert (users, str(epoch_minute * 60), 'morning_task') in scheduler.timers.submitted
+    assert scheduler.timers.scheduled == []
@@ -0,0 +1,65 @@
+import pytest
+
+from expense_parser import ExpenseParser
+
+CATEGORIES = ['飲食', '交通', '購物', '娛樂', '醫療', '教育', '居住', '通訊', '其他', '寵物用品']
+
+
+@pytest.fixture
+def parser():
+    return ExpenseParser()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('100 飲食 午餐', [(100.0, '飲食', '午餐')]),
+    ('飲食 100 午餐', [(100.0, '飲食', '午餐')]),
+    ('50 交通', [(50.0, '交通', None)]),
+    ('午餐 120元', [(120.0, '飲食', '午餐')]),
+    ('早餐 45 元', [(45.0, '飲食', '早餐')]),
+    ('$1,200 購物 外套', [(1200.0, '購物', '外套')]),
+    ('NT$80 交通', [(80.0, '交通', None)]),
+    ('NTD 35 公車', [(35.0, '交通', '公車')]),
+    ('房租 12,000', [(12000.0, '居住', '房租')]),
+    ('娛樂 350.5 電影', [(350.5, '娛樂', '電影')]),
+    ('１５０ 飲食 便當', [(150.0, '飲食', '便當')]),
+    ('計程車 280塊', [(280.0, '交通', '計程車')]),
+    ('早餐 50 午餐 120', [(50.0, '飲食', '早餐'), (120.0, '飲食', '午餐')]),
+    ('120 午餐 50 飲料', [(120.0, '飲食', '午餐'), (50.0, '飲食', '飲料')]),
+    ('早餐 50，午餐 120', [(50.0, '飲食', '早餐'), (120.0, '飲食', '午餐')]),
+])
+def test_parse(parser, text, expected):
+    assert parser.parse(text, CATEGORIES) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    # 描述中的數字不是另一筆金額
+    ('100 飲食 7-11', [(100.0, '飲食', '7-11')]),
+    ('150 飲食 麥當勞2號餐', [(150.0, '飲食', '麥當勞2號餐')]),
+    ('100 其他 iPhone15', [(100.0, '其他', 'iPhone15')]),
+])
+def test_digits_inside_words_stay_in_description(parser, text, expected):
+    assert parser.parse(text, CATEGORIES) == expected
+
+
+@pytest.mark.parametrize('text', ['1,2 飲食', '100.5.3 飲食', '今天好累', '記帳', '飲食 午餐', 'abc def', ''])
+def test_rejects_input_without_standalone_amount(parser, text):
+    assert parser.parse(text, CATEGORIES) == []
+
+
+def test_unknown_category_falls_back_to_first_word(parser):
+    assert parser.parse('300 寵物 飼料', ['飲食']) == [(300.0, '寵物', '飼料')]
+
+
+def test_tokenize(parser):
+    assert parser.tokenize('NT$80 交通 7-11') == [('amount', 80.0), ('word', '交通'), ('word', '7-11')]
+
+
+@pytest.mark.parametrize('text, expected', [
+    # 負數與只有金額的輸入仍回傳，由記帳檢查回覆具體的錯誤
+    ('-50 飲食', [(-50.0, '飲食', None)]),
+    ('0 飲食', [(0.0, '飲食', None)]),
+    ('$1,200', [(1200.0, None, None)]),
+    ('早餐 -50 午餐 120', [(-50.0, '飲食', '早餐'), (120.0, '飲食', '午餐')]),
+])
+def test_invalid_amounts_are_parsed_for_validation(parser, text, expected):
+    assert parser.parse(text, CATEGORIES) == expected
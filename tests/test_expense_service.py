@@ -0,0 +1,84 @@
+import pytest
+
+from expense_service import ExpenseService
+from expense_stats import ExpenseStatsService
+
+
+@pytest.fixture
+def service(db):
+    db.add_user('u1', 'A')
+    return ExpenseService(db=db)
+
+
+def record(service, text):
+    return service.add_expenses('u1', service.parse_expense_items(text, 'u1'))
+
+
+@pytest.mark.parametrize('text, message', [
+    ('-50 飲食', '金額必須大於0'),
+    ('0 飲食', '金額必須大於0'),
+    ('$1,200', '請在金額前後輸入分類，例如：100 飲食 午餐'),
+])
+def test_rejects_invalid_amount_with_specific_message(service, text, message):
+    assert record(service, text) == (False, message)
+    assert service.get_today_expenses('u1') == []
+
+
+def test_multiple_items_saved_together(service):
+    assert record(service, '早餐 50 午餐 120') == (True, '已記錄 2 筆支出！')
+    assert sorted(expense.amount for expense in service.get_today_expenses('u1')) == [50.0, 120.0]
+
+
+def test_invalid_item_saves_nothing(service):
+    success, message = record(service, '早餐 50 午餐 -120')
+    assert not success
+    assert message == '第 2 筆：金額必須大於0，所有項目都未記錄'
+    assert service.get_today_expenses('u1') == []
+
+
+def test_failure_while_saving_reports_saved_items(service, monkeypatch):
+    save_expense = service.db.save_expense
+    calls = []
+
+    def fail_second(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError('database is locked')
+        return save_expense(*args)
+
+    monkeypatch.setattr(service.db, 'save_expense', fail_second)
+    success, message = record(service, '早餐 50 午餐 120 飲料 30')
+    assert not success
+    assert message == '已記錄前 1 筆，第 2 筆起記帳失敗：database is locked'
+    assert [expense.amount for expense in service.get_today_expenses('u1')] == [50.0]
+
+
+class RecordingLineBotApi:
+    def __init__(self):
+        self.pushed = []
+
+    def push_message(self, user_id, message):
+        self.pushed.append((user_id, message.text))
+
+
+def test_reads_do_not_update_budgets_or_send_alerts(service):
+    service.set_budget('u1', '飲食', 100)
+    record(service, '午餐 90')
+
+    assert service.get_expense_summary('u1', 7)['total'] == 90
+    assert [budget['spent'] for budget in service.get_budgets('u1')] == [90]
+    # 讀取不寫入預算使用狀況，也不清除待計算標記
+    stored = service.db.get_budgets('u1')[0]
+    assert (stored['spent'], stored['alert_level']) == (0, 0)
+    assert service.db.is_expense_stats_pending('u1')
+
+    # 預算提醒只由排程器的統計任務推播
+    line_bot_api = RecordingLineBotApi()
+    stats = ExpenseStatsService(service.db, line_bot_api)
+    stats.debounce = 0
+    assert stats.refresh_pending() == 1
+    assert [user_id for user_id, _ in line_bot_api.pushed] == ['u1']
+    stored = service.db.get_budgets('u1')[0]
+    assert (stored['spent'], stored['alert_level']) == (90, 0.8)
+    assert not service.db.is_expense_stats_pending('u1')
+    assert stats.refresh_pending() == 0
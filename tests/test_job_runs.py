@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler(db):
+    return Scheduler(None, db=db, email_service=object(), openai_service=object())
+
+
+def delivery_status(db, run_id):
+    conn = db._connect()
+    rows = conn.execute('''
+        SELECT user_id, status, attempts, error FROM job_deliveries WHERE run_id = ? ORDER BY user_id
+    ''', (run_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def test_process_job_records_results(db, scheduler):
+    def deliver(user_id, context):
+        if user_id == 'u2':
+            return False
+        if user_id == 'u3':
+            raise RuntimeError('LINE 逾時')
+
+    scheduler._process_job('morning_task', ['u1', 'u2', 'u3'], 'k1', deliver, None, None)
+
+    run_id, created = db.start_job_run('morning_task', 'k1')
+    assert not created
+    assert delivery_status(db, run_id) == [
+        ('u1', 'done', 1, None),
+        ('u2', 'skipped', 1, None),
+        ('u3', 'failed', 1, 'LINE 逾時'),
+    ]
+    # 重新執行只重試失敗的用戶
+    assert db.get_pending_deliveries(run_id, 3) == ['u3']
+
+
+def test_interrupted_job_keeps_finished_results(db, scheduler):
+    delivered = []
+
+    def deliver(user_id, context):
+        delivered.append(user_id)
+        if len(delivered) == 2:
+            scheduler._stop_event.set()
+
+    scheduler._process_job('evening_task', ['u1', 'u2', 'u3'], 'k1', deliver, None, None)
+
+    run_id, _ = db.start_job_run('evening_task', 'k1')
+    assert db.get_pending_deliveries(run_id, 3) == ['u3']
+
+
+def test_revoked_leader_records_results_before_releasing_lease(db, scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler, 'resume_incomplete_runs', lambda: None)
+    leader = scheduler.leader_election()
+    leader.poll()
+    assert scheduler.running
+
+    started, release = threading.Event(), threading.Event()
+
+    def deliver(user_id, context):
+        started.set()
+        release.wait(5)
+
+    scheduler.timers.submit(scheduler._process_job, 'morning_task', ['u1', 'u2', 'u3'], 'k1',
+                            deliver, None, None)
+    assert started.wait(5)
+
+    released = []
+    release_lease = db.release_lease
+
+    def record_release(name, holder):
+        run_id, _ = db.start_job_run('morning_task', 'k1')
+        released.append(db.get_pending_deliveries(run_id, 3))
+        release_lease(name, holder)
+
+    monkeypatch.setattr(db, 'release_lease', record_release)
+    stopping = threading.Thread(target=leader.stop)
+    stopping.start()
+    time.sleep(0.1)
+    # 執行中的任務寫入結果之前不會釋放租約
+    assert released == []
+    release.set()
+    stopping.join(5)
+
+    # 新的領導者續跑時不會再發送給 u1
+    assert released == [['u2', 'u3']]
+    assert not scheduler.running
+
+
+def test_pace_waits_while_lease_is_expiring(scheduler):
+    holding = threading.Event()
+    scheduler.lease_check = holding.is_set
+    results = []
+    pacing = threading.Thread(target=lambda: results.append(scheduler._pace()))
+    pacing.start()
+    time.sleep(0.1)
+    assert results == []
+
+    # 續約恢復後繼續發送
+    holding.set()
+    pacing.join(5)
+    assert results == [True]
+
+    # 失去領導權時由 stop() 結束等待
+    holding.clear()
+    pacing = threading.Thread(target=lambda: results.append(scheduler._pace()))
+    pacing.start()
+    time.sleep(0.1)
+    scheduler._stop_event.set()
+    pacing.join(5)
+    assert results == [True, False]
+
+
+def test_purge_job_runs(db):
+    old_run, _ = db.start_job_run('morning_task', 'old')
+    db.add_job_deliveries(old_run, ['u1', 'u2'])
+    db.finish_job_run(old_run)
+    running, _ = db.start_job_run('morning_task', 'running')
+    db.add_job_deliveries(running, ['u1'])
+    recent, _ = db.start_job_run('morning_task', 'recent')
+    db.finish_job_run(recent)
+
+    conn = db._connect()
+    conn.execute('''
+        UPDATE job_runs SET started_at = '2000-01-01 00:00:00', finished_at = '2000-01-01 00:00:00'
+        WHERE run_id = ?
+    ''', (old_run,))
+    conn.execute("UPDATE job_runs SET started_at = '2000-01-01 00:00:00' WHERE run_id = ?", (running,))
+    conn.commit()
+    conn.close()
+
+    assert db.purge_job_runs(14) == 1
+    assert delivery_status(db, old_run) == []
+    assert [row[0] for row in delivery_status(db, running)] == ['u1']
+    assert db.start_job_run('morning_task', 'recent') == (recent, False)
+
+
+def test_default_run_key_is_utc_minute(db, scheduler, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 1_700_000_059.5)
+    scheduler._run_job('morning_task', ['u1'], None, lambda user_id, context: None)
+
+    assert db.start_job_run('morning_task', '1700000040')[1] is False
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from leader import LeaderElection
+
+LEASE = 30
+
+
+class Clock:
+    """可手動推進的 time.time"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+def elector(db, events, label):
+    return LeaderElection(
+        db, 'scheduler', LEASE,
+        on_elected=lambda: events.append((label, 'elected')),
+        on_revoked=lambda: events.append((label, 'revoked')),
+    )
+
+
+def test_single_leader_until_lease_expires(db, clock):
+    events = []
+    a, b = elector(db, events, 'a'), elector(db, events, 'b')
+
+    a.poll()
+    b.poll()
+    assert (a.is_leader, b.is_leader) == (True, False)
+
+    # 領導者在租約內續約，其他程序無法接手
+    clock.advance(LEASE - 1)
+    a.poll()
+    clock.advance(LEASE - 1)
+    b.poll()
+    assert (a.is_leader, b.is_leader) == (True, False)
+
+    # 領導者停止續約，租約過期後由 b 接手，a 下次嘗試時得知失去領導權
+    clock.advance(2)
+    b.poll()
+    a.poll()
+    assert (a.is_leader, b.is_leader) == (False, True)
+    assert events == [('a', 'elected'), ('b', 'elected'), ('a', 'revoked')]
+
+
+def test_stop_releases_lease_immediately(db, clock):
+    events = []
+    a, b = elector(db, events, 'a'), elector(db, events, 'b')
+
+    a.poll()
+    a.stop()
+    b.poll()
+    assert (a.is_leader, b.is_leader) == (False, True)
+    assert events == [('a', 'elected'), ('a', 'revoked'), ('b', 'elected')]
+
+
+def test_keeps_leadership_through_errors_until_lease_ends(db, clock, monkeypatch):
+    events = []
+    a = elector(db, events, 'a')
+    a.poll()
+
+    def unavailable(*args):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(db, 'acquire_lease', unavailable)
+    clock.advance(LEASE - 1)
+    a.poll()
+    assert a.is_leader
+
+    clock.advance(2)
+    a.poll()
+    assert not a.is_leader
+    assert events == [('a', 'elected'), ('a', 'revoked')]
+
+
+def test_holds_lease_until_margin_before_expiry(db, clock, monkeypatch):
+    a = elector(db, [], 'a')
+    assert not a.holds_lease()
+    a.poll()
+    assert a.holds_lease(LEASE / 3)
+
+    def unavailable(*args):
+        raise RuntimeError('database is locked')
+
+    # 續約失敗期間仍是領導者，但剩不到 margin 秒時不再視為持有租約
+    monkeypatch.setattr(db, 'acquire_lease', unavailable)
+    clock.advance(LEASE - 5)
+    a.poll()
+    assert a.is_leader
+    assert a.holds_lease()
+    assert not a.holds_lease(LEASE / 3)
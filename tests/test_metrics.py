@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+from config import Config
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    """啟用指標並使用空的註冊表與暫存的共用目錄（不啟動背景寫出執行緒）"""
+    monkeypatch.setattr(metrics, 'enabled', True)
+    monkeypatch.setattr(metrics, '_registry', {})
+    monkeypatch.setattr(metrics, '_directory', str(tmp_path))
+    monkeypatch.setattr(metrics, '_process_file', None)
+    monkeypatch.setattr(metrics, '_retired', False)
+    monkeypatch.setattr(metrics, '_start_flusher', lambda: None)
+    return tmp_path
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def other_process(directory, pid, requests, seconds):
+    """寫出另一個程序的指標檔案"""
+    data = {
+        'webhook_requests_total': {
+            'type': 'counter', 'help': '', 'labelnames': ['status'], 'buckets': [],
+            'samples': {'ok': requests},
+        },
+        'job_seconds': {
+            'type': 'histogram', 'help': '', 'labelnames': [], 'buckets': [1.0, 5.0],
+            'samples': {'': [[1, 0], seconds, 1]},
+        },
+    }
+    with open(os.path.join(directory, f'{pid}-test.json'), 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+
+
+def record():
+    metrics.counter('webhook_requests_total', '', ['status']).labels(status='ok').inc(2)
+    metrics.histogram('job_seconds', '', buckets=(1.0, 5.0)).observe(3.0)
+
+
+def test_render_sums_all_processes(registry):
+    record()
+    other_process(registry, os.getpid(), 5, 0.5)
+
+    text = metrics.render()
+    assert 'webhook_requests_total{status="ok"} 7' in text
+    assert 'job_seconds_bucket{le="1"} 1' in text
+    assert 'job_seconds_bucket{le="5"} 2' in text
+    assert 'job_seconds_count 2' in text
+    assert 'job_seconds_sum 3.500000' in text
+
+
+def test_dead_processes_are_retired_and_still_counted(registry):
+    record()
+    other_process(registry, dead_pid(), 5, 0.5)
+
+    assert 'webhook_requests_total{status="ok"} 7' in metrics.render()
+    assert sorted(os.listdir(registry)) == ['retired.json', 'retired.lock']
+    assert 'webhook_requests_total{status="ok"} 7' in metrics.render()
+
+
+def test_retire_keeps_counters_after_exit(registry):
+    record()
+    metrics.retire()
+    # worker_exit 與 atexit 都會呼叫，只能計入一次
+    metrics.retire()
+    metrics._registry.clear()
+
+    assert 'webhook_requests_total{status="ok"} 2' in metrics.render()
+
+
+def test_metrics_endpoint_requires_token(registry, monkeypatch):
+    monkeypatch.setattr(Config, 'METRICS_TOKEN', 'secret')
+    from app import create_app
+
+    client = create_app().test_client()
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_metrics_endpoint_disabled_without_token(registry, monkeypatch):
+    monkeypatch.setattr(Config, 'METRICS_TOKEN', '')
+    monkeypatch.setattr(Config, 'ADMIN_TOKEN', None)
+    from app import create_app
+
+    assert create_app().test_client().get('/metrics').status_code == 404
+
+
+def test_commands_timed_once_in_dispatch(registry, monkeypatch):
+    import app
+
+    seconds = metrics.histogram('line_command_seconds', '', ['command'])
+    errors = metrics.counter('line_command_errors_total', '', ['command'])
+    monkeypatch.setattr(app, 'COMMAND_SECONDS', seconds)
+    monkeypatch.setattr(app, 'COMMAND_ERRORS', errors)
+
+    app._run_command('help', lambda: None)
+    with pytest.raises(RuntimeError):
+        app._run_command('search', lambda: (_ for _ in ()).throw(RuntimeError()))
+
+    text = metrics.render()
+    assert 'line_command_seconds_count{command="help"} 1' in text
+    assert 'line_command_seconds_count{command="search"} 1' in text
+    assert 'line_command_errors_total{command="search"} 1' in text
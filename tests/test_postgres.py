@@ -0,0 +1,92 @@
+"""PostgreSQL 後端的冒煙測試：設定 DATABASE_URL 指向可寫入的測試資料庫時執行，否則略過"""
+import datetime
+import os
+import uuid
+
+import pytest
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+pytestmark = pytest.mark.skipif(
+    not DATABASE_URL.startswith(('postgres://', 'postgresql://')),
+    reason='需要 DATABASE_URL=postgresql://...',
+)
+
+
+@pytest.fixture
+def pg():
+    pytest.importorskip('psycopg2')
+    from postgres_database import PostgresDatabase
+    return PostgresDatabase(DATABASE_URL)
+
+
+@pytest.fixture
+def user_id(pg):
+    """每次測試使用新的用戶，不需要清空共用的資料庫"""
+    user_id = f"test-{uuid.uuid4().hex}"
+    pg.add_user(user_id, '測試')
+    return user_id
+
+
+def test_schema_is_idempotent(pg):
+    pg.init_database()
+    pg.init_database()
+
+
+def test_user_dates_and_expenses(pg, user_id):
+    pg.set_user_timezone(user_id, 'Asia/Tokyo')
+    today = pg.get_user_today(user_id)
+    assert today == pg.get_user_dates([user_id])[user_id]
+
+    pg.save_expense(user_id, 120.5, '餐飲', '午餐')
+    pg.save_expense(user_id, 80, '交通', '公車', today)
+    expenses = pg.get_expenses(user_id)
+    assert sorted(expense.amount for expense in expenses) == [80.0, 120.5]
+    assert {str(expense.date) for expense in expenses} == {today.isoformat()}
+    assert pg.is_expense_stats_pending(user_id)
+
+
+def test_vocabulary_review_schedule(pg, user_id):
+    pg.save_vocabulary_record(user_id, 'apple, banana')
+    tomorrow = pg.get_user_today(user_id) + datetime.timedelta(days=1)
+
+    due = pg.get_due_words_for_users([user_id], tomorrow)[user_id]
+    assert sorted(word['word'] for word in due) == ['apple', 'banana']
+    assert all(word['interval'] == 0 for word in due)
+
+    # interval 是 PostgreSQL 的保留字，SELECT 與 UPDATE 都需要加上引號
+    pg.update_word_reviews(user_id, [{
+        'id': due[0]['id'], 'repetitions': 1, 'interval': 6, 'ease': 2.6,
+        'due_date': tomorrow + datetime.timedelta(days=6), 'last_reviewed': tomorrow,
+    }])
+    due = pg.get_due_words_for_users([user_id], tomorrow)[user_id]
+    assert len(due) == 1
+
+
+def test_search_and_view_state(pg, user_id):
+    pg.save_diary(user_id, '今天去爬山，風景很漂亮')
+    assert len(pg.search(user_id, '爬山')) == 1
+    assert pg.search(user_id, '游泳') == []
+
+    version, _ = pg.get_view_state(user_id)
+    pg.bump_view_version(user_id)
+    assert pg.get_view_state(user_id)[0] == version + 1
+
+
+def test_lease_and_job_deliveries(pg, user_id):
+    name = f"lease-{uuid.uuid4().hex}"
+    assert pg.acquire_lease(name, 'a', 30)
+    assert not pg.acquire_lease(name, 'b', 30)
+    pg.release_lease(name, 'a')
+    assert pg.acquire_lease(name, 'b', 30)
+
+    run_id, created = pg.start_job_run('smoke_test', user_id)
+    assert created
+    users = [f"{user_id}-{index}" for index in (3, 1, 2)]
+    pg.add_job_deliveries(run_id, users)
+    # 依加入順序處理
+    assert pg.get_pending_deliveries(run_id, 3) == users
+    pg.mark_deliveries(run_id, [(users[0], 'done', None), (users[1], 'failed', '逾時')])
+    assert pg.get_pending_deliveries(run_id, 3) == users[1:]
+    pg.finish_job_run(run_id)
+    assert pg.start_job_run('smoke_test', user_id) == (run_id, False)
@@ -0,0 +1,122 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import database
+from config import Config
+from reminders import to_utc_minute, local_today
+
+WINTER = datetime.date(2026, 1, 15)
+SUMMER = datetime.date(2026, 7, 15)
+
+
+@pytest.mark.parametrize('local_time, timezone, date, minute', [
+    ('08:00', 'Asia/Taipei', WINTER, 0),
+    ('08:00', 'UTC', WINTER, 8 * 60),
+    ('07:30', 'Asia/Tokyo', WINTER, 22 * 60 + 30),
+    ('08:00', 'Asia/Kolkata', WINTER, 2 * 60 + 30),
+    # 日光節約時間：同一當地時間在冬夏落在不同的 UTC 分鐘
+    ('08:00', 'America/New_York', WINTER, 13 * 60),
+    ('08:00', 'America/New_York', SUMMER, 12 * 60),
+    ('08:00', 'Europe/London', SUMMER, 7 * 60),
+])
+def test_to_utc_minute(local_time, timezone, date, minute):
+    assert to_utc_minute(local_time, timezone, date) == minute
+
+
+def test_local_today_uses_timezone():
+    for timezone in ('Pacific/Kiritimati', 'Pacific/Pago_Pago'):
+        assert local_today(timezone) == datetime.datetime.now(ZoneInfo(timezone)).date()
+    assert local_today() == local_today(Config.DEFAULT_TIMEZONE)
+
+
+def bucket(timezone, local_time):
+    return to_utc_minute(local_time, timezone)
+
+
+def test_users_bucketed_by_timezone(db):
+    db.add_user('taipei', 'A')
+    db.add_user('tokyo', 'B')
+    db.add_user('new_york', 'C')
+    db.set_user_timezone('tokyo', 'Asia/Tokyo')
+    db.set_user_timezone('new_york', 'America/New_York')
+
+    taipei = bucket(Config.DEFAULT_TIMEZONE, Config.MORNING_TIME)
+    tokyo = bucket('Asia/Tokyo', Config.MORNING_TIME)
+    new_york = bucket('America/New_York', Config.MORNING_TIME)
+    assert len({taipei, tokyo, new_york}) == 3
+    assert db.get_users_for_reminder('morning', taipei) == ['taipei']
+    assert db.get_users_for_reminder('morning', tokyo) == ['tokyo']
+    assert db.get_users_for_reminder('morning', new_york) == ['new_york']
+
+
+def test_reminder_time_moves_bucket(db):
+    db.add_user('u1', 'A')
+    db.set_user_timezone('u1', 'Asia/Tokyo')
+    db.set_reminder_time('u1', 'vocabulary', '07:30')
+
+    assert db.get_users_for_reminder('vocabulary', bucket('Asia/Tokyo', '07:30')) == ['u1']
+    assert db.get_users_for_reminder('vocabulary', bucket('Asia/Tokyo', Config.VOCABULARY_TIME)) == []
+
+
+def test_refresh_reminder_minutes_fixes_stale_buckets(db):
+    db.add_user('u1', 'A')
+    db.set_user_timezone('u1', 'America/New_York')
+    # 模擬日光節約時間切換前計算的分桶
+    conn = db._connect()
+    conn.execute('UPDATE user_preferences SET morning_minute = morning_minute + 60')
+    conn.commit()
+    conn.close()
+
+    assert db.refresh_reminder_minutes() == 1
+    assert db.get_users_for_reminder('morning', bucket('America/New_York', Config.MORNING_TIME)) == ['u1']
+
+
+def test_dates_follow_user_timezone(db):
+    db.add_user('east', 'A')
+    db.add_user('west', 'B')
+    db.set_user_timezone('east', 'Pacific/Kiritimati')
+    db.set_user_timezone('west', 'Pacific/Pago_Pago')
+    east, west = local_today('Pacific/Kiritimati'), local_today('Pacific/Pago_Pago')
+    # UTC+14 與 UTC-11 永遠相差一天
+    assert east - west == datetime.timedelta(days=1)
+
+    assert db.get_user_dates(['east', 'west', 'missing']) == {
+        'east': east, 'west': west, 'missing': local_today()
+    }
+    db.save_diary('east', '日記')
+    assert db.get_today_summary('east')['diary'] == '日記'
+    assert db.get_diary('east', east) is not None
+    assert db.get_diary('east', west) is None
+
+
+def test_due_words_use_each_users_date(db):
+    db.add_user('east', 'A')
+    db.add_user('west', 'B')
+    db.set_user_timezone('east', 'Pacific/Kiritimati')
+    db.set_user_timezone('west', 'Pacific/Pago_Pago')
+    db.save_vocabulary_record('east', 'apple')
+    db.save_vocabulary_record('west', 'apple')
+    # 新單字隔天到期；讓兩位用戶的單字都在東邊用戶的今天到期
+    conn = db._connect()
+    conn.execute('UPDATE vocabulary_words SET due_date = ?', (local_today('Pacific/Kiritimati'),))
+    conn.commit()
+    conn.close()
+
+    due = db.get_due_words_for_users(['east', 'west'])
+    assert list(due) == ['east']
+
+
+def test_due_words_limited_per_user_in_query(db, monkeypatch):
+    # 每個語句只合併一位用戶，同時檢查分段查詢
+    monkeypatch.setattr(database, 'DUE_WORDS_USERS_PER_QUERY', 1)
+    db.add_user('busy', 'A')
+    db.add_user('light', 'B')
+    db.save_vocabulary_record('busy', ', '.join(f'word{number}' for number in range(30)))
+    db.save_vocabulary_record('light', 'apple')
+    tomorrow = local_today() + datetime.timedelta(days=1)
+
+    due = db.get_due_words_for_users(['busy', 'light'], tomorrow, limit_per_user=5)
+    assert [word['word'] for word in due['busy']] == [f'word{number}' for number in range(5)]
+    assert [word['word'] for word in due['light']] == ['apple']
@@ -0,0 +1,49 @@
+import os
+import signal
+import time
+
+import pytest
+
+import sampling_profiler
+from sampling_profiler import SamplingProfiler
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, 'SIGUSR2'), reason='需要 SIGUSR2')
+
+
+@pytest.fixture
+def profiler(monkeypatch, tmp_path):
+    """以暫存目錄的分析器安裝 SIGUSR2 處理，結束後還原原本的處理"""
+    profiler = SamplingProfiler(output_dir=str(tmp_path), interval_ms=1, max_seconds=60)
+    monkeypatch.setattr(sampling_profiler, 'profiler', profiler)
+    previous = signal.getsignal(signal.SIGUSR2)
+    sampling_profiler.install_signal_handler()
+    yield profiler
+    signal.signal(signal.SIGUSR2, previous)
+    profiler.stop()
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, '逾時'
+        time.sleep(0.01)
+
+
+def test_signal_toggles_profiling(profiler):
+    os.kill(os.getpid(), signal.SIGUSR2)
+    wait_until(lambda: profiler.running)
+    wait_until(lambda: profiler.status()['samples'] > 0)
+
+    os.kill(os.getpid(), signal.SIGUSR2)
+    wait_until(lambda: not profiler.running)
+    assert os.path.exists(profiler.last_path)
+
+
+def test_signal_while_lock_held_does_not_block(profiler):
+    # 模擬訊號在主執行緒執行 start() 期間（持有 _lock）送達
+    with profiler._lock:
+        started = time.monotonic()
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert not profiler.running
+    assert time.monotonic() - started < 1
+    wait_until(lambda: profiler.running)
@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def search_db(db):
+    if not db.fts_enabled:
+        pytest.skip('SQLite 不支援 FTS5 trigram')
+    return db
+
+
+def test_search_is_scoped_to_user(search_db):
+    search_db.save_diary('Uabc123', '今天喝了咖啡寫日記內容')
+    search_db.save_diary('Uabc1234', '別人的日記內容')
+    search_db.save_diary('Xabc123', '另一位用戶的日記內容')
+
+    results = search_db.search('Uabc123', '日記內容')
+    assert [result['snippet'] for result in results] == ['今天喝了咖啡寫【日記內容】']
+
+
+def test_search_matches_all_terms(search_db):
+    search_db.save_diary('Uabc123', '早上喝咖啡')
+    search_db.save_diary('Uabc123', '晚上喝咖啡看電影')
+
+    results = search_db.search('Uabc123', '喝咖啡 看電影')
+    assert len(results) == 1
+    assert results[0]['source'] == 'diary'
+
+
+def test_short_terms_fall_back_to_like(search_db):
+    search_db.save_diary('Uabc123', '咖啡')
+    search_db.save_diary('Uabc1234', '咖啡')
+
+    assert len(search_db.search('Uabc123', '咖啡')) == 1
+
+
+def test_rebuilds_index_without_user_column(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            content, user_id UNINDEXED, source UNINDEXED, date UNINDEXED, tokenize = 'trigram'
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE diaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, content TEXT NOT NULL,
+            date DATE NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("INSERT INTO diaries (user_id, content, date) VALUES ('Uabc123', '舊的日記內容', '2026-01-01')")
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    if not db.fts_enabled:
+        pytest.skip('SQLite 不支援 FTS5 trigram')
+    assert [result['id'] for result in db.search('Uabc123', '日記內容')] == [1]
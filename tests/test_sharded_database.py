@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from database import Database
+from sharded_database import ShardedDatabase, rebalance, shard_index, shard_path
+
+SHARDS = 2
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'main.db')
+
+
+def users_on_shards():
+    """每個分片各一位用戶"""
+    users = {}
+    for number in range(100):
+        users.setdefault(shard_index(f"u{number}", SHARDS), f"u{number}")
+    return [users[index] for index in range(SHARDS)]
+
+
+def count_rows(path, table):
+    conn = sqlite3.connect(path)
+    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_rebalance_moves_users_to_their_shard(db_path):
+    single = Database(db_path)
+    users = users_on_shards()
+    for user_id in users:
+        single.add_user(user_id, user_id)
+        single.save_expense(user_id, 100, '餐飲', '午餐')
+        single.save_vocabulary_record(user_id, 'apple')
+    single.set_user_state(users[0], {'state': 'writing_diary'})
+    single.set_user_state(users[1], {'state': 'reviewing_vocabulary', 'step': 0, 'words': [{'id': 2}]})
+
+    moved = rebalance(db_path, SHARDS)
+    assert moved['users'] == SHARDS
+    assert moved['expenses'] == SHARDS
+    assert moved['user_states'] == 1
+
+    sharded = ShardedDatabase(db_path, SHARDS)
+    for index, user_id in enumerate(users):
+        assert sharded.shard(user_id).db_path == shard_path(db_path, index)
+        assert sharded.get_user(user_id) is not None
+        assert len(sharded.get_expenses(user_id)) == 1
+        assert sharded.get_vocabulary_progress(user_id)['total'] == 1
+    assert count_rows(db_path, 'expenses') == 0
+    # 單字 id 重新編號，記錄舊 id 的複習狀態已清除
+    assert sharded.get_user_state(users[0])['state'] == 'writing_diary'
+    assert sharded.get_user_state(users[1]) is None
+
+
+def test_rebalance_rolls_back_on_conflict(db_path):
+    single = Database(db_path)
+    user_id = users_on_shards()[0]
+    single.add_user(user_id, '舊名稱')
+    single.save_expense(user_id, 100, '餐飲', '午餐')
+    # 分片已經有同一位用戶，users 表格的記錄不能直接搬過去
+    ShardedDatabase(db_path, SHARDS).shard(user_id).add_user(user_id, '新名稱')
+
+    with pytest.raises(RuntimeError):
+        rebalance(db_path, SHARDS)
+    assert count_rows(db_path, 'users') == 1
+    assert count_rows(db_path, 'expenses') == 1
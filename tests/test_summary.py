@@ -0,0 +1,23 @@
+from email_service import EmailService
+from models import DailyGoals
+
+
+def test_summary_goals_are_row_model(db):
+    db.add_user('u1', 'A')
+    assert db.get_today_summary('u1')['goals'] is None
+
+    db.save_daily_goals('u1', '跑步', None, '讀書')
+    goals = db.get_today_summary('u1')['goals']
+    assert isinstance(goals, DailyGoals)
+    assert goals.goals == ('跑步', None, '讀書')
+    assert goals.user_id == 'u1'
+
+
+def test_summary_email_lists_goals(db):
+    db.add_user('u1', 'A')
+    db.save_daily_goals('u1', '跑步', None, '讀書')
+
+    html = EmailService()._create_summary_html('A', db.get_today_summary('u1'))
+    assert '目標 1: 跑步' in html
+    assert '目標 2' not in html
+    assert '目標 3: 讀書' in html
@@ -0,0 +1,142 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from timer_heap import TimerHeap
+
+START = datetime.datetime(2026, 1, 15, 23, 59, 30, tzinfo=datetime.timezone.utc).timestamp()
+
+
+class Clock:
+    """可手動推進的 time.time"""
+
+    def __init__(self):
+        self.now = START
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    """every_day_at 以本地時間計算，測試固定為 UTC"""
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def timers():
+    timers = TimerHeap(max_workers=1)
+    yield timers
+    timers.stop()
+
+
+def advance(timers, clock, seconds):
+    """推進時間並喚醒排程執行緒重新計算等待時間"""
+    clock.now += seconds
+    with timers._cond:
+        timers._cond.notify_all()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, '逾時'
+        time.sleep(0.01)
+
+
+def test_jobs_run_in_due_order(timers, clock):
+    ran = []
+    for delay, label in ((3, 'c'), (1, 'a'), (2, 'b')):
+        timers.schedule_at(clock.now + delay, ran.append, label)
+    timers.start()
+
+    advance(timers, clock, 1.5)
+    wait_for(lambda: ran == ['a'])
+    advance(timers, clock, 5)
+    wait_for(lambda: len(ran) == 3)
+    assert ran == ['a', 'b', 'c']
+
+
+def test_every_aligns_to_interval(timers, clock):
+    aligned = timers.every(60, lambda: None, align=True)
+    plain = timers.every(60, lambda: None)
+
+    assert aligned.next_run == (START // 60 + 1) * 60
+    assert aligned.next_run_fn(aligned.next_run) == aligned.next_run + 60
+    # 延遲執行後仍對齊下一個整分鐘
+    assert aligned.next_run_fn(aligned.next_run + 7.5) == aligned.next_run + 60
+    assert plain.next_run == START + 60
+
+
+def test_every_reschedules_after_running(timers, clock):
+    ran = []
+    timers.every(10, ran.append, 'tick')
+    timers.start()
+
+    advance(timers, clock, 10)
+    wait_for(lambda: len(ran) == 1)
+    advance(timers, clock, 10)
+    wait_for(lambda: len(ran) == 2)
+
+
+def test_every_day_at_rolls_over_midnight(timers, clock, utc):
+    midnight = timers.every_day_at('00:00', lambda: None)
+    passed = timers.every_day_at('23:00', lambda: None)
+    today_at = datetime.datetime(2026, 1, 16, tzinfo=datetime.timezone.utc).timestamp()
+
+    # 23:59:30 時，00:00 是隔天；今天的 23:00 已過，改為隔天 23:00
+    assert midnight.next_run == today_at
+    assert passed.next_run == today_at + 23 * 3600
+    # 剛好在設定時間執行後，下一次是隔天同一時間
+    assert midnight.next_run_fn(today_at) == today_at + 86400
+
+
+def test_cancelled_job_does_not_run(timers, clock):
+    ran = []
+    cancelled = timers.schedule_at(clock.now + 1, ran.append, 'cancelled')
+    timers.schedule_at(clock.now + 2, ran.append, 'kept')
+    cancelled.cancel()
+    timers.start()
+
+    advance(timers, clock, 3)
+    wait_for(lambda: ran)
+    assert ran == ['kept']
+
+
+def test_stop_cancels_queued_and_scheduled_jobs(timers, clock):
+    started = threading.Event()
+    release = threading.Event()
+    ran = []
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    timers.start()
+    timers.submit(block)
+    started.wait(5)
+    # 唯一的工作執行緒被占用，這一筆排在執行緒池的佇列中
+    timers.submit(ran.append, 'queued')
+    timers.schedule_at(clock.now + 1, ran.append, 'scheduled')
+
+    timers.stop(wait=False)
+    release.set()
+    advance(timers, clock, 5)
+    time.sleep(0.1)
+
+    assert ran == []
+    assert not timers.running
+    assert timers.submit(ran.append, 'after stop') is None
@@ -0,0 +1,65 @@
+from view_cache import ViewCache
+
+
+class VersionSource:
+    """記錄讀取次數的畫面版本來源"""
+
+    def __init__(self):
+        self.version = 0
+        self.loads = 0
+
+    def __call__(self, user_id):
+        self.loads += 1
+        return self.version
+
+
+def test_version_reused_within_ttl():
+    cache = ViewCache(version_ttl=60)
+    source = VersionSource()
+    assert cache.version('u1', source) == 0
+    source.version = 1
+    assert cache.version('u1', source) == 0
+    assert source.loads == 1
+
+
+def test_version_reloaded_without_ttl():
+    cache = ViewCache()
+    source = VersionSource()
+    cache.version('u1', source)
+    source.version = 1
+    assert cache.version('u1', source) == 1
+    assert source.loads == 2
+
+
+def test_invalidate_drops_views_and_version():
+    cache = ViewCache(version_ttl=60)
+    source = VersionSource()
+    version = cache.version('u1', source)
+    cache.set('u1', 'today', '訊息', version)
+    assert cache.get('u1', 'today', version) == (True, '訊息')
+
+    source.version = 1
+    cache.invalidate('u1')
+    version = cache.version('u1', source)
+    assert version == 1
+    assert cache.get('u1', 'today', version) == (False, None)
+
+
+def test_stale_version_misses():
+    cache = ViewCache()
+    cache.set('u1', 'today', '訊息', 0)
+    assert cache.get('u1', 'today', 1) == (False, None)
+
+
+def test_evicts_least_recently_used_user():
+    cache = ViewCache(max_users=2, version_ttl=60)
+    source = VersionSource()
+    for user_id in ('u1', 'u2'):
+        cache.version(user_id, source)
+        cache.set(user_id, 'today', user_id)
+    cache.get('u1', 'today')
+    cache.set('u3', 'today', 'u3')
+    assert cache.get('u2', 'today') == (False, None)
+    assert cache.get('u1', 'today') == (True, 'u1')
+    cache.version('u2', source)
+    assert source.loads == 3
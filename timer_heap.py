@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 等待上限（秒），避免系統時間調整後睡過頭
+MAX_WAIT = 3600
+
+
+class TimerJob:
+    """排程中的工作"""
+
+    def __init__(self, name, func, args, next_run, next_run_fn=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.next_run = next_run
+        self.next_run_fn = next_run_fn
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerHeap:
+    """以最小堆積管理的事件驅動排程器
+
+    排程執行緒只睡到下一個工作到期（以 Condition 等待，新增工作或停止時立即喚醒），
+    到期的工作交給執行緒池執行，彼此不會互相阻塞。
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def schedule_at(self, when, func, *args, name=None):
+        """在指定時間（epoch 秒）執行一次"""
+        job = TimerJob(name or func.__name__, func, args, when)
+        self._push(job)
+        return job
+
+    def every_day_at(self, time_str, func, *args, name=None):
+        """每天在指定時間（HH:MM）執行"""
+        hour, minute = (int(part) for part in time_str.split(':'))
+
+        def next_run(now):
+            current = datetime.datetime.fromtimestamp(now)
+            target = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if target.timestamp() <= now:
+                target += datetime.timedelta(days=1)
+            return target.timestamp()
+
+        job = TimerJob(name or func.__name__, func, args, next_run(time.time()), next_run)
+        self._push(job)
+        return job
+
+    def every(self, seconds, func, *args, name=None, align=False):
+        """每隔固定秒數執行，align=True 時對齊整數倍時間（例如每分鐘 0 秒）"""
+
+        def next_run(now):
+            if align:
+                return (now // seconds + 1) * seconds
+            return now + seconds
+
+        job = TimerJob(name or func.__name__, func, args, next_run(time.time()), next_run)
+        self._push(job)
+        return job
+
+    def submit(self, func, *args, name=None):
+        """立即交給執行緒池執行"""
+        with self._cond:
+            if not self._running:
+                return None
+            job = TimerJob(name or func.__name__, func, args, time.time())
+            return self._executor.submit(self._execute, job)
+
+    def _push(self, job):
+        with self._cond:
+            heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+            self._cond.notify()
+
+    def start(self):
+        """啟動排程執行緒"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='scheduler-job'
+            )
+        self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False, timeout=None):
+        """停止排程，未開始的工作會被取消；wait=True 時等待執行中的工作結束"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._heap.clear()
+            self._cond.notify_all()
+            executor = self._executor
+            self._executor = None
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self):
+        """排程主迴圈：睡到下一個工作到期後派送"""
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, MAX_WAIT))
+
+                if not self._running:
+                    return
+
+                _, _, job = heapq.heappop(self._heap)
+                if job.cancelled:
+                    continue
+
+                if job.next_run_fn:
+                    job.next_run = job.next_run_fn(time.time())
+                    heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+
+                self._executor.submit(self._execute, job)
+
+    def _execute(self, job):
+        try:
+            job.func(*job.args)
+        except Exception:
+            logger.exception("排程工作 %s 執行失敗", job.name)
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ViewCache:
+    """每位用戶的已格式化訊息快取
+
+    以 (用戶, 畫面鍵值) 儲存格式化後的文字，資料寫入時以 invalidate 清除該用戶的所有畫面。
+    多程序部署時可傳入 version，版本不同的快取視為未命中（由其他程序寫入後遞增版本）。
+    version() 在 version_ttl 秒內沿用上次讀到的版本，命中時不必每次查詢資料庫；
+    本程序的寫入以 invalidate 立即生效，其他程序的寫入最慢 version_ttl 秒後生效。
+    超過 max_users 時淘汰最久未使用的用戶。
+    """
+
+    def __init__(self, max_users=10000, version_ttl=0):
+        self.max_users = max_users
+        self.version_ttl = version_ttl
+        self._views = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id, load):
+        """取得用戶畫面版本，超過 version_ttl 秒才以 load(user_id) 重新讀取"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(user_id)
+        if cached and now - cached[1] < self.version_ttl:
+            return cached[0]
+        version = load(user_id)
+        with self._lock:
+            self._versions[user_id] = (version, now)
+        return version
+
+    def get(self, user_id, key, version=None):
+        """回傳 (是否命中, 內容)"""
+        with self._lock:
+            views = self._views.get(user_id)
+            if views is None or key not in views:
+                return False, None
+            cached_version, value = views[key]
+            if cached_version != version:
+                return False, None
+            self._views.move_to_end(user_id)
+            return True, value
+
+    def set(self, user_id, key, value, version=None):
+        with self._lock:
+            views = self._views.get(user_id)
+            if views is None:
+                views = self._views[user_id] = {}
+                if len(self._views) > self.max_users:
+                    evicted, _ = self._views.popitem(last=False)
+                    self._versions.pop(evicted, None)
+            else:
+                self._views.move_to_end(user_id)
+            views[key] = (version, value)
+
+    def invalidate(self, user_id):
+        """清除用戶所有快取畫面"""
+        with self._lock:
+            self._views.pop(user_id, None)
+            self._versions.pop(user_id, None)
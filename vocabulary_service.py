@@ -0,0 +1,105 @@
+import re
+import datetime
+
+# 單字分隔符號：逗號、頓號、分號、換行
+WORD_SEPARATORS = re.compile(r'[,，、;；\n]+')
+
+# SM-2 評分：記得 / 忘記
+QUALITY_REMEMBERED = 4
+QUALITY_FORGOTTEN = 2
+
+
+def parse_words(text):
+    """將輸入文字拆成單字清單（去除空白與重複）"""
+    words = []
+    seen = set()
+    for word in WORD_SEPARATORS.split(text):
+        word = ' '.join(word.split())
+        key = normalize_word(word)
+        if key and key not in seen:
+            seen.add(key)
+            words.append(word)
+    return words
+
+
+def normalize_word(word):
+    """單字正規化（用於去除重複）"""
+    return ' '.join(word.lower().split())
+
+
+def sm2(repetitions, interval, ease, quality):
+    """SM-2 間隔重複演算法，回傳 (repetitions, interval, ease)
+
+    quality: 0-5，3 以上視為記得
+    """
+    if quality >= 3:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease)
+        repetitions += 1
+    else:
+        repetitions = 0
+        interval = 1
+
+    ease = ease + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return repetitions, interval, max(ease, 1.3)
+
+
+class VocabularyService:
+    def __init__(self, db):
+        self.db = db
+
+    def record_words(self, user_id, text):
+        """儲存單字學習記錄，回傳 (全部單字, 新單字數)"""
+        words = parse_words(text)
+        new_count = self.db.save_vocabulary_record(user_id, text, words)
+        return words, new_count
+
+    def get_due_words(self, user_id, date=None):
+        """取得今天需要複習的單字"""
+        due = self.db.get_due_words_for_users([user_id], date)
+        return due.get(user_id, [])
+
+    def get_progress(self, user_id):
+        """取得單字學習進度"""
+        return self.db.get_vocabulary_progress(user_id)
+
+    def review(self, user_id, due_words, forgotten_text):
+        """依使用者回報忘記的單字更新複習排程，回傳 (記得數, 忘記數)"""
+        today = self.db.get_user_today(user_id)
+        forgotten = {normalize_word(word) for word in parse_words(forgotten_text)}
+
+        updates = []
+        remembered_count = 0
+        for word in due_words:
+            if word['normalized'] in forgotten:
+                quality = QUALITY_FORGOTTEN
+            else:
+                quality = QUALITY_REMEMBERED
+                remembered_count += 1
+            repetitions, interval, ease = sm2(
+                word['repetitions'], word['interval'], word['ease'], quality
+            )
+            updates.append({
+                'id': word['id'],
+                'repetitions': repetitions,
+                'interval': interval,
+                'ease': ease,
+                'due_date': today + datetime.timedelta(days=interval),
+                'last_reviewed': today
+            })
+
+        self.db.update_word_reviews(user_id, updates)
+        return remembered_count, len(due_words) - remembered_count
+
+    def format_due_message(self, user_name, due_words):
+        """格式化複習提醒訊息"""
+        words_text = '\n'.join(f"• {word['word']}" for word in due_words)
+        return f"""📚 {user_name}，今天有 {len(due_words)} 個單字要複習：
+
+{words_text}
+
+複習完後請輸入「複習」回報結果！"""
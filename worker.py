@@ -0,0 +1,64 @@
+"""排程工作程序（獨立於網頁服務）
+
+只執行 Scheduler 的定時任務，不處理 Webhook，可與網頁服務分開部署、調整與重啟。
+
+使用方式：
+    python -m worker [--workers 8] [--no-leader]
+"""
+import argparse
+import logging
+import signal
+import threading
+from config import Config
+import services
+from logging_setup import setup_logging, shutdown_logging
+import query_profiler
+import sampling_profiler
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Never Give Up 排程工作程序')
+    parser.add_argument('--workers', type=int, default=Config.SCHEDULER_WORKERS,
+                        help='同時執行的任務數')
+    parser.add_argument('--no-leader', action='store_true',
+                        help='不進行領導者選舉，直接執行排程（僅限單一工作程序）')
+    args = parser.parse_args()
+    setup_logging()
+
+    scheduler = services.get_scheduler(max_workers=args.workers)
+
+    leader = None
+    if args.no_leader:
+        scheduler.start()
+    else:
+        leader = scheduler.leader_election()
+        leader.start()
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info("收到結束訊號 %s，準備停止排程工作程序", signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    # kill -USR2 <pid> 開始／停止取樣分析
+    sampling_profiler.install_signal_handler()
+
+    logger.info("排程工作程序已啟動（同時執行任務數 %s）", args.workers)
+    stop_event.wait()
+
+    # 先等待執行中的任務收尾，再釋放租約讓其他工作程序接手
+    scheduler.stop(wait=True)
+    if leader:
+        leader.stop()
+    sampling_profiler.profiler.stop()
+    query_profiler.log_report()
+    logger.info("排程工作程序已結束")
+    shutdown_logging()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+"""WSGI 進入點
+
+正式環境使用方式：
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+日誌在這裡設定；匯入 app 模組本身不會有副作用（不設定日誌、不建立應用）。
+"""
+from app import create_app
+from logging_setup import setup_logging
+
+setup_logging()
+app = create_app()
+
+application = app